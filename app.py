@@ -1,4 +1,5 @@
-from fastapi import FastAPI, Form, Request, Response, File, BackgroundTasks
+from fastapi import FastAPI, Form, Request, Response, File
+from fastapi.responses import StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi.encoders import jsonable_encoder
@@ -7,22 +8,104 @@ import os
 import aiofiles
 import json
 import csv
+import io
 import uuid
 import re
-import time
-from src.helper import llm_pipeline
+import asyncio
+import threading
+from contextlib import asynccontextmanager
+from src.jobs import JobQueue
+from src.checkpoints import JobCheckpoint, atomic_write_text
+from src.events import JobEvents, format_sse
+from src.metrics import job_trace, job_breakdown, render_metrics, QUEUE_DEPTH
 
 # ───────────────────────────────────────────────
-# FastAPI App & Templates
+# Persistent job queue with a bounded worker pool
 # ───────────────────────────────────────────────
-app = FastAPI(title="UN SDG Document Analyzer")
-app.mount("/static", StaticFiles(directory="static"), name="static")
-templates = Jinja2Templates(directory="templates")
+def run_job(job_id: str, payload: dict):
+    # Timing spans recorded while the job runs are collected under its id
+    with job_trace(job_id):
+        generate_csv(payload["file_path"], job_id, payload["original_filename"], plan=payload.get("plan"))
+
+job_queue = JobQueue(run_job)
+
+# Progress events pushed to /events/{job_id} subscribers
+job_events = JobEvents()
+
+# Seconds between SSE keep-alive comments when a job is quiet
+SSE_KEEPALIVE_SECONDS = 15
+
+# Seconds a stream of a finished job waits for its final events before closing
+SSE_FINAL_WAIT_SECONDS = 1
+
+# The pipeline modules (LangChain, Gemini SDK, FAISS) are imported by the first
+# job rather than at startup; set QA_PRELOAD_PIPELINE=1 to warm them up in a
+# background thread right after the server starts instead
+PRELOAD_PIPELINE = os.getenv("QA_PRELOAD_PIPELINE", "0") == "1"
+
+def preload_pipeline():
+    try:
+        import src.helper  # noqa: F401
+        print("DEBUG: Pipeline modules preloaded")
+    except Exception as e:
+        print(f"DEBUG: Pipeline preload failed: {e}")
+
+def job_status_payload(job_id: str, job: dict):
+    """
+    Public view of a job row, shared by /status and the event stream
+    """
+    response_data = {
+        "job_id": job_id, 
+        "status": job["status"],
+        "progress": job["progress"],
+        "current_question": job["current_question"],
+        "total_questions": job["total_questions"]
+    }
+    
+    # Include current Q&A for real-time display
+    if job.get("current_qa"):
+        response_data["current_qa"] = job["current_qa"]
+    
+    # Include file path when job is done
+    if job["status"] == "done" and job.get("file"):
+        response_data["file"] = job["file"]
+        professional_name = os.path.basename(job["file"])
+        response_data["download_filename"] = professional_name
+    
+    # Include error if failed
+    if job["status"] == "failed" and job.get("error"):
+        response_data["error"] = job["error"]
+
+    return response_data
+
+def update_job(job_id: str, **fields):
+    """
+    Persist job fields and push the change to live event-stream clients
+    """
+    job_queue.update(job_id, **fields)
+    job = job_queue.get(job_id)
+    if job is None:
+        return
+    if fields.get("current_qa"):
+        job_events.publish(job_id, "qa", fields["current_qa"])
+    status = job_status_payload(job_id, job)
+    status.pop("current_qa", None)
+    job_events.publish(job_id, "status", status)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    job_queue.start()
+    if PRELOAD_PIPELINE:
+        threading.Thread(target=preload_pipeline, daemon=True).start()
+    yield
+    job_queue.stop()
 
 # ───────────────────────────────────────────────
-# Enhanced job tracking with progress
+# FastAPI App & Templates
 # ───────────────────────────────────────────────
-jobs = {}
+app = FastAPI(title="UN SDG Document Analyzer", lifespan=lifespan)
+app.mount("/static", StaticFiles(directory="static"), name="static")
+templates = Jinja2Templates(directory="templates")
 
 def clean_filename(filename):
     """
@@ -61,24 +144,42 @@ def clean_text(text):
     
     return text
 
-def generate_csv(file_path: str, job_id: str, original_filename: str):
+def generate_csv(file_path: str, job_id: str, original_filename: str, plan: dict = None):
     """
-    Blocking CSV generation function with progress tracking
+    Blocking CSV generation function with progress tracking.
+
+    Generated questions and every answered row are checkpointed, so a job
+    that failed or was interrupted resumes from its last completed question.
+    `plan` (chosen at /analyze time) sets chunk sizes, retrieval k and the
+    question cap that keep the job within its token budget.
     """
     try:
+        from src.helper import llm_pipeline, MAX_QUESTIONS
+        from src.answering import answer_in_order, answer_in_batches, extract_answer, answer_question, build_combine_chain, ANSWER_MODE
+        from src.answer_cache import get_answer_cache
+        from src.retrieval import retrieve_all, retriever_embeddings
+        from src.compression import ContextCompressor
+        from src.summary_cache import get_summary_cache
+        from src.rate_limiter import get_rate_limiter
+
         print(f"DEBUG: Starting processing for job {job_id}")
         
         # Ensure job exists and update status
-        if job_id not in jobs:
-            print(f"DEBUG: Job {job_id} not found in jobs dictionary")
+        if job_queue.get(job_id) is None:
+            print(f"DEBUG: Job {job_id} not found in job queue")
             return
             
-        jobs[job_id]["status"] = "processing"
-        jobs[job_id]["progress"] = 5
+        update_job(job_id, status="processing", progress=5)
         print(f"DEBUG: Job {job_id} status set to processing")
+
+        # Questions generated by an earlier attempt are reused as-is
+        checkpoint = JobCheckpoint(job_id)
+        saved_questions, _ = checkpoint.load_questions()
+        if saved_questions is not None:
+            print(f"DEBUG: Resuming job {job_id} from checkpoint with {len(saved_questions)} questions")
         
-        # Get the pipeline components
-        result = llm_pipeline(file_path)
+        # Get the pipeline components (preprocessing and index come from their caches on resume)
+        result = llm_pipeline(file_path, questions=saved_questions, plan=plan)
         
         # Extract the chain and questions
         if len(result) >= 2:
@@ -86,28 +187,129 @@ def generate_csv(file_path: str, job_id: str, original_filename: str):
             ques_list = result[1]
             retriever = result[2] if len(result) > 2 else None
             llm_answer_gen = result[3] if len(result) > 3 else None
+            pipeline_info = result[4] if len(result) > 4 else {}
             
             print(f"DEBUG: Got {len(ques_list)} questions")
             
             # Limit questions for performance
-            if len(ques_list) > 45:
-                print(f"DEBUG: Limiting from {len(ques_list)} to 45 questions")
-                ques_list = ques_list[:45]
+            if len(ques_list) > MAX_QUESTIONS:
+                print(f"DEBUG: Limiting from {len(ques_list)} to {MAX_QUESTIONS} questions")
+                ques_list = ques_list[:MAX_QUESTIONS]
+
+            if saved_questions is None:
+                checkpoint.save_questions(ques_list, pipeline_info)
                 
         else:
             error_msg = f"llm_pipeline returned only {len(result)} values, expected at least 2"
             print(f"ERROR: {error_msg}")
-            jobs[job_id]["status"] = "failed"
-            jobs[job_id]["error"] = error_msg
+            update_job(job_id, status="failed", error=error_msg)
             return
         
-        # Initialize progress tracking
+        # Initialize progress tracking (rows answered by an earlier attempt count as done)
         total_questions = len(ques_list)
-        jobs[job_id]["total_questions"] = total_questions
-        jobs[job_id]["current_question"] = 0
-        jobs[job_id]["progress"] = 10
-        
-        print(f"Starting processing of {total_questions} questions...")
+        completed = {i: row for i, row in checkpoint.rows().items() if i < total_questions}
+        update_job(
+            job_id, total_questions=total_questions, current_question=len(completed),
+            progress=max(10, int(len(completed) / max(total_questions, 1) * 100))
+        )
+
+        # Replay checkpointed rows so event-stream clients show them again
+        for i in sorted(completed):
+            job_events.publish(job_id, "qa", {
+                "index": i + 1,
+                "question": completed[i]["question"],
+                "answer": completed[i]["answer"]
+            })
+
+        pending = [i for i in range(total_questions) if i not in completed]
+        pending_questions = [ques_list[i] for i in pending]
+        print(f"Starting processing of {len(pending)} of {total_questions} questions...")
+
+        # Near-duplicate questions over the same retrieved chunks are served from the answer cache
+        answer_cache = None
+        if retriever is not None and llm_answer_gen is not None:
+            combine_chain = build_combine_chain(llm_answer_gen)
+            answer_cache = get_answer_cache(
+                retriever_embeddings(retriever), getattr(llm_answer_gen, "model", "")
+            )
+            # Retrieved chunks are compressed (QA_CONTEXT_COMPRESSION) before each answer call
+            # (refine summaries come from the summary cache when the chunk set was summarized before)
+            compressor = ContextCompressor(
+                llm=llm_answer_gen, embeddings=retriever_embeddings(retriever), summary_cache=get_summary_cache()
+            )
+
+        # Retrieve context for every question with one batched embedding call and search
+        prefetched = {}
+        if answer_cache is not None and ANSWER_MODE != "batched" and pending_questions:
+            clean_questions = [clean_text(q) for q in pending_questions]
+            try:
+                prefetched = dict(zip(clean_questions, retrieve_all(retriever, clean_questions)))
+            except Exception as e:
+                print(f"DEBUG: Batch retrieval failed, retrieving per question: {e}")
+
+        def answer_one(question):
+            # Clean the question
+            clean_question = clean_text(question)
+
+            # Get answer
+            try:
+                # Paced by the shared rate limiter; 429s are retried after backoff
+                if answer_cache is not None:
+                    answer = answer_question(
+                        clean_question, retriever, combine_chain,
+                        answer_cache=answer_cache, rate_limiter=get_rate_limiter(),
+                        docs=prefetched.get(clean_question), compressor=compressor
+                    )
+                else:
+                    answer = extract_answer(get_rate_limiter().call(
+                        answer_generation_chain.invoke, {"input": clean_question}
+                    ))
+                clean_answer = clean_text(answer.strip())
+            except Exception as e:
+                print(f"DEBUG: Error getting answer: {e}")
+                clean_answer = "Not found in context."
+            return clean_question, clean_answer
+
+        # Questions are answered concurrently; results arrive in question order
+        if answer_cache is not None and ANSWER_MODE == "batched":
+            # Questions with overlapping context share one answer call
+            clean_questions = [clean_text(q) for q in pending_questions]
+            answered = answer_in_batches(
+                clean_questions, retriever, llm_answer_gen, combine_chain,
+                answer_cache=answer_cache, rate_limiter=get_rate_limiter(), compressor=compressor
+            )
+            answered_rows = ((j, q, (q, clean_text(a.strip()))) for j, q, a in answered)
+        else:
+            answered_rows = answer_in_order(answer_one, pending_questions)
+
+        for j, question, (clean_question, clean_answer) in answered_rows:
+            i = pending[j]
+            print(f"DEBUG: Got answer for question {i+1}/{total_questions}")
+
+            # Checkpoint the row before reporting it
+            checkpoint.append_row(i, clean_question, clean_answer)
+            completed[i] = {"index": i, "question": clean_question, "answer": clean_answer}
+
+            # Update progress
+            progress = int((len(completed) / total_questions) * 100)  # 0-100%
+
+            # Store current Q&A together with the progress
+            update_job(
+                job_id,
+                current_question=len(completed),
+                progress=progress,
+                current_qa={
+                    "index": i + 1,
+                    "question": clean_question,
+                    "answer": clean_answer
+                }
+            )
+
+        if answer_cache is not None:
+            print(f"DEBUG: Answer cache {answer_cache.stats()}")
+            if compressor.mode == "refine":
+                report = compressor.report()
+                print(f"DEBUG: Summary cache served {report['from_cache']}/{report['summaries']} summarizations")
 
         output_dir = 'static/output/'
         os.makedirs(output_dir, exist_ok=True)
@@ -123,65 +325,25 @@ def generate_csv(file_path: str, job_id: str, original_filename: str):
             output_file = base_output_file.replace('.csv', f' ({counter}).csv')
             counter += 1
 
-        with open(output_file, "w", newline="", encoding="utf-8") as csvfile:
-            csv_writer = csv.writer(csvfile)
-            csv_writer.writerow(["No.", "Question", "Answer"])
-
-            for i, question in enumerate(ques_list):
-                print(f"Processing question {i+1}/{total_questions}")
-                
-                # Update progress
-                progress = int(((i + 1) / total_questions) * 100)  # 0-100%
-                jobs[job_id]["current_question"] = i + 1
-                jobs[job_id]["progress"] = progress
-                
-                # Clean the question
-                clean_question = clean_text(question)
-                
-                # Get answer
-                try:
-                    response = answer_generation_chain.invoke({"input": clean_question})
-                    
-                    if isinstance(response, dict):
-                        answer = response.get("answer") or response.get("output") or response.get("result") or str(response)
-                    else:
-                        answer = str(response)
-                    
-                    clean_answer = clean_text(answer.strip())
-                    print(f"DEBUG: Got answer for question {i+1}")
-                    
-                except Exception as e:
-                    print(f"DEBUG: Error getting answer: {e}")
-                    clean_answer = "Not found in context."
-                
-                # Store current Q&A
-                jobs[job_id]["current_qa"] = {
-                    "index": i + 1,
-                    "question": clean_question,
-                    "answer": clean_answer
-                }
-                
-                # Write to CSV
-                csv_writer.writerow([i + 1, clean_question, clean_answer])
-                
-                # Small delay to prevent rate limiting
-                if i < len(ques_list) - 1:
-                    time.sleep(2)
+        # Write the CSV in one go, atomically, once every row is known
+        buffer = io.StringIO()
+        csv_writer = csv.writer(buffer)
+        csv_writer.writerow(["No.", "Question", "Answer"])
+        for i in sorted(completed):
+            csv_writer.writerow([i + 1, completed[i]["question"], completed[i]["answer"]])
+        atomic_write_text(output_file, buffer.getvalue())
 
         # Final update
-        jobs[job_id]["status"] = "done"
-        jobs[job_id]["file"] = output_file
-        jobs[job_id]["progress"] = 100
-        jobs[job_id]["current_qa"] = None
+        update_job(job_id, status="done", file=output_file, progress=100, current_qa=None)
+        checkpoint.clear()
         
         print(f"DEBUG: Job {job_id} completed successfully")
         print(f"CSV generated: {output_file}")
 
     except Exception as e:
         print(f"ERROR in generate_csv: {e}")
-        if job_id in jobs:
-            jobs[job_id]["status"] = "failed"
-            jobs[job_id]["error"] = str(e)
+        if job_queue.get(job_id) is not None:
+            update_job(job_id, status="failed", error=str(e))
         import traceback
         traceback.print_exc()
 
@@ -206,45 +368,61 @@ async def upload_pdf(pdf_file: bytes = File(...), filename: str = Form(...)):
     )
 
 @app.post("/analyze")
-async def analyze(pdf_filename: str = Form(...), background_tasks: BackgroundTasks = BackgroundTasks()):
+async def analyze(pdf_filename: str = Form(...), priority: int = Form(0), token_budget: int = Form(None)):
     if not os.path.exists(pdf_filename):
         return Response(
             jsonable_encoder(json.dumps({"error": "PDF file not found."})), 
             status_code=400
         )
 
+    # Plan chunk sizes, retrieval k and question count for the token budget before queueing
+    # (the planner import and any PDF parsing run off the event loop)
+    def make_plan():
+        from src.planner import plan_for_file
+        return plan_for_file(pdf_filename, token_budget)
+
+    try:
+        plan = await asyncio.to_thread(make_plan)
+    except Exception as e:
+        print(f"DEBUG: Could not read {pdf_filename} for planning: {e}")
+        return Response(
+            jsonable_encoder(json.dumps({"error": "Could not read the PDF text."})),
+            status_code=400
+        )
+    if not plan["fits"]:
+        return Response(
+            jsonable_encoder(json.dumps({
+                "error": f"Token budget of {plan['token_budget']} is too small for this document "
+                         f"(at least ~{plan['estimate']['total_tokens']} tokens needed).",
+                "plan": plan
+            })),
+            status_code=400
+        )
+
     job_id = str(uuid.uuid4())
     
     # Extract original filename
     original_filename = os.path.basename(pdf_filename)
     
-    # Initialize job with progress tracking
-    jobs[job_id] = {
-        "status": "queued", 
-        "file": None,
-        "progress": 0,
-        "total_questions": 0,
-        "current_question": 0,
-        "current_qa": None,
-        "error": None
-    }
-    
-    print(f"DEBUG: Created job {job_id} for file {original_filename}")
-    print(f"DEBUG: Current jobs: {list(jobs.keys())}")
+    # Queue the job; a worker from the pool picks it up (higher priority first)
+    job_queue.enqueue(
+        job_id,
+        {"file_path": pdf_filename, "original_filename": original_filename, "plan": plan},
+        priority=priority
+    )
     
-    # Add background task
-    background_tasks.add_task(generate_csv, pdf_filename, job_id, original_filename)
+    print(
+        f"DEBUG: Created job {job_id} for file {original_filename} (queue depth {job_queue.queue_depth()}, "
+        f"~{plan['estimate']['total_tokens']} tokens planned)"
+    )
 
     return Response(
-        jsonable_encoder(json.dumps({"job_id": job_id, "status": "queued"}))
+        jsonable_encoder(json.dumps({"job_id": job_id, "status": "queued", "plan": plan}))
     )
 
 @app.get("/status/{job_id}")
 async def job_status(job_id: str):
-    print(f"DEBUG: Status check for job {job_id}")
-    print(f"DEBUG: Available jobs: {list(jobs.keys())}")
-    
-    job = jobs.get(job_id)
+    job = job_queue.get(job_id)
     if not job:
         print(f"DEBUG: Job {job_id} not found!")
         return Response(
@@ -252,31 +430,138 @@ async def job_status(job_id: str):
             status_code=404
         )
     
-    response_data = {
-        "job_id": job_id, 
-        "status": job["status"],
-        "progress": job["progress"],
-        "current_question": job["current_question"],
-        "total_questions": job["total_questions"]
-    }
-    
-    # Include current Q&A for real-time display
-    if job.get("current_qa"):
-        response_data["current_qa"] = job["current_qa"]
-    
-    # Include file path when job is done
-    if job["status"] == "done" and job.get("file"):
-        response_data["file"] = job["file"]
-        professional_name = os.path.basename(job["file"])
-        response_data["download_filename"] = professional_name
-    
-    # Include error if failed
-    if job["status"] == "failed" and job.get("error"):
-        response_data["error"] = job["error"]
-    
-    print(f"DEBUG: Returning status for job {job_id}: {job['status']}")
+    response_data = job_status_payload(job_id, job)
+
+    # Token plan chosen at /analyze time, to compare with the tokens actually used
+    if job["payload"].get("plan"):
+        response_data["plan"] = job["payload"]["plan"]
+
+    # Per-stage timings and tokens (PDF load, splitting, LLM, embedding, retrieval...) of this job
+    timings = job_breakdown(job_id)
+    if timings is not None:
+        response_data["timings"] = timings
     return Response(jsonable_encoder(json.dumps(response_data)))
 
+@app.get("/metrics")
+async def metrics():
+    """
+    Prometheus metrics: stage latency histograms, queue depth, in-flight
+    LLM calls, token counts and cache hit rates
+    """
+    QUEUE_DEPTH.set(job_queue.queue_depth())
+    return Response(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.post("/resume/{job_id}")
+async def resume_job(job_id: str):
+    """
+    Re-queue a failed job. Its checkpoint (generated questions and answered
+    rows) is reused, so only the remaining questions are answered.
+    """
+    job = job_queue.get(job_id)
+    if not job:
+        return Response(
+            jsonable_encoder(json.dumps({"error": "Job ID not found."})),
+            status_code=404
+        )
+    if job["status"] != "failed":
+        return Response(
+            jsonable_encoder(json.dumps({"error": f"Job is {job['status']}; only failed jobs can be resumed."})),
+            status_code=409
+        )
+
+    completed = len(JobCheckpoint(job_id).rows())
+
+    # Old events end with 'failed'; new subscribers should only see the resumed run
+    job_events.clear(job_id)
+    job_queue.requeue(job_id)
+    queued = job_status_payload(job_id, job_queue.get(job_id))
+    queued.pop("current_qa", None)
+    job_events.publish(job_id, "status", queued)
+
+    print(f"DEBUG: Resuming job {job_id} with {completed} answered question(s)")
+    return Response(
+        jsonable_encoder(json.dumps({"job_id": job_id, "status": "queued", "completed_questions": completed}))
+    )
+
+@app.get("/events/{job_id}")
+async def job_event_stream(job_id: str, request: Request):
+    """
+    Server-Sent Events stream of a job: a 'status' event on every progress
+    change and a 'qa' event for each answered question, in order. Reconnecting
+    clients send Last-Event-ID and only receive what they missed.
+    """
+    job = job_queue.get(job_id)
+    if not job:
+        return Response(
+            jsonable_encoder(json.dumps({"error": "Job ID not found."})),
+            status_code=404
+        )
+
+    def is_final_event(item):
+        return item["event"] == "status" and item["data"]["status"] in ("done", "failed")
+
+    try:
+        last_event_id = int(request.headers.get("last-event-id", -1))
+    except ValueError:
+        last_event_id = -1
+
+    async def stream():
+        backlog, queue = job_events.subscribe(job_id, after=last_event_id)
+        try:
+            # Missed events first: a final status must not reach the client
+            # before the qa rows that precede it, or it stops listening early
+            for item in backlog:
+                yield format_sse(item["event"], item["data"], item["id"])
+                if is_final_event(item):
+                    return
+
+            snapshot = job_status_payload(job_id, job_queue.get(job_id))
+            snapshot.pop("current_qa", None)
+            if snapshot["status"] in ("done", "failed"):
+                # Finished while subscribing (its last events are on their way) or
+                # without publishing (history lost on restart): pass on whatever
+                # arrives, then end with the snapshot
+                while True:
+                    try:
+                        item = await asyncio.wait_for(queue.get(), timeout=SSE_FINAL_WAIT_SECONDS)
+                    except asyncio.TimeoutError:
+                        yield format_sse("status", snapshot)
+                        return
+                    yield format_sse(item["event"], item["data"], item["id"])
+                    if is_final_event(item):
+                        return
+
+            # Nothing to replay: current snapshot, so late subscribers render immediately
+            if not backlog:
+                yield format_sse("status", snapshot)
+
+            while True:
+                try:
+                    item = await asyncio.wait_for(queue.get(), timeout=SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    # Job may have been finished by a path that does not publish (e.g. worker crash)
+                    current = job_queue.get(job_id)
+                    if current and current["status"] in ("done", "failed"):
+                        final = job_status_payload(job_id, current)
+                        final.pop("current_qa", None)
+                        yield format_sse("status", final)
+                        return
+                    yield ": keep-alive\n\n"
+                    continue
+                yield format_sse(item["event"], item["data"], item["id"])
+                if is_final_event(item):
+                    return
+        finally:
+            job_events.unsubscribe(job_id, queue)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 # ───────────────────────────────────────────────
 # Run Server
 # ───────────────────────────────────────────────
@@ -0,0 +1,72 @@
+"""
+Benchmark: offline BM25 retrieval over the PDFs in static/docs.
+
+Every PDF is chunked with the pipeline's answer-chunk settings, a BM25 index
+is built over all chunks and a set of questions is searched. No API key or
+network access is needed. Run from the repository root:
+
+    python -m benchmarks.bench_bm25 [--docs static/docs] [--k 6] [--query "..."]
+"""
+import argparse
+import glob
+import os
+import time
+
+from src.bm25 import BM25Index
+from src.chunking import split_single_pass
+from src.extract import extract_pages
+
+
+ENCODING_NAME = "cl100k_base"
+QUES_CHUNK_SIZE = 10000
+ANS_CHUNK_SIZE = 2000
+CHUNK_OVERLAP = 200
+
+DEFAULT_QUERIES = [
+    "What are the targets for clean water and sanitation?",
+    "How is extreme poverty defined?",
+    "Which indicators measure access to electricity?",
+    "What does the goal say about quality education?",
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", default="static/docs", help="folder with the PDFs to index")
+    parser.add_argument("--k", type=int, default=6, help="chunks returned per question")
+    parser.add_argument("--query", action="append", help="question to search (repeatable)")
+    parser.add_argument("--repeat", type=int, default=100, help="searches per question for timing")
+    args = parser.parse_args()
+
+    chunks = []
+    for path in sorted(glob.glob(os.path.join(args.docs, "*.pdf"))):
+        try:
+            pages = extract_pages(path)
+        except Exception as e:
+            print(f"{os.path.basename(path)}: skipped ({e})")
+            continue
+        _, docs_ans_gen = split_single_pass(
+            pages, ENCODING_NAME, QUES_CHUNK_SIZE, ANS_CHUNK_SIZE, CHUNK_OVERLAP, source=path
+        )
+        chunks.extend(docs_ans_gen)
+
+    start = time.perf_counter()
+    index = BM25Index.from_documents(chunks)
+    build_time = time.perf_counter() - start
+    print(f"Indexed {len(chunks)} chunks in {build_time * 1000:.1f}ms: {index.stats()}")
+
+    for query in args.query or DEFAULT_QUERIES:
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            ids, scores = index.search(query, args.k)
+        per_query = (time.perf_counter() - start) / args.repeat
+        print(f"\n{query}  ({per_query * 1000:.2f}ms/query)")
+        for i, score in zip(ids, scores):
+            doc = chunks[i]
+            name = os.path.basename(doc.metadata.get("source", ""))
+            preview = " ".join(doc.page_content.split())[:80]
+            print(f"  {score:6.2f}  {name} p{doc.metadata.get('page_start')}  {preview}")
+
+
+if __name__ == "__main__":
+    main()
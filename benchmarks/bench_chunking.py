@@ -0,0 +1,73 @@
+"""
+Benchmark: single-pass chunking vs the two-TokenTextSplitter path.
+
+Pages of every PDF in static/docs are extracted once up front, so only the
+chunking step is timed. Run from the repository root:
+
+    python -m benchmarks.bench_chunking [--repeat 3] [--docs static/docs]
+"""
+import argparse
+import glob
+import os
+import time
+
+from langchain_community.document_loaders import PyPDFLoader
+
+from src.chunking import split_single_pass, split_with_text_splitters
+
+
+ENCODING_NAME = "cl100k_base"
+QUES_CHUNK_SIZE = 10000
+ANS_CHUNK_SIZE = 2000
+CHUNK_OVERLAP = 200
+
+
+def best_of(fn, repeat):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", default="static/docs", help="folder with the PDFs to chunk")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per method (best time is reported)")
+    args = parser.parse_args()
+
+    print(f"{'document':<60} {'splitters':>10} {'single':>10} {'speedup':>8} {'chunks':>10}")
+    total_old = total_new = 0.0
+    for path in sorted(glob.glob(os.path.join(args.docs, "*.pdf"))):
+        try:
+            pages = [(p.metadata.get("page", i), p.page_content) for i, p in enumerate(PyPDFLoader(path).load())]
+        except Exception as e:
+            print(f"{os.path.basename(path)[:60]:<60} skipped: {e}")
+            continue
+        text = "".join(t + "\n" for _, t in pages)
+
+        old_time, (old_q, old_a) = best_of(
+            lambda: split_with_text_splitters(text, ENCODING_NAME, QUES_CHUNK_SIZE, ANS_CHUNK_SIZE, CHUNK_OVERLAP),
+            args.repeat
+        )
+        new_time, (new_q, new_a) = best_of(
+            lambda: split_single_pass(pages, ENCODING_NAME, QUES_CHUNK_SIZE, ANS_CHUNK_SIZE, CHUNK_OVERLAP),
+            args.repeat
+        )
+        total_old += old_time
+        total_new += new_time
+
+        chunks = f"{len(new_q)}/{len(new_a)}"
+        if (len(old_q), len(old_a)) != (len(new_q), len(new_a)):
+            chunks += f" (!= {len(old_q)}/{len(old_a)})"
+        name = os.path.basename(path)[:60]
+        print(f"{name:<60} {old_time:>9.3f}s {new_time:>9.3f}s {old_time / max(new_time, 1e-9):>7.1f}x {chunks:>10}")
+
+    if total_new:
+        print(f"{'TOTAL':<60} {total_old:>9.3f}s {total_new:>9.3f}s {total_old / total_new:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+"""
+Benchmark the PDF text extraction backends over static/docs and pick the
+fastest one whose text is equivalent to the reference (pypdf) output.
+
+    python -m benchmarks.bench_extract [--docs static/docs] [--workers 4] [--min-similarity 0.97]
+
+Set the winner with QA_PDF_BACKEND=<name>.
+"""
+import argparse
+import glob
+import os
+
+from src.extract import benchmark_backends, EXTRACT_WORKERS
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", default="static/docs", help="folder with the PDFs to extract")
+    parser.add_argument("--workers", type=int, default=EXTRACT_WORKERS, help="extraction processes per document")
+    parser.add_argument("--reference", default="pypdf", help="backend whose text is treated as correct")
+    parser.add_argument("--min-similarity", type=float, default=0.97, help="minimum word overlap with the reference")
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(os.path.join(args.docs, "*.pdf")))
+    report, best = benchmark_backends(
+        paths, reference=args.reference, min_similarity=args.min_similarity, workers=args.workers
+    )
+
+    print(f"{'backend':<12} {'seconds':>9} {'similarity':>11} {'errors':>7}")
+    for name, row in sorted(report.items(), key=lambda item: item[1]["seconds"]):
+        print(f"{name:<12} {row['seconds']:>8.2f}s {row['min_similarity']:>11.3f} {row['errors']:>7}")
+    print(f"\nFastest equivalent backend: {best}  (QA_PDF_BACKEND={best})")
+
+
+if __name__ == "__main__":
+    main()
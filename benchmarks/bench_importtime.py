@@ -0,0 +1,73 @@
+"""
+Benchmark: server startup cost of `import app`.
+
+Runs `python -X importtime -c "import app"` in a fresh interpreter, reports
+the total import time and the slowest modules, and fails (exit code 1) if
+the total is over --max-ms or if any of the heavy pipeline packages is
+imported at startup. Run from the repository root:
+
+    python -m benchmarks.bench_importtime [--module app] [--top 15] [--max-ms 1500]
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+
+# Packages that must only be imported when the first job runs
+FORBIDDEN_AT_STARTUP = (
+    "streamlit",
+    "langchain_google_genai",
+    "langchain_community",
+    "langchain_classic",
+    "faiss",
+)
+
+
+def measure(module):
+    """Return [(cumulative_us, self_us, name)] for every module imported by `import module`."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, cwd=os.getcwd(),
+    )
+    if result.returncode != 0:
+        raise SystemExit(f"import {module} failed:\n{result.stderr[-2000:]}")
+
+    entries = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        entries.append((int(cumulative_us), int(self_us), name.strip()))
+    return entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="app", help="module to import")
+    parser.add_argument("--top", type=int, default=15, help="slowest modules to list")
+    parser.add_argument("--max-ms", type=float, default=None, help="fail if the total import time is higher")
+    args = parser.parse_args()
+
+    entries = measure(args.module)
+    total_us = sum(self_us for _, self_us, _ in entries)
+    top_level = {name.split(".")[0] for _, _, name in entries}
+
+    print(f"import {args.module}: {total_us / 1000:.0f}ms across {len(entries)} modules\n")
+    print(f"{'cumulative':>12} {'self':>9}  module")
+    for cumulative_us, self_us, name in sorted(entries, reverse=True)[:args.top]:
+        print(f"{cumulative_us / 1000:10.1f}ms {self_us / 1000:7.1f}ms  {name}")
+
+    failed = False
+    loaded = [m for m in FORBIDDEN_AT_STARTUP if m in top_level]
+    if loaded:
+        print(f"\nFAIL: imported at startup: {', '.join(loaded)}")
+        failed = True
+    if args.max_ms is not None and total_us / 1000 > args.max_ms:
+        print(f"\nFAIL: {total_us / 1000:.0f}ms is over the {args.max_ms:.0f}ms budget")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
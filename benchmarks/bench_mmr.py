@@ -0,0 +1,69 @@
+"""
+Benchmark: vectorized NumPy MMR (src.mmr) vs LangChain's maximal_marginal_relevance.
+
+Random unit embeddings stand in for the FAISS candidates, so only the MMR
+re-ranking step is timed, for a batch of queries at several fetch_k
+values. Run from the repository root:
+
+    python -m benchmarks.bench_mmr [--queries 45] [--dim 768] [--k 6] [--repeat 3]
+"""
+import argparse
+import time
+
+import numpy as np
+from langchain_community.vectorstores.utils import maximal_marginal_relevance
+
+from src.mmr import mmr_select_batch
+
+
+def best_of(fn, repeat):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def langchain_mmr(queries, candidates, k, lambda_mult):
+    return [
+        maximal_marginal_relevance(q, list(c), k=k, lambda_mult=lambda_mult)
+        for q, c in zip(queries, candidates)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=45, help="questions per batch")
+    parser.add_argument("--dim", type=int, default=768, help="embedding dimension")
+    parser.add_argument("--k", type=int, default=6, help="documents selected per question")
+    parser.add_argument("--lambda-mult", type=float, default=0.5)
+    parser.add_argument("--fetch-k", type=int, nargs="+", default=[30, 60, 120, 240])
+    parser.add_argument("--repeat", type=int, default=3, help="runs per method (best time is reported)")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'fetch_k':>8} {'langchain':>10} {'numpy f32':>10} {'numpy f16':>10} {'speedup':>8} {'same':>6}")
+    for fetch_k in args.fetch_k:
+        queries = rng.normal(size=(args.queries, args.dim)).astype(np.float32)
+        candidates = rng.normal(size=(args.queries, fetch_k, args.dim)).astype(np.float32)
+        candidates_f16 = candidates.astype(np.float16)
+
+        lc_time, lc_picks = best_of(lambda: langchain_mmr(queries, candidates, args.k, args.lambda_mult), args.repeat)
+        np_time, np_picks = best_of(
+            lambda: mmr_select_batch(queries, candidates, k=args.k, lambda_mult=args.lambda_mult), args.repeat
+        )
+        f16_time, _ = best_of(
+            lambda: mmr_select_batch(queries, candidates_f16, k=args.k, lambda_mult=args.lambda_mult), args.repeat
+        )
+
+        same = all(list(a) == list(b) for a, b in zip(lc_picks, np_picks))
+        print(
+            f"{fetch_k:>8} {lc_time * 1000:>8.1f}ms {np_time * 1000:>8.1f}ms {f16_time * 1000:>8.1f}ms "
+            f"{lc_time / max(np_time, 1e-9):>7.1f}x {str(same):>6}"
+        )
+
+
+if __name__ == "__main__":
+    main()
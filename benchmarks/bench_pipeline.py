@@ -0,0 +1,386 @@
+"""
+Benchmark: end-to-end pipeline throughput over every PDF in static/docs.
+
+Each PDF runs as one job through the app's own entry point (app.run_job ->
+generate_csv: preprocessing, question generation, index build, answering
+and the CSV), with the fake simulated-latency backend (src/fake_llm.py)
+instead of the Gemini API. Every document runs in its own subprocess, so
+its peak RSS is its own and not the running maximum of earlier documents.
+Reported per document and in total: wall time per phase, time spent in
+each traced stage, p50/p95 answer completion latency, peak RSS, and LLM /
+embedding calls and tokens. Results are written to a JSON file; --compare
+diffs two of them and exits with code 1 when a metric got worse by more
+than --threshold.
+
+Caches and job data start empty in temporary folders unless --cache-dir
+is given, so a run measures cold-start work. No API key or network access
+is needed once tiktoken's cl100k_base file is in its local cache. Run from
+the repository root:
+
+    python -m benchmarks.bench_pipeline [--docs static/docs] [--output bench_pipeline.json]
+    python -m benchmarks.bench_pipeline --compare base.json new.json [--threshold 0.10]
+"""
+import argparse
+import asyncio
+import contextlib
+import glob
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+# Wall-clock phases of a job, measured from its event stream
+PHASES = ("pipeline", "answering", "output")
+
+# Seconds spent in each traced stage (src.metrics spans), summed over concurrent calls
+STAGES = ("pdf_load", "pdf_load_and_split", "split", "question_generation", "embedding", "faiss_build",
+          "retrieval", "summarization", "answering")
+
+# Metrics compared by --compare (lower is better for all of them)
+COMPARED_METRICS = (
+    ["wall_seconds"]
+    + [f"phase_seconds.{phase}" for phase in PHASES]
+    + [f"stage_seconds.{stage}" for stage in STAGES]
+    + ["latency_p50", "latency_p95", "peak_rss_mb",
+       "usage.chat.calls", "usage.chat.input_tokens", "usage.chat.output_tokens",
+       "usage.embeddings.calls", "usage.embeddings.input_tokens"]
+)
+
+# Changes below this many seconds / MB / calls are treated as noise
+ABSOLUTE_TOLERANCE = 0.05
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def peak_rss_mb():
+    """Peak RSS of this process (each document runs in its own)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    return round(peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024, 1)
+
+
+def percentile(values, q):
+    return round(float(np.percentile(values, q)), 4) if values else None
+
+
+def add_usage(total, usage):
+    for kind, amounts in usage.items():
+        bucket = total.setdefault(kind, {})
+        for name, value in amounts.items():
+            bucket[name] = round(bucket.get(name, 0) + value, 3)
+
+
+# ───────────────────────────────────────────────
+# One document (runs in a subprocess)
+# ───────────────────────────────────────────────
+class JobTimeline:
+    """
+    Listens to a job's progress events the way an SSE client does and
+    records when answering started (the first status carrying
+    total_questions) and when every Q&A row was published.
+    """
+
+    def __init__(self, events, job_id):
+        self.answering_started = None
+        self.answered = []
+        self._loop = asyncio.new_event_loop()
+        subscribed = threading.Event()
+        self._thread = threading.Thread(
+            target=self._loop.run_until_complete, args=(self._listen(events, job_id, subscribed),), daemon=True
+        )
+        self._thread.start()
+        subscribed.wait()
+
+    async def _listen(self, events, job_id, subscribed):
+        _, queue = events.subscribe(job_id)
+        subscribed.set()
+        try:
+            while True:
+                item = await queue.get()
+                now = time.perf_counter()
+                data = item["data"]
+                if item["event"] == "qa":
+                    self.answered.append(now)
+                elif self.answering_started is None and data.get("total_questions"):
+                    self.answering_started = now
+                if item["event"] == "status" and data.get("status") in ("done", "failed"):
+                    return
+        finally:
+            events.unsubscribe(job_id, queue)
+
+    def close(self, timeout=10):
+        self._thread.join(timeout)
+        if not self._thread.is_alive():
+            self._loop.close()
+
+
+def run_document(path, max_questions=None):
+    import app
+    from src.metrics import job_breakdown
+    from src.fake_llm import usage_totals
+
+    job_id = f"bench-{uuid.uuid4()}"
+    # The plan's question cap is applied by llm_pipeline, like a budgeted job's
+    payload = {"file_path": path, "original_filename": os.path.basename(path),
+               "plan": {"max_questions": max_questions} if max_questions else None}
+    app.job_queue.enqueue(job_id, payload)
+
+    timeline = JobTimeline(app.job_events, job_id)
+    doc_start = time.perf_counter()
+    app.run_job(job_id, payload)
+    doc_end = time.perf_counter()
+    timeline.close()
+
+    job = app.job_queue.get(job_id)
+    if job["status"] != "done":
+        raise RuntimeError(job.get("error") or f"job ended as {job['status']}")
+    if job.get("file") and os.path.exists(job["file"]):
+        os.remove(job["file"])
+
+    # Answer completion latency: time from the start of answering until each row is published
+    answering_start = timeline.answering_started or doc_end
+    answered_end = timeline.answered[-1] if timeline.answered else answering_start
+    latencies = [t - answering_start for t in timeline.answered]
+    breakdown = job_breakdown(job_id) or {"stages": {}}
+
+    return {
+        "document": os.path.basename(path),
+        "questions": job["total_questions"],
+        "wall_seconds": round(doc_end - doc_start, 3),
+        "phase_seconds": {
+            "pipeline": round(answering_start - doc_start, 3),
+            "answering": round(answered_end - answering_start, 3),
+            "output": round(doc_end - answered_end, 3),
+        },
+        "stage_seconds": {
+            stage: breakdown["stages"].get(stage, {}).get("seconds", 0.0) for stage in STAGES
+        },
+        "latency_kind": "completion",
+        "latency_p50": percentile(latencies, 50),
+        "latency_p95": percentile(latencies, 95),
+        "latencies": [round(x, 4) for x in latencies],
+        "peak_rss_mb": peak_rss_mb(),
+        "usage": usage_totals(),
+    }
+
+
+def document_main(args):
+    """Subprocess entry point: benchmark one document and write its result as JSON."""
+    try:
+        result = run_document(os.path.abspath(args.document), args.max_questions)
+    except Exception as e:
+        result = {"document": os.path.basename(args.document), "error": f"{type(e).__name__}: {e}"}
+    with open(args.result, "w", encoding="utf-8") as f:
+        json.dump(result, f)
+
+
+# ───────────────────────────────────────────────
+# Benchmark run
+# ───────────────────────────────────────────────
+def configure_environment(args):
+    """Settings are read from the environment when src modules are imported; subprocesses inherit them."""
+    os.environ["QA_LLM_PROVIDER"] = args.provider
+    os.environ["QA_CACHE_DIR"] = args.cache_dir or tempfile.mkdtemp(prefix="qa-bench-cache-")
+    # Job rows and checkpoints never touch the real data folder
+    os.environ["QA_DATA_DIR"] = tempfile.mkdtemp(prefix="qa-bench-data-")
+    if args.no_answer_cache:
+        # No cosine similarity reaches 2, so every lookup misses
+        os.environ["QA_ANSWER_CACHE_THRESHOLD"] = "2"
+    for flag, var in (("latency_ms", "QA_FAKE_LATENCY_MS"), ("jitter_ms", "QA_FAKE_JITTER_MS"),
+                      ("tokens_per_second", "QA_FAKE_TOKENS_PER_SECOND"),
+                      ("embed_latency_ms", "QA_FAKE_EMBED_LATENCY_MS"),
+                      ("rate_limit_rate", "QA_FAKE_RATE_LIMIT_RATE"), ("seed", "QA_FAKE_SEED"),
+                      ("rpm", "QA_REQUESTS_PER_MINUTE")):
+        value = getattr(args, flag)
+        if value is not None:
+            os.environ[var] = str(value)
+
+
+def run_in_subprocess(path, args):
+    """Benchmark `path` in a fresh interpreter; returns its result dict."""
+    fd, result_path = tempfile.mkstemp(prefix="qa-bench-", suffix=".json")
+    os.close(fd)
+    command = [sys.executable, "-m", "benchmarks.bench_pipeline", "--document", os.path.abspath(path),
+               "--result", result_path]
+    if args.max_questions:
+        command += ["--max-questions", str(args.max_questions)]
+    try:
+        # The pipeline logs every chain step; keep the report readable
+        proc = subprocess.run(command, cwd=ROOT, text=True, stdout=None if args.verbose else subprocess.PIPE,
+                              stderr=None if args.verbose else subprocess.STDOUT)
+        try:
+            with open(result_path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            log = (proc.stdout or "").strip().splitlines()[-5:]
+            return {"document": os.path.basename(path),
+                    "error": f"exit code {proc.returncode}: " + " / ".join(log)}
+    finally:
+        os.remove(result_path)
+
+
+def summarize(documents):
+    ok = [d for d in documents if "error" not in d]
+    latencies = [x for d in ok for x in d["latencies"]]
+    usage = {}
+    for d in ok:
+        add_usage(usage, d["usage"])
+    peaks = [d["peak_rss_mb"] for d in ok if d["peak_rss_mb"] is not None]
+    return {
+        "documents": len(ok),
+        "failed": len(documents) - len(ok),
+        "questions": sum(d["questions"] for d in ok),
+        "wall_seconds": round(sum(d["wall_seconds"] for d in ok), 3),
+        "phase_seconds": {phase: round(sum(d["phase_seconds"][phase] for d in ok), 3) for phase in PHASES},
+        "stage_seconds": {stage: round(sum(d["stage_seconds"][stage] for d in ok), 3) for stage in STAGES},
+        "latency_p50": percentile(latencies, 50),
+        "latency_p95": percentile(latencies, 95),
+        # Largest per-document peak (documents run in separate processes)
+        "peak_rss_mb": max(peaks) if peaks else None,
+        "usage": usage,
+    }
+
+
+def run(args):
+    configure_environment(args)
+    paths = sorted(glob.glob(os.path.join(args.docs, "*.pdf")))
+    if not paths:
+        raise SystemExit(f"No PDFs found in {args.docs}")
+
+    documents = []
+    for path in paths:
+        name = os.path.basename(path)
+        result = run_in_subprocess(path, args)
+        documents.append(result)
+        if "error" in result:
+            print(f"{name}: failed ({result['error']})")
+            continue
+        phases = "  ".join(f"{p}={result['phase_seconds'][p]:.2f}s" for p in PHASES)
+        print(
+            f"{name}: {result['questions']} questions in {result['wall_seconds']:.2f}s  "
+            f"p50={result['latency_p50']}s p95={result['latency_p95']}s  "
+            f"peak RSS {result['peak_rss_mb']} MB\n    {phases}"
+        )
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        from src.answering import ANSWER_MODE
+        from src.retrieval import RETRIEVAL_MODE
+        from src.compression import CONTEXT_COMPRESSION
+    report = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "config": {
+            "provider": os.environ["QA_LLM_PROVIDER"],
+            "docs": args.docs,
+            "max_questions": args.max_questions,
+            "answer_cache": not args.no_answer_cache,
+            "answer_mode": ANSWER_MODE,
+            "retrieval_mode": RETRIEVAL_MODE,
+            "context_compression": CONTEXT_COMPRESSION,
+            "fake_backend": {k: v for k, v in os.environ.items() if k.startswith("QA_FAKE_")},
+            "requests_per_minute": os.getenv("QA_REQUESTS_PER_MINUTE"),
+        },
+        "documents": documents,
+        "totals": summarize(documents),
+    }
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    totals = report["totals"]
+    print(
+        f"\nTotal: {totals['questions']} questions over {totals['documents']} documents in "
+        f"{totals['wall_seconds']:.2f}s, p50={totals['latency_p50']}s p95={totals['latency_p95']}s, "
+        f"largest peak RSS {totals['peak_rss_mb']} MB"
+    )
+    print(f"Usage: {json.dumps(totals['usage'])}")
+    print(f"Results written to {args.output}")
+
+
+# ───────────────────────────────────────────────
+# Compare mode
+# ───────────────────────────────────────────────
+def metric(totals, dotted):
+    value = totals
+    for part in dotted.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return value
+
+
+def compare(base_path, new_path, threshold):
+    with open(base_path, encoding="utf-8") as f:
+        base = json.load(f)["totals"]
+    with open(new_path, encoding="utf-8") as f:
+        new = json.load(f)["totals"]
+
+    if base.get("questions") != new.get("questions"):
+        print(f"Note: question count differs ({base.get('questions')} -> {new.get('questions')})\n")
+
+    regressions = []
+    print(f"{'metric':34} {'base':>12} {'new':>12} {'change':>9}")
+    for name in COMPARED_METRICS:
+        old, cur = metric(base, name), metric(new, name)
+        if old is None or cur is None:
+            continue
+        change = (cur - old) / old if old else (0.0 if cur == old else float("inf"))
+        flag = ""
+        if change > threshold and cur - old > ABSOLUTE_TOLERANCE:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print(f"{name:34} {old:12.3f} {cur:12.3f} {change:+8.1%}{flag}")
+
+    if regressions:
+        print(f"\nFAIL: {len(regressions)} metric(s) regressed by more than {threshold:.0%}: {', '.join(regressions)}")
+        return 1
+    print(f"\nOK: no metric regressed by more than {threshold:.0%}")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", default="static/docs", help="folder with the PDFs to process")
+    parser.add_argument("--output", default="bench_pipeline.json", help="JSON result file")
+    parser.add_argument("--provider", default="fake", help="LLM backend (QA_LLM_PROVIDER)")
+    parser.add_argument("--cache-dir", help="reuse this cache folder (warm run) instead of a fresh one")
+    parser.add_argument("--max-questions", type=int, help="answer at most this many questions per document")
+    parser.add_argument("--no-answer-cache", action="store_true", help="answer every question with the LLM")
+    parser.add_argument("--latency-ms", type=float, help="fake chat latency (QA_FAKE_LATENCY_MS)")
+    parser.add_argument("--jitter-ms", type=float, help="fake chat jitter (QA_FAKE_JITTER_MS)")
+    parser.add_argument("--tokens-per-second", type=float, help="fake generation speed (QA_FAKE_TOKENS_PER_SECOND)")
+    parser.add_argument("--embed-latency-ms", type=float, help="fake embedding latency (QA_FAKE_EMBED_LATENCY_MS)")
+    parser.add_argument("--rate-limit-rate", type=float, help="fraction of simulated 429s (QA_FAKE_RATE_LIMIT_RATE)")
+    parser.add_argument("--seed", help="seed for jitter and 429 draws (QA_FAKE_SEED)")
+    parser.add_argument("--rpm", type=int, help="requests per minute allowed by the rate limiter")
+    parser.add_argument("--verbose", action="store_true", help="show the pipeline's own logs")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "NEW"), help="diff two result files instead of running")
+    parser.add_argument("--threshold", type=float, default=0.10, help="relative change counted as a regression")
+    # Internal: run a single document in this process (used for the per-document subprocesses)
+    parser.add_argument("--document", help=argparse.SUPPRESS)
+    parser.add_argument("--result", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.document:
+        sys.exit(document_main(args))
+    if args.compare:
+        sys.exit(compare(*args.compare, args.threshold))
+    run(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,7 +5,20 @@ import pandas as pd
 import time
 from datetime import datetime
 import base64
+
+# The pipeline reads its configuration from the environment; Streamlit
+# secrets (.streamlit/secrets.toml) fill in the API key when it is not exported
+try:
+    if "GOOGLE_API_KEY" in st.secrets and not os.getenv("GOOGLE_API_KEY"):
+        os.environ["GOOGLE_API_KEY"] = st.secrets["GOOGLE_API_KEY"]
+except Exception:
+    pass
+
 from src.helper import llm_pipeline
+from src.rate_limiter import get_rate_limiter
+from src.answering import answer_question, answer_in_batches, build_combine_chain, extract_answer, ANSWER_MODE
+from src.answer_cache import get_answer_cache
+from src.retrieval import retrieve_all, retriever_embeddings
 
 # Page configuration
 st.set_page_config(
@@ -331,6 +344,31 @@ def process_document(uploaded_file):
             
             total_questions = len(ques_list)
             qa_data = []
+
+            # Near-duplicate questions over the same retrieved chunks are served from the answer cache
+            answer_cache = None
+            if retriever is not None and llm_answer_gen is not None:
+                combine_chain = build_combine_chain(llm_answer_gen)
+                answer_cache = get_answer_cache(
+                    retriever_embeddings(retriever), getattr(llm_answer_gen, "model", "")
+                )
+
+            # Batched mode: questions with overlapping context share one answer call
+            batched_answers = None
+            if answer_cache is not None and ANSWER_MODE == "batched":
+                batched_answers = answer_in_batches(
+                    [clean_text(q) for q in ques_list], retriever, llm_answer_gen, combine_chain,
+                    answer_cache=answer_cache, rate_limiter=get_rate_limiter()
+                )
+
+            # Otherwise retrieve context for every question with one batched embedding call and search
+            prefetched = {}
+            if answer_cache is not None and batched_answers is None:
+                clean_questions = [clean_text(q) for q in ques_list]
+                try:
+                    prefetched = dict(zip(clean_questions, retrieve_all(retriever, clean_questions)))
+                except Exception as e:
+                    print(f"DEBUG: Batch retrieval failed, retrieving per question: {e}")
             
             # Process each question
             for i, question in enumerate(ques_list):
@@ -348,12 +386,18 @@ def process_document(uploaded_file):
                 
                 # Get answer
                 try:
-                    response = answer_generation_chain.invoke({"input": clean_question})
-                    
-                    if isinstance(response, dict):
-                        answer = response.get("answer") or response.get("output") or response.get("result") or str(response)
+                    if batched_answers is not None:
+                        answer = next(batched_answers)[2]
+                    elif answer_cache is not None:
+                        answer = answer_question(
+                            clean_question, retriever, combine_chain,
+                            answer_cache=answer_cache, rate_limiter=get_rate_limiter(),
+                            docs=prefetched.get(clean_question)
+                        )
                     else:
-                        answer = str(response)
+                        answer = extract_answer(get_rate_limiter().call(
+                            answer_generation_chain.invoke, {"input": clean_question}
+                        ))
                     
                     clean_answer = clean_text(answer.strip())
                     
@@ -376,9 +420,6 @@ def process_document(uploaded_file):
                 
                 # Add to session state list
                 st.session_state.qa_list = qa_data
-                
-                # Small delay to show progress
-                time.sleep(2)
             
             # Complete processing
             overall_progress.progress(1.0)
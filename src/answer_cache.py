@@ -0,0 +1,302 @@
+import os
+import time
+import hashlib
+import sqlite3
+import threading
+
+import numpy as np
+
+from src.cache import CACHE_DIR
+from src.metrics import record_cache
+
+
+# Minimum cosine similarity between question embeddings for a cache hit
+ANSWER_CACHE_THRESHOLD = float(os.getenv("QA_ANSWER_CACHE_THRESHOLD", "0.95"))
+
+# Seconds a cached answer stays valid
+ANSWER_CACHE_TTL = float(os.getenv("QA_ANSWER_CACHE_TTL_HOURS", str(24 * 30))) * 3600
+
+# Maximum number of cached answers (least-recently-used are evicted)
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("QA_ANSWER_CACHE_MAX_ENTRIES", "20000"))
+
+
+def embedding_model_name(embeddings):
+    """
+    Identity of an embedding model: CachedEmbeddings' cache name, a client's
+    model name, or the class name as a last resort. Question vectors are
+    only comparable between entries of the same embedding model.
+    """
+    name = getattr(embeddings, "model_name", None) or getattr(embeddings, "model", None)
+    return str(name) if name else type(embeddings).__name__
+
+
+def context_hash(docs, model_name=""):
+    """
+    Order-independent hash of the retrieved chunks plus the answering model:
+    the same question over the same chunks with the same model is the same call.
+    """
+    chunk_hashes = sorted(
+        hashlib.sha256(doc.page_content.encode("utf-8")).hexdigest() for doc in docs
+    )
+    raw = "\x00".join([model_name] + chunk_hashes)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class _ContextBucket:
+    """
+    Cached entries sharing one context hash. Rows live in preallocated
+    arrays that grow by doubling, so appending does not copy on every insert.
+    """
+
+    def __init__(self, dim, capacity=4):
+        self.n = 0
+        self.ids = np.zeros(capacity, dtype=np.int64)
+        self.matrix = np.zeros((capacity, dim), dtype=np.float32)
+        self.created = np.zeros(capacity, dtype=np.float64)
+        self.last_used = np.zeros(capacity, dtype=np.float64)
+        self.answers = []
+
+    def append(self, entry_id, vector, answer, created, last_used):
+        if self.n == len(self.ids):
+            capacity = 2 * len(self.ids)
+            self.ids = np.resize(self.ids, capacity)
+            self.created = np.resize(self.created, capacity)
+            self.last_used = np.resize(self.last_used, capacity)
+            matrix = np.zeros((capacity, self.matrix.shape[1]), dtype=np.float32)
+            matrix[:self.n] = self.matrix[:self.n]
+            self.matrix = matrix
+        self.ids[self.n] = entry_id
+        self.matrix[self.n] = vector
+        self.created[self.n] = created
+        self.last_used[self.n] = last_used
+        self.answers.append(answer)
+        self.n += 1
+
+    def best_match(self, vector, cutoff):
+        """(row, cosine similarity) of the closest entry created at or after `cutoff` (-inf if none)."""
+        scores = self.matrix[:self.n] @ vector
+        scores[self.created[:self.n] < cutoff] = -np.inf
+        best = int(np.argmax(scores))
+        return best, float(scores[best])
+
+    def keep(self, mask):
+        """Drop the rows where `mask` is False; returns the dropped entry ids."""
+        dropped = self.ids[:self.n][~mask]
+        rows = np.flatnonzero(mask)
+        self.ids[:len(rows)] = self.ids[rows]
+        self.matrix[:len(rows)] = self.matrix[rows]
+        self.created[:len(rows)] = self.created[rows]
+        self.last_used[:len(rows)] = self.last_used[rows]
+        self.answers = [self.answers[i] for i in rows]
+        self.n = len(rows)
+        return dropped
+
+
+class SemanticAnswerCache:
+    """
+    Answer cache keyed by question embedding plus retrieved-context hash.
+    Entries are scoped to the answering model and to the embedding model
+    that produced their question vectors (`embedding_model`, by default
+    derived from `embeddings`).
+
+    Live entries are kept in memory per context hash, each bucket as one
+    row-normalized float32 matrix, so a lookup is a single matrix-vector
+    product over the entries with the same context only: the best-scoring
+    one with a cosine similarity >= `threshold` is a hit. Entries are
+    persisted in SQLite and expire after `ttl_seconds`. Beyond `max_entries`
+    the expired and least-recently-used entries are evicted in one batch,
+    down to EVICT_TO of the limit, so eviction cost is amortized over many stores.
+    """
+
+    # Fraction of max_entries kept after an eviction pass
+    EVICT_TO = 0.9
+
+    def __init__(self, embeddings, model_name, db_path=None, threshold=ANSWER_CACHE_THRESHOLD,
+                 ttl_seconds=ANSWER_CACHE_TTL, max_entries=ANSWER_CACHE_MAX_ENTRIES, clock=time.time,
+                 embedding_model=None):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.embedding_model = embedding_model or embedding_model_name(embeddings)
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.clock = clock
+        self.db_path = db_path or os.path.join(CACHE_DIR, "answers.sqlite")
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS answers ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, model TEXT, context_hash TEXT, "
+            "question TEXT, answer TEXT, vector BLOB, created_at REAL, last_used REAL, embedding_model TEXT)"
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(answers)")}
+        if "embedding_model" not in columns:
+            # Tables from before embedding scoping: their rows have no embedding model and never match
+            self._conn.execute("ALTER TABLE answers ADD COLUMN embedding_model TEXT")
+        self._conn.commit()
+        self._load()
+
+    # ───────────────────────────────────────────
+    # In-memory index
+    # ───────────────────────────────────────────
+    def _reset(self, dim):
+        self._dim = dim
+        self._buckets = {}
+        self._size = 0
+
+    def _load(self):
+        """Read the live entries of this answering and embedding model into the in-memory buckets."""
+        cutoff = self.clock() - self.ttl_seconds
+        with self._lock:
+            self._conn.execute("DELETE FROM answers WHERE created_at < ?", (cutoff,))
+            self._conn.commit()
+            rows = self._conn.execute(
+                "SELECT id, context_hash, answer, vector, created_at, last_used "
+                "FROM answers WHERE model = ? AND embedding_model = ? ORDER BY id",
+                (self.model_name, self.embedding_model)
+            ).fetchall()
+
+        # Only entries from the current embedding dimension can be compared
+        dim = len(rows[-1][3]) // 4 if rows else None
+        self._reset(dim)
+        for entry_id, ctx, answer, blob, created, last_used in rows:
+            if len(blob) == dim * 4:
+                self._add(entry_id, ctx, np.frombuffer(blob, dtype=np.float32), answer, created, last_used)
+
+    def _add(self, entry_id, ctx, vector, answer, created, last_used):
+        bucket = self._buckets.get(ctx)
+        if bucket is None:
+            bucket = self._buckets[ctx] = _ContextBucket(self._dim)
+        bucket.append(entry_id, vector, answer, created, last_used)
+        self._size += 1
+
+    def embed_question(self, question):
+        """Normalized query embedding of `question`, or None if the embedding call fails."""
+        try:
+            vector = np.asarray(self.embeddings.embed_query(question), dtype=np.float32)
+        except Exception as e:
+            # The cache is an optimization: answer without it when embeddings are unavailable
+            print(f"[Answer cache] Embedding failed, cache bypassed: {e}")
+            return None
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    # ───────────────────────────────────────────
+    # Public API
+    # ───────────────────────────────────────────
+    def lookup(self, question, docs, vector=None):
+        """
+        Return the cached answer for `question` over `docs`, or None.
+        `vector` may be passed to reuse an already computed (normalized) embedding.
+        """
+        ctx = context_hash(docs, self.model_name)
+        if vector is None:
+            vector = self.embed_question(question)
+        if vector is None:
+            self.misses += 1
+            record_cache("answers", misses=1)
+            return None
+        now = self.clock()
+
+        with self._lock:
+            bucket = self._buckets.get(ctx)
+            if bucket is not None and self._dim == vector.shape[0]:
+                best, score = bucket.best_match(vector, now - self.ttl_seconds)
+                if score >= self.threshold:
+                    self.hits += 1
+                    record_cache("answers", hits=1)
+                    bucket.last_used[best] = now
+                    self._conn.execute(
+                        "UPDATE answers SET last_used = ? WHERE id = ?", (now, int(bucket.ids[best]))
+                    )
+                    self._conn.commit()
+                    return bucket.answers[best]
+            self.misses += 1
+        record_cache("answers", misses=1)
+        return None
+
+    def store(self, question, docs, answer, vector=None):
+        """Cache `answer` for `question` over `docs`, evicting expired and LRU entries."""
+        ctx = context_hash(docs, self.model_name)
+        if vector is None:
+            vector = self.embed_question(question)
+        if vector is None:
+            return
+        vector = np.ascontiguousarray(vector, dtype=np.float32)
+        now = self.clock()
+
+        with self._lock:
+            cur = self._conn.execute(
+                "INSERT INTO answers (model, embedding_model, context_hash, question, answer, vector, "
+                "created_at, last_used) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (self.model_name, self.embedding_model, ctx, question, answer, vector.tobytes(), now, now),
+            )
+            self._conn.commit()
+
+            if self._dim != vector.shape[0]:
+                # First entry, or the embedding model changed dimension: start afresh
+                self._reset(vector.shape[0])
+            self._add(cur.lastrowid, ctx, vector, answer, now, now)
+            if self._size > self.max_entries:
+                self._evict(now)
+
+    def _evict(self, now):
+        """Drop expired entries, then the least-recently-used down to EVICT_TO of max_entries."""
+        cutoff = now - self.ttl_seconds
+        target = int(self.max_entries * self.EVICT_TO)
+        live_last_used = np.concatenate([
+            b.last_used[:b.n][b.created[:b.n] >= cutoff] for b in self._buckets.values()
+        ])
+        # Entries last used at or before this instant are dropped (ties may drop a few more)
+        lru_cutoff = -np.inf
+        if len(live_last_used) > target:
+            kth = len(live_last_used) - target - 1
+            lru_cutoff = np.partition(live_last_used, kth)[kth]
+
+        dropped = []
+        for ctx in list(self._buckets):
+            bucket = self._buckets[ctx]
+            mask = (bucket.created[:bucket.n] >= cutoff) & (bucket.last_used[:bucket.n] > lru_cutoff)
+            if mask.all():
+                continue
+            dropped.extend(int(i) for i in bucket.keep(mask))
+            if not bucket.n:
+                del self._buckets[ctx]
+        self._size -= len(dropped)
+
+        for start in range(0, len(dropped), 500):
+            part = dropped[start:start + 500]
+            self._conn.execute(f"DELETE FROM answers WHERE id IN ({','.join('?' * len(part))})", part)
+        self._conn.commit()
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self):
+        return {
+            "entries": self._size,
+            "contexts": len(self._buckets),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hit_rate, 4),
+        }
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_answer_cache(embeddings, model_name):
+    """Process-wide answer cache per answering model and embedding model."""
+    key = (model_name, embedding_model_name(embeddings))
+    with _caches_lock:
+        if key not in _caches:
+            _caches[key] = SemanticAnswerCache(embeddings, model_name, embedding_model=key[1])
+        return _caches[key]
@@ -0,0 +1,286 @@
+import os
+import re
+import json
+import hashlib
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.prompts import PromptTemplate
+
+from src.prompt import answer_template, batch_answer_template
+from src.retrieval import retrieve_all
+from src.metrics import span
+
+
+# Number of answer requests kept in flight at once
+ANSWER_CONCURRENCY = int(os.getenv("QA_ANSWER_CONCURRENCY", "4"))
+
+# "single": one answer call per question; "batched": one call per group of related questions
+ANSWER_MODE = os.getenv("QA_ANSWER_MODE", "single")
+
+# Maximum number of questions answered by one batched call
+ANSWER_BATCH_SIZE = int(os.getenv("QA_ANSWER_BATCH_SIZE", "6"))
+
+# Minimum share of retrieved chunks two questions must have in common to be grouped
+ANSWER_BATCH_MIN_OVERLAP = float(os.getenv("QA_ANSWER_BATCH_MIN_OVERLAP", "0.5"))
+
+ANSWER_PROMPT = PromptTemplate.from_template(answer_template)
+BATCH_ANSWER_PROMPT = PromptTemplate.from_template(batch_answer_template)
+
+
+def build_combine_chain(llm):
+    """Stuff retrieved documents into ANSWER_PROMPT and ask `llm` for the answer."""
+    from langchain_classic.chains.combine_documents import create_stuff_documents_chain
+    return create_stuff_documents_chain(llm, ANSWER_PROMPT)
+
+
+def extract_answer(response):
+    """Normalize the different shapes a chain response can take into answer text."""
+    if isinstance(response, dict):
+        return response.get("answer") or response.get("output") or response.get("result") or str(response)
+    return str(response)
+
+
+def answer_in_order(answer_fn, questions, max_workers=ANSWER_CONCURRENCY):
+    """
+    Run `answer_fn(question)` on a bounded thread pool and yield
+    (index, question, result) strictly in question order.
+
+    Up to `max_workers` questions are answered concurrently; results that
+    finish early are held back until every earlier question has completed,
+    so CSV rows and progress updates keep their original sequence.
+    """
+    pool = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="answer")
+    # Each task runs in a copy of the caller's context, so its spans count towards the caller's job
+    futures = [pool.submit(contextvars.copy_context().run, answer_fn, q) for q in questions]
+    try:
+        for idx, (question, future) in enumerate(zip(questions, futures)):
+            yield idx, question, future.result()
+    finally:
+        # If the consumer stops early, drop work that has not started yet
+        for future in futures:
+            future.cancel()
+        pool.shutdown(wait=True)
+
+
+def answer_question(question, retriever, combine_chain, answer_cache=None, rate_limiter=None, docs=None,
+                    compressor=None):
+    """
+    Retrieve context for `question` (unless `docs` were already retrieved,
+    e.g. by retrieve_all) and answer it with `combine_chain`.
+
+    With an `answer_cache`, a near-duplicate question over the same
+    retrieved chunks is answered from the cache without an LLM call.
+    A `compressor` (src.compression.ContextCompressor) shrinks the
+    retrieved docs before the answer call; the cache stays keyed by the
+    retrieved chunks.
+    """
+    if docs is None:
+        docs = retriever.invoke(question)
+    vector = None
+    if answer_cache is not None:
+        vector = answer_cache.embed_question(question)
+        cached = answer_cache.lookup(question, docs, vector=vector) if vector is not None else None
+        if cached is not None:
+            return cached
+
+    context = compressor(question, docs) if compressor is not None else docs
+    payload = {"input": question, "context": context}
+    with span("answering"):
+        if rate_limiter is not None:
+            response = rate_limiter.call(combine_chain.invoke, payload)
+        else:
+            response = combine_chain.invoke(payload)
+    answer = extract_answer(response)
+
+    if vector is not None and answer.strip():
+        answer_cache.store(question, docs, answer, vector=vector)
+    return answer
+
+
+# ───────────────────────────────────────────────
+# Batched answering
+# ───────────────────────────────────────────────
+def _chunk_ids(docs):
+    return {hashlib.sha256(d.page_content.encode("utf-8")).hexdigest() for d in docs}
+
+
+def group_by_context(retrieved, max_group_size=ANSWER_BATCH_SIZE, min_overlap=ANSWER_BATCH_MIN_OVERLAP):
+    """
+    Greedily group question indices whose retrieved chunks overlap.
+
+    `retrieved` is a list of (index, docs). A question joins the first open
+    group whose chunk set shares at least `min_overlap` of the smaller set
+    (overlap coefficient); otherwise it starts a new group. Returns a list
+    of groups, each a list of (index, docs) in question order.
+    """
+    groups = []
+    for idx, docs in retrieved:
+        ids = _chunk_ids(docs)
+        for group in groups:
+            if len(group["items"]) >= max_group_size:
+                continue
+            common = len(ids & group["ids"])
+            if ids and common / min(len(ids), len(group["ids"]) or 1) >= min_overlap:
+                group["items"].append((idx, docs))
+                group["ids"] |= ids
+                break
+        else:
+            groups.append({"items": [(idx, docs)], "ids": set(ids)})
+    return [g["items"] for g in groups]
+
+
+def merge_docs(doc_lists):
+    """Union of several retrieved document lists, first occurrence wins."""
+    merged, seen = [], set()
+    for docs in doc_lists:
+        for doc in docs:
+            key = doc.page_content
+            if key not in seen:
+                seen.add(key)
+                merged.append(doc)
+    return merged
+
+
+def parse_batch_answers(text, expected_ids):
+    """
+    Parse the JSON reply of a batched answer call into {id: answer}.
+    Items that are missing, malformed, empty or for unknown ids are left
+    out, so the caller can answer those questions individually.
+    """
+    text = str(text).strip()
+    # Tolerate code fences and chatter around the JSON object
+    match = re.search(r"\{.*\}", text, re.S)
+    if not match:
+        return {}
+    try:
+        data = json.loads(match.group(0))
+    except ValueError:
+        return {}
+
+    items = data.get("answers") if isinstance(data, dict) else None
+    if not isinstance(items, list):
+        return {}
+
+    answers = {}
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        try:
+            qid = int(item.get("id"))
+        except (TypeError, ValueError):
+            continue
+        answer = item.get("answer")
+        if qid in expected_ids and isinstance(answer, str) and answer.strip():
+            answers[qid] = answer.strip()
+    return answers
+
+
+def answer_group(group, questions, llm, combine_chain, rate_limiter=None, compressor=None):
+    """
+    Answer one group of questions with a single call on the union of their
+    retrieved chunks. Returns {index: answer}; questions the reply did not
+    answer properly are re-asked one at a time with their own context, and
+    a question whose own call fails too maps to None (the others keep
+    their answers). With a `compressor` the union is compressed against all the group's
+    questions, and single questions against their own.
+    """
+    limited = rate_limiter.call if rate_limiter is not None else (lambda fn, *a: fn(*a))
+    compress = compressor if compressor is not None else (lambda question, docs: docs)
+
+    def call(fn, *args):
+        with span("answering"):
+            return limited(fn, *args)
+
+    def answer_one(idx, docs):
+        payload = {"input": questions[idx], "context": compress(questions[idx], docs)}
+        try:
+            return extract_answer(call(combine_chain.invoke, payload))
+        except Exception as e:
+            print(f"[Batch answer error] question {idx + 1}: {e}")
+            return None
+
+    if len(group) == 1:
+        idx, docs = group[0]
+        return {idx: answer_one(idx, docs)}
+
+    from langchain_classic.chains.combine_documents import create_stuff_documents_chain
+    chain = create_stuff_documents_chain(llm, BATCH_ANSWER_PROMPT)
+    listing = "\n".join(json.dumps({"id": idx + 1, "question": questions[idx]}) for idx, _ in group)
+    group_question = " ".join(questions[idx] for idx, _ in group)
+    payload = {"questions": listing, "context": compress(group_question, merge_docs(docs for _, docs in group))}
+    try:
+        parsed = parse_batch_answers(call(chain.invoke, payload), {idx + 1 for idx, _ in group})
+    except Exception as e:
+        print(f"[Batch answer error] {e}")
+        parsed = {}
+
+    answers = {}
+    for idx, docs in group:
+        if idx + 1 in parsed:
+            answers[idx] = parsed[idx + 1]
+        else:
+            print(f"[Batch answer] No usable answer for question {idx + 1}, asking it on its own")
+            answers[idx] = answer_one(idx, docs)
+    return answers
+
+
+def answer_in_batches(questions, retriever, llm, combine_chain, answer_cache=None, rate_limiter=None,
+                      max_workers=ANSWER_CONCURRENCY, batch_size=ANSWER_BATCH_SIZE, compressor=None):
+    """
+    Batched counterpart of answer_in_order: yields (index, question, answer)
+    in question order.
+
+    Every question is retrieved first (in one batch); cached answers are served directly,
+    the rest are grouped by overlapping context and each group is answered
+    by one LLM call, with up to `max_workers` groups in flight. A
+    `compressor` shrinks each call's context (see answer_group).
+    """
+    pool = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="answer")
+    futures = {}
+    try:
+        # One batched embedding call and one multi-query search for every question
+        retrieved = retrieve_all(retriever, questions)
+
+        answers, vectors, pending = {}, {}, []
+        for idx, (question, docs) in enumerate(zip(questions, retrieved)):
+            if answer_cache is not None:
+                vectors[idx] = answer_cache.embed_question(question)
+                cached = None
+                if vectors[idx] is not None:
+                    cached = answer_cache.lookup(question, docs, vector=vectors[idx])
+                if cached is not None:
+                    answers[idx] = cached
+                    continue
+            pending.append((idx, docs))
+
+        groups = group_by_context(pending, max_group_size=batch_size)
+        print(f"[Batch answer] {len(pending)} questions in {len(groups)} calls ({len(answers)} cached)")
+        for group in groups:
+            future = pool.submit(
+                contextvars.copy_context().run, answer_group, group, questions, llm, combine_chain,
+                rate_limiter, compressor
+            )
+            for idx, _ in group:
+                futures[idx] = future
+
+        for idx, question in enumerate(questions):
+            if idx not in answers:
+                try:
+                    answer = futures[idx].result()[idx]
+                except Exception as e:
+                    print(f"[Batch answer error] question {idx + 1}: {e}")
+                    answer = None
+                if answer is None:
+                    # Failed answers are not cached
+                    answers[idx] = "Not found in context."
+                else:
+                    answers[idx] = answer
+                    if vectors.get(idx) is not None and answer.strip():
+                        answer_cache.store(question, retrieved[idx], answer, vector=vectors[idx])
+            yield idx, question, answers[idx]
+    finally:
+        # If the consumer stops early, drop groups that have not started yet
+        for future in futures.values():
+            future.cancel()
+        pool.shutdown(wait=True)
@@ -0,0 +1,109 @@
+import re
+
+import numpy as np
+
+
+# BM25 parameters (standard Okapi defaults)
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+_token_regex = re.compile(r"\w+")
+
+# Question words and fillers that would otherwise match almost every chunk
+STOPWORDS = frozenset("""
+a an and are as at be by can do does for from has have how in is it its of on or that the
+their there these this to was were what when where which who why will with
+""".split())
+
+
+def tokenize(text):
+    """Lowercased word tokens without stopwords and single characters."""
+    return [t for t in _token_regex.findall(text.lower()) if len(t) > 1 and t not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    Okapi BM25 over a fixed list of documents, stored as compact arrays.
+
+    Postings are kept in CSR form: `offsets[t]:offsets[t + 1]` slices
+    `doc_ids` (int32) and `weights` (float32) for term id t. The full BM25
+    contribution of every (term, document) pair is precomputed at build
+    time, so scoring a query is one concatenation and one np.bincount.
+    """
+
+    def __init__(self, vocab, offsets, doc_ids, weights, n_docs):
+        self.vocab = vocab
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.weights = weights
+        self.n_docs = n_docs
+
+    @classmethod
+    def from_texts(cls, texts, k1=BM25_K1, b=BM25_B):
+        vocab = {}
+        term_ids, doc_ids, counts = [], [], []
+        doc_lengths = np.zeros(len(texts), dtype=np.float32)
+
+        for doc_id, text in enumerate(texts):
+            tokens = tokenize(text)
+            doc_lengths[doc_id] = len(tokens)
+            ids = np.fromiter((vocab.setdefault(t, len(vocab)) for t in tokens), dtype=np.int32, count=len(tokens))
+            unique, tf = np.unique(ids, return_counts=True)
+            term_ids.append(unique)
+            doc_ids.append(np.full(len(unique), doc_id, dtype=np.int32))
+            counts.append(tf.astype(np.float32))
+
+        term_ids = np.concatenate(term_ids) if texts else np.zeros(0, dtype=np.int32)
+        doc_ids = np.concatenate(doc_ids) if texts else np.zeros(0, dtype=np.int32)
+        tf = np.concatenate(counts) if texts else np.zeros(0, dtype=np.float32)
+
+        # Group postings by term (stable, so doc ids stay sorted within a term)
+        order = np.argsort(term_ids, kind="stable")
+        term_ids, doc_ids, tf = term_ids[order], doc_ids[order], tf[order]
+        df = np.bincount(term_ids, minlength=len(vocab))
+        offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum(df, out=offsets[1:])
+
+        n_docs = len(texts)
+        idf = np.log1p((n_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+        avg_len = doc_lengths.mean() if n_docs and doc_lengths.mean() > 0 else 1.0
+        norm = k1 * (1 - b + b * doc_lengths / avg_len)
+        weights = (idf[term_ids] * tf * (k1 + 1) / (tf + norm[doc_ids])).astype(np.float32)
+
+        return cls(vocab, offsets, doc_ids, weights, n_docs)
+
+    @classmethod
+    def from_documents(cls, docs, **kwargs):
+        return cls.from_texts([d.page_content for d in docs], **kwargs)
+
+    def scores(self, query):
+        """BM25 score of every document for `query` as a float32 array."""
+        terms = [self.vocab[t] for t in set(tokenize(query)) if t in self.vocab]
+        if not terms:
+            return np.zeros(self.n_docs, dtype=np.float32)
+        slices = [slice(self.offsets[t], self.offsets[t + 1]) for t in terms]
+        docs = np.concatenate([self.doc_ids[s] for s in slices])
+        weights = np.concatenate([self.weights[s] for s in slices])
+        return np.bincount(docs, weights=weights, minlength=self.n_docs).astype(np.float32)
+
+    def search(self, query, k):
+        """Top-k (doc_ids, scores) for `query`; documents with score 0 are left out."""
+        scores = self.scores(query)
+        k = min(k, self.n_docs)
+        if k <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        top = top[scores[top] > 0]
+        return top, scores[top]
+
+    def search_batch(self, queries, k):
+        return [self.search(q, k) for q in queries]
+
+    def stats(self):
+        return {
+            "documents": self.n_docs,
+            "terms": len(self.vocab),
+            "postings": len(self.doc_ids),
+            "bytes": self.offsets.nbytes + self.doc_ids.nbytes + self.weights.nbytes,
+        }
@@ -0,0 +1,237 @@
+import os
+import json
+import gzip
+import hashlib
+import shutil
+import time
+
+from langchain_core.documents import Document
+
+
+# Root folder for every on-disk cache used by the pipeline
+CACHE_DIR = os.getenv("QA_CACHE_DIR", ".cache")
+
+# Size limit for the preprocessing cache (least-recently-used entries are evicted)
+PREPROCESS_CACHE_MAX_BYTES = int(os.getenv("QA_PREPROCESS_CACHE_MAX_MB", "256")) * 1024 * 1024
+
+# Size limit for the extracted page text cache
+PAGE_CACHE_MAX_BYTES = int(os.getenv("QA_PAGE_CACHE_MAX_MB", "256")) * 1024 * 1024
+
+
+def file_sha256(file_path, block_size=1 << 20):
+    """
+    SHA-256 of the raw file bytes, read in blocks so large PDFs are not held in memory.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def make_cache_key(*parts):
+    """
+    Build a stable cache key from any JSON-serializable parts
+    (document hash, model names, chunking settings, ...).
+    """
+    raw = json.dumps(parts, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _entry_size(path):
+    """Size in bytes of a cache entry (a single file or a whole directory)."""
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for name in filenames:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, name))
+            except OSError:
+                pass
+    return total
+
+
+def _remove_entry(path):
+    """Delete a cache entry, whether it is a file or a directory."""
+    try:
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        else:
+            os.remove(path)
+    except OSError as e:
+        print(f"[Cache] Could not remove {path}: {e}")
+
+
+def touch_entry(path):
+    """Mark a cache entry as recently used (mtime is the LRU clock)."""
+    try:
+        os.utime(path, None)
+    except OSError:
+        pass
+
+
+def evict_lru(root, max_bytes):
+    """
+    Remove least-recently-used entries under `root` until the total size
+    fits in `max_bytes`. Entries are the direct children of `root`.
+    """
+    if not os.path.isdir(root):
+        return
+    entries = []
+    for name in os.listdir(root):
+        if name.startswith("."):
+            # in-progress temporary writes
+            continue
+        path = os.path.join(root, name)
+        try:
+            entries.append((os.path.getmtime(path), _entry_size(path), path))
+        except OSError:
+            continue
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        print(f"[Cache] Evicting {path} ({size} bytes)")
+        _remove_entry(path)
+        total -= size
+
+
+# ───────────────────────────────────────────────
+# Preprocessing cache (docs_ques_gen / docs_ans_gen)
+# ───────────────────────────────────────────────
+def _preprocess_dir():
+    return os.path.join(CACHE_DIR, "preprocess")
+
+
+def _docs_to_records(docs):
+    return [{"t": d.page_content, "m": d.metadata} if d.metadata else {"t": d.page_content} for d in docs]
+
+
+def _records_to_docs(records):
+    return [Document(page_content=r["t"], metadata=r.get("m") or {}) for r in records]
+
+
+def load_preprocessed(cache_key):
+    """
+    Return (docs_ques_gen, docs_ans_gen) for `cache_key`, or None on a miss.
+    Corrupt entries are dropped and treated as a miss.
+    """
+    path = os.path.join(_preprocess_dir(), f"{cache_key}.json.gz")
+    if not os.path.exists(path):
+        return None
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            payload = json.load(f)
+        docs_ques_gen = _records_to_docs(payload["ques"])
+        docs_ans_gen = _records_to_docs(payload["ans"])
+    except (OSError, ValueError, KeyError) as e:
+        print(f"[Cache] Dropping unreadable preprocess entry {cache_key}: {e}")
+        _remove_entry(path)
+        return None
+
+    touch_entry(path)
+    return docs_ques_gen, docs_ans_gen
+
+
+def save_preprocessed(cache_key, docs_ques_gen, docs_ans_gen):
+    """
+    Store both chunk lists as gzipped JSON, then enforce the size limit.
+    The write goes through a temporary file so readers never see a partial entry.
+    """
+    cache_dir = _preprocess_dir()
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, f"{cache_key}.json.gz")
+    tmp_path = os.path.join(cache_dir, f".{cache_key}.{os.getpid()}.{time.time_ns()}.tmp")
+
+    payload = {"ques": _docs_to_records(docs_ques_gen), "ans": _docs_to_records(docs_ans_gen)}
+    try:
+        with gzip.open(tmp_path, "wt", encoding="utf-8", compresslevel=6) as f:
+            json.dump(payload, f, separators=(",", ":"))
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"[Cache] Could not write preprocess entry {cache_key}: {e}")
+        if os.path.exists(tmp_path):
+            _remove_entry(tmp_path)
+        return
+
+    evict_lru(cache_dir, PREPROCESS_CACHE_MAX_BYTES)
+
+
+# ───────────────────────────────────────────────
+# Extracted page cache ((page_number, text) per PDF and text backend)
+# ───────────────────────────────────────────────
+def _pages_dir():
+    return os.path.join(CACHE_DIR, "pages")
+
+
+def _pages_path(doc_hash, backend):
+    return os.path.join(_pages_dir(), f"{doc_hash}-{backend}.jsonl.gz")
+
+
+def iter_cached_pages(doc_hash, backend):
+    """
+    Lazily yield the cached (page_number, text) pages of a document, or
+    return None on a miss. Pages are stored one JSON line each, so reading
+    them back never needs the whole document in memory. An unreadable entry
+    is dropped and its error (OSError / ValueError / EOFError) raised.
+    """
+    path = _pages_path(doc_hash, backend)
+    if not os.path.exists(path):
+        return None
+    touch_entry(path)
+
+    def read():
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    page_no, text = json.loads(line)
+                    yield page_no, text
+        except (OSError, ValueError, EOFError) as e:
+            print(f"[Cache] Dropping unreadable page cache entry {doc_hash}: {e}")
+            _remove_entry(path)
+            raise
+    return read()
+
+
+def cache_pages(doc_hash, backend, pages):
+    """
+    Pass `pages` through while writing them to the page cache. The entry
+    only appears once every page has been consumed; if the consumer stops
+    early nothing is stored. Write errors only skip caching.
+    """
+    cache_dir = _pages_dir()
+    tmp_path = os.path.join(cache_dir, f".{doc_hash}.{os.getpid()}.{time.time_ns()}.tmp")
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        f = gzip.open(tmp_path, "wt", encoding="utf-8", compresslevel=6)
+    except OSError as e:
+        print(f"[Cache] Could not write page cache entry {doc_hash}: {e}")
+        f = None
+
+    complete = False
+    try:
+        for page_no, text in pages:
+            if f is not None:
+                try:
+                    f.write(json.dumps([page_no, text], separators=(",", ":")) + "\n")
+                except OSError as e:
+                    print(f"[Cache] Could not write page cache entry {doc_hash}: {e}")
+                    _remove_entry(tmp_path)
+                    f = None
+            yield page_no, text
+        complete = f is not None
+    finally:
+        if f is not None:
+            try:
+                f.close()
+                if complete:
+                    os.replace(tmp_path, _pages_path(doc_hash, backend))
+            except OSError as e:
+                print(f"[Cache] Could not write page cache entry {doc_hash}: {e}")
+                complete = False
+        if not complete and os.path.exists(tmp_path):
+            _remove_entry(tmp_path)
+    if complete:
+        evict_lru(cache_dir, PAGE_CACHE_MAX_BYTES)
@@ -0,0 +1,80 @@
+import os
+import json
+import shutil
+
+from src.jobs import DATA_DIR
+
+
+def atomic_write_text(path, text):
+    """Write `text` to `path` through a temporary file, so readers never see a partial file."""
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    with open(tmp_path, "w", encoding="utf-8", newline="") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class JobCheckpoint:
+    """
+    On-disk progress of one job, so an interrupted or failed job can resume.
+
+    Layout under DATA_DIR/checkpoints/<job_id>/:
+      - questions.json : the final question list plus the pipeline info
+                         (doc hash, index key) needed to reuse cached work
+      - rows.jsonl     : one answered row per line, appended and fsynced as
+                         each question completes; a torn last line from a
+                         crash is ignored
+    """
+
+    def __init__(self, job_id, root=None):
+        self.dir = os.path.join(root or os.path.join(DATA_DIR, "checkpoints"), job_id)
+        self.questions_path = os.path.join(self.dir, "questions.json")
+        self.rows_path = os.path.join(self.dir, "rows.jsonl")
+
+    def load_questions(self):
+        """Return (questions, info) from an earlier attempt, or (None, None)."""
+        try:
+            with open(self.questions_path, encoding="utf-8") as f:
+                data = json.load(f)
+            return data["questions"], data.get("info") or {}
+        except (OSError, ValueError, KeyError):
+            return None, None
+
+    def save_questions(self, questions, info=None):
+        os.makedirs(self.dir, exist_ok=True)
+        atomic_write_text(self.questions_path, json.dumps({"questions": list(questions), "info": info or {}}))
+
+    def rows(self):
+        """Completed rows as {index: {"index", "question", "answer"}}."""
+        completed = {}
+        try:
+            with open(self.rows_path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        row = json.loads(line)
+                        completed[int(row["index"])] = row
+                    except (ValueError, KeyError, TypeError):
+                        continue
+        except OSError:
+            pass
+        return completed
+
+    def append_row(self, index, question, answer):
+        os.makedirs(self.dir, exist_ok=True)
+        line = json.dumps({"index": index, "question": question, "answer": answer})
+        with open(self.rows_path, "a+b") as f:
+            # Start on a fresh line if a crash left a torn row at the end
+            if f.tell() > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    f.write(b"\n")
+            f.write((line + "\n").encode("utf-8"))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def exists(self):
+        return os.path.exists(self.questions_path)
+
+    def clear(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
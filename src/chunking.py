@@ -0,0 +1,123 @@
+import hashlib
+
+import numpy as np
+import tiktoken
+from langchain_core.documents import Document
+from langchain_text_splitters import TokenTextSplitter
+
+from src.ingest import window_bounds
+
+
+def chunk_id(text):
+    """Stable id of a chunk: a hash of its text, the same in every run and process."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:32]
+
+
+def assign_chunk_ids(docs):
+    """Set metadata["chunk_id"] on every Document that does not have one yet."""
+    for doc in docs:
+        if "chunk_id" not in doc.metadata:
+            doc.metadata["chunk_id"] = chunk_id(doc.page_content)
+    return docs
+
+
+def split_with_text_splitters(text, encoding_name, ques_chunk_size, ans_chunk_size, chunk_overlap):
+    """
+    Two-splitter path: split `text` into question-generation chunks, then
+    re-tokenize every chunk to split it again into answer chunks.
+    """
+    splitter_ques_gen = TokenTextSplitter(
+        encoding_name=encoding_name,
+        chunk_size=ques_chunk_size,
+        chunk_overlap=chunk_overlap
+    )
+    docs_ques_gen = [Document(page_content=t) for t in splitter_ques_gen.split_text(text)]
+
+    splitter_ans_gen = TokenTextSplitter(
+        encoding_name=encoding_name,
+        chunk_size=ans_chunk_size,
+        chunk_overlap=chunk_overlap
+    )
+    docs_ans_gen = splitter_ans_gen.split_documents(docs_ques_gen)
+    return docs_ques_gen, docs_ans_gen
+
+
+def encode_document(pages, encoding):
+    """
+    Encode the whole document once.
+
+    Returns:
+        text         : the pages joined with "\\n" (same text the splitters see)
+        tokens       : int32 array of token ids
+        char_offsets : int64 array, char offset where each token starts, plus
+                       a final entry equal to len(text)
+        page_numbers : page number of every page, in order
+        page_starts  : char offset where each page starts
+    """
+    page_numbers = [page_no for page_no, _ in pages]
+    texts = [text + "\n" for _, text in pages]
+    page_starts = np.zeros(len(texts), dtype=np.int64)
+    if texts:
+        page_starts[1:] = np.cumsum([len(t) for t in texts[:-1]])
+    text = "".join(texts)
+    del texts
+
+    tokens = np.asarray(encoding.encode(text, disallowed_special=()), dtype=np.int32)
+
+    # Byte length of every token via a lookup over the unique ids only
+    unique_ids, inverse = np.unique(tokens, return_inverse=True)
+    unique_lengths = np.fromiter(
+        (len(encoding.decode_single_token_bytes(int(t))) for t in unique_ids),
+        dtype=np.int64, count=len(unique_ids)
+    )
+    byte_offsets = np.zeros(len(tokens) + 1, dtype=np.int64)
+    np.cumsum(unique_lengths[inverse], out=byte_offsets[1:])
+
+    # Map byte offsets to char offsets: a char starts at every non-continuation UTF-8 byte
+    raw = np.frombuffer(text.encode("utf-8"), dtype=np.uint8)
+    char_index = np.cumsum((raw & 0xC0) != 0x80) - 1
+    char_index = np.append(char_index, len(text))
+    char_offsets = char_index[np.minimum(byte_offsets, len(raw))]
+    char_offsets[-1] = len(text)
+
+    return text, tokens, char_offsets, page_numbers, page_starts
+
+
+def split_single_pass(pages, encoding_name, ques_chunk_size, ans_chunk_size, chunk_overlap, source=None):
+    """
+    Single-pass chunking engine: tokenize once and cut both the
+    question-generation and the answer-retrieval windows as slices of the
+    same token array (answer windows are cut inside each question window,
+    exactly like the two-splitter path).
+
+    Chunk text is sliced from the original string by char offset, so
+    nothing is re-encoded or decoded. Each Document carries token_start /
+    token_end, char_start / char_end and page_start / page_end metadata.
+
+    `pages` is a list of (page_number, text).
+    """
+    encoding = tiktoken.get_encoding(encoding_name)
+    text, tokens, char_offsets, page_numbers, page_starts = encode_document(pages, encoding)
+
+    def make_doc(start, end):
+        char_start, char_end = int(char_offsets[start]), int(char_offsets[end])
+        first_page, last_page = np.searchsorted(page_starts, [char_start, max(char_start, char_end - 1)], side="right") - 1
+        metadata = {
+            "token_start": start,
+            "token_end": end,
+            "char_start": char_start,
+            "char_end": char_end,
+            "page_start": page_numbers[first_page],
+            "page_end": page_numbers[last_page],
+        }
+        if source:
+            metadata["source"] = source
+        return Document(page_content=text[char_start:char_end], metadata=metadata)
+
+    docs_ques_gen, docs_ans_gen = [], []
+    for q_start, q_end in window_bounds(len(tokens), ques_chunk_size, chunk_overlap):
+        docs_ques_gen.append(make_doc(q_start, q_end))
+        for a_start, a_end in window_bounds(q_end - q_start, ans_chunk_size, chunk_overlap):
+            docs_ans_gen.append(make_doc(q_start + a_start, q_start + a_end))
+
+    return docs_ques_gen, docs_ans_gen
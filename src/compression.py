@@ -0,0 +1,192 @@
+import os
+import re
+import threading
+
+import numpy as np
+import tiktoken
+from langchain_core.documents import Document
+
+from src.bm25 import tokenize
+from src.metrics import span
+
+
+# How the retrieved docs are shrunk before answering: "extractive" (local),
+# "refine" (LLM summarization) or "none" (answer on the retrieved docs as-is)
+CONTEXT_COMPRESSION = os.getenv("QA_CONTEXT_COMPRESSION", "extractive")
+
+# Target size of the compressed context, in tokens
+COMPRESSION_TOKEN_BUDGET = int(os.getenv("QA_COMPRESSION_TOKEN_BUDGET", "1500"))
+
+# Sentence scorer for extractive compression: "lexical" or "embedding"
+COMPRESSION_SCORER = os.getenv("QA_COMPRESSION_SCORER", "lexical")
+
+# Sentence boundary: end punctuation followed by whitespace, or a blank line
+_sentence_split_regex = re.compile(r"(?<=[.!?])\s+(?=[\"'(\[A-Z0-9])|\n\s*\n")
+
+
+def split_sentences(text):
+    """Split `text` into sentences (whitespace-normalized, empty ones dropped)."""
+    sentences = []
+    for part in _sentence_split_regex.split(text):
+        part = " ".join(part.split())
+        if part:
+            sentences.append(part)
+    return sentences
+
+
+def lexical_scores(question, sentences):
+    """
+    IDF-weighted overlap between the question terms and every sentence,
+    normalized by sqrt(sentence length) so long sentences do not win by size.
+    """
+    query_terms = set(tokenize(question))
+    if not query_terms or not sentences:
+        return np.zeros(len(sentences), dtype=np.float32)
+
+    sentence_terms = [set(tokenize(s)) for s in sentences]
+    df = {t: sum(1 for terms in sentence_terms if t in terms) for t in query_terms}
+    idf = {t: np.log1p(len(sentences) / (1 + df[t])) for t in query_terms}
+    return np.array([
+        sum(idf[t] for t in query_terms & terms) / np.sqrt(max(len(terms), 1))
+        for terms in sentence_terms
+    ], dtype=np.float32)
+
+
+def embedding_scores(question, sentences, embeddings):
+    """Cosine similarity between the question and every sentence embedding."""
+    query = np.asarray(embeddings.embed_query(question), dtype=np.float32)
+    embed_array = getattr(embeddings, "embed_array", None)
+    vectors = np.asarray(
+        embed_array(sentences) if embed_array else embeddings.embed_documents(sentences),
+        dtype=np.float32
+    )
+    norms = np.linalg.norm(vectors, axis=1) * (np.linalg.norm(query) or 1)
+    return (vectors @ query) / np.where(norms == 0, 1, norms)
+
+
+def compress_context(question, docs, encoding_name="cl100k_base", max_tokens=COMPRESSION_TOKEN_BUDGET,
+                     scorer=COMPRESSION_SCORER, embeddings=None):
+    """
+    Extractive, LLM-free replacement for refine summarization.
+
+    The retrieved docs are split into sentences, every sentence is scored
+    against the question, and the best ones are added greedily while they
+    fit in `max_tokens` (counted with tiktoken). Selected sentences are
+    returned in their original order, one paragraph per source doc.
+    Falls back to lexical scoring if the embedding scorer fails.
+    """
+    units = [
+        (doc_idx, sentence)
+        for doc_idx, doc in enumerate(docs)
+        for sentence in split_sentences(doc.page_content)
+    ]
+    if not units:
+        return ""
+    sentences = [s for _, s in units]
+
+    scores = None
+    if scorer == "embedding" and embeddings is not None:
+        try:
+            scores = embedding_scores(question, sentences, embeddings)
+        except Exception as e:
+            print(f"[Compression] Embedding scorer failed, using lexical scores: {e}")
+    if scores is None:
+        scores = lexical_scores(question, sentences)
+
+    encoding = tiktoken.get_encoding(encoding_name)
+    lengths = [len(t) for t in encoding.encode_ordinary_batch(sentences)]
+
+    # Best sentences first; ties keep document order
+    chosen, used = [], 0
+    for i in np.argsort(-scores, kind="stable"):
+        if used + lengths[i] <= max_tokens:
+            chosen.append(int(i))
+            used += lengths[i]
+        if used >= max_tokens:
+            break
+
+    if not chosen:
+        # Even the best sentence is over budget: keep its leading tokens
+        best = int(np.argmax(scores))
+        return encoding.decode(encoding.encode_ordinary(sentences[best])[:max_tokens])
+
+    paragraphs = {}
+    for i in sorted(chosen):
+        doc_idx, sentence = units[i]
+        paragraphs.setdefault(doc_idx, []).append(sentence)
+    return "\n\n".join(" ".join(paragraphs[d]) for d in sorted(paragraphs))
+
+
+class ContextCompressor:
+    """
+    Shrinks the retrieved docs of a question before the answer call.
+
+    Calling it with (question, docs) returns the documents to stuff into
+    the answer prompt: one Document holding the compressed context, or
+    `docs` unchanged in "none" mode, for empty input, or when compression
+    fails. "refine" runs the LLM refine summarize chain on `llm`; with a
+    `summary_cache` (src.summary_cache) each summary is stored per
+    retrieved chunk set, and report() counts how many were served from it.
+    Safe to share between the answering threads of a job.
+    """
+
+    def __init__(self, mode=CONTEXT_COMPRESSION, llm=None, embeddings=None, encoding_name="cl100k_base",
+                 max_tokens=COMPRESSION_TOKEN_BUDGET, summary_cache=None):
+        if mode == "refine" and llm is None:
+            raise ValueError("refine compression needs an llm")
+        self.mode = mode
+        self.llm = llm
+        self.embeddings = embeddings
+        self.encoding_name = encoding_name
+        self.max_tokens = max_tokens
+        self.summary_cache = summary_cache
+        self.summary_model = getattr(llm, "model", "")
+        self.summaries = 0
+        self.from_cache = 0
+        self._lock = threading.Lock()
+        self._summarize_chain = None
+
+    def summarize(self, docs):
+        """Refine summary of `docs` (one LLM call per doc)."""
+        with self._lock:
+            if self._summarize_chain is None:
+                from langchain_classic.chains.summarize import load_summarize_chain
+                self._summarize_chain = load_summarize_chain(llm=self.llm, chain_type="refine", verbose=False)
+        return self._summarize_chain.invoke({"input_documents": docs})["output_text"]
+
+    def cached_summary(self, docs):
+        """Refine summary of `docs`, from the summary cache when this chunk set was summarized before."""
+        summary = self.summary_cache.get(docs, self.summary_model) if self.summary_cache is not None else None
+        with self._lock:
+            self.summaries += 1
+            self.from_cache += summary is not None
+        if summary is None:
+            summary = self.summarize(docs)
+            if self.summary_cache is not None and summary and summary.strip():
+                self.summary_cache.put(docs, self.summary_model, summary)
+        return summary
+
+    def compress(self, question, docs):
+        """Compressed context of `docs` for `question`, as text."""
+        if self.mode == "refine":
+            return self.cached_summary(docs)
+        return compress_context(question, docs, encoding_name=self.encoding_name, max_tokens=self.max_tokens,
+                                embeddings=self.embeddings)
+
+    def __call__(self, question, docs):
+        if self.mode == "none" or not docs:
+            return docs
+        try:
+            with span("summarization"):
+                text = self.compress(question, docs)
+        except Exception as e:
+            print(f"[Compression error] {e}")
+            return docs
+        if not text or not text.strip():
+            return docs
+        return [Document(page_content=text)]
+
+    def report(self):
+        """Summarizations of this compressor and how many came from the summary cache."""
+        with self._lock:
+            return {"summaries": self.summaries, "from_cache": self.from_cache}
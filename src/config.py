@@ -0,0 +1,28 @@
+import os
+
+from dotenv import load_dotenv
+
+
+# Configuration comes from the environment (optionally a local .env file);
+# the Streamlit dashboard copies its secrets into the environment first
+load_dotenv()
+
+# Models (each is also part of the cache keys that depend on it)
+QUESTION_MODEL = os.getenv("QA_QUESTION_MODEL", "models/gemini-3-flash-preview")
+ANSWER_MODEL = os.getenv("QA_ANSWER_MODEL", "gemini-2.5-flash")
+EMBEDDING_MODEL = os.getenv("QA_EMBEDDING_MODEL", "text-embedding-004")
+
+# Backend serving the chat and embedding models: "google" (Gemini API) or
+# "fake" (local deterministic models with simulated latency, see src/fake_llm.py)
+LLM_PROVIDER = os.getenv("QA_LLM_PROVIDER", "google")
+
+
+def require_google_api_key():
+    """Return GOOGLE_API_KEY, failing with a clear message when it is not configured."""
+    key = os.getenv("GOOGLE_API_KEY")
+    if not key:
+        raise RuntimeError(
+            "GOOGLE_API_KEY is not set. Export it or put it in a .env file "
+            "(the Streamlit dashboard also reads it from .streamlit/secrets.toml)."
+        )
+    return key
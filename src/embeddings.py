@@ -0,0 +1,156 @@
+import os
+import hashlib
+import sqlite3
+import threading
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from src.cache import CACHE_DIR
+from src.rate_limiter import estimate_tokens
+from src.metrics import span, record_cache
+
+
+# Number of uncached texts sent to the embedding API per request
+EMBED_BATCH_SIZE = int(os.getenv("QA_EMBED_BATCH_SIZE", "100"))
+
+# Task type that makes a batched document call return query embeddings
+QUERY_TASK_TYPE = "RETRIEVAL_QUERY"
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that memoizes vectors per chunk text in SQLite.
+
+    Every call looks up all texts first and only sends the misses to the
+    wrapped embeddings, in batches of `batch_size`. Vectors are stored as raw
+    float32 bytes and returned as a contiguous float32 NumPy array by
+    `embed_array`. Hit/miss counters are kept so the savings can be reported.
+    When a `rate_limiter` is given, every batch sent to the API is paced
+    through it and retried on 429s.
+    """
+
+    def __init__(self, embeddings, model_name, db_path=None, batch_size=EMBED_BATCH_SIZE, rate_limiter=None):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.rate_limiter = rate_limiter
+        self.db_path = db_path or os.path.join(CACHE_DIR, "embeddings.sqlite")
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, dim INTEGER, vector BLOB)"
+        )
+        self._conn.commit()
+
+    # ───────────────────────────────────────────
+    # Cache internals
+    # ───────────────────────────────────────────
+    def _key(self, text, kind):
+        # Query and document embeddings differ for retrieval models, so the kind is part of the key
+        raw = f"{self.model_name}\x00{kind}\x00{text}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _lookup(self, keys):
+        found = {}
+        with self._lock:
+            # SQLite limits bound parameters, so look keys up in slices
+            for start in range(0, len(keys), 500):
+                part = keys[start:start + 500]
+                placeholders = ",".join("?" * len(part))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", part
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32)
+        return found
+
+    def _store(self, items):
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, dim, vector) VALUES (?, ?, ?)",
+                [(key, vec.shape[0], vec.tobytes()) for key, vec in items],
+            )
+            self._conn.commit()
+
+    def _call(self, fn, payload):
+        if self.rate_limiter is None:
+            return fn(payload)
+        texts = [payload] if isinstance(payload, str) else payload
+        return self.rate_limiter.call(fn, payload, tokens=sum(estimate_tokens(t) for t in texts))
+
+    def _embed_query_batch(self, texts):
+        """
+        Embed several queries in one request when the wrapped model can embed
+        documents with a query task type (Google embeddings); otherwise fall
+        back to one embed_query call per text.
+        """
+        if len(texts) > 1:
+            try:
+                return self._call(
+                    lambda batch: self.embeddings.embed_documents(batch, task_type=QUERY_TASK_TYPE), texts
+                )
+            except TypeError:
+                pass
+        return [self._call(self.embeddings.embed_query, t) for t in texts]
+
+    def _embed(self, texts, kind):
+        keys = [self._key(t, kind) for t in texts]
+        found = self._lookup(list(set(keys)))
+
+        # Unique misses only: repeated texts in one call are embedded once
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+        record_cache("embeddings", hits=len(texts) - len(missing), misses=len(missing))
+
+        miss_keys = list(missing)
+        for start in range(0, len(miss_keys), self.batch_size):
+            batch_keys = miss_keys[start:start + self.batch_size]
+            batch_texts = [missing[k] for k in batch_keys]
+            with span("embedding"):
+                if kind == "query":
+                    vectors = self._embed_query_batch(batch_texts)
+                else:
+                    vectors = self._call(self.embeddings.embed_documents, batch_texts)
+            new_items = [(k, np.asarray(v, dtype=np.float32)) for k, v in zip(batch_keys, vectors)]
+            self._store(new_items)
+            found.update(new_items)
+
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.ascontiguousarray(np.vstack([found[k] for k in keys]), dtype=np.float32)
+
+    # ───────────────────────────────────────────
+    # Public API
+    # ───────────────────────────────────────────
+    def embed_array(self, texts):
+        """Embed documents and return a contiguous (n, dim) float32 array."""
+        return self._embed(list(texts), "document")
+
+    def embed_documents(self, texts):
+        return self.embed_array(texts).tolist()
+
+    def embed_queries(self, texts):
+        """Embed several queries at once and return a contiguous (n, dim) float32 array."""
+        return self._embed(list(texts), "query")
+
+    def embed_query(self, text):
+        return self._embed([text], "query")[0].tolist()
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": round(self.hit_rate, 4)}
@@ -0,0 +1,114 @@
+import json
+import asyncio
+import threading
+from collections import OrderedDict, deque
+
+
+# Number of jobs whose event history is kept in memory for replay
+MAX_TRACKED_JOBS = 500
+
+# Events kept per job for replay (oldest dropped first); "status" events are
+# compacted to the latest one, so this bounds the Q&A rows and other events
+MAX_EVENTS_PER_JOB = 1000
+
+# Event types of which only the most recent is kept: each one supersedes the last
+COMPACTED_EVENTS = ("status",)
+
+
+class _JobHistory:
+    """Replayable events of one job: a bounded deque plus the latest compacted events."""
+
+    def __init__(self, max_events):
+        self.next_id = 0
+        self.events = deque(maxlen=max_events)
+        self.latest = {}
+
+    def add(self, event, data):
+        item = {"id": self.next_id, "event": event, "data": data}
+        self.next_id += 1
+        if event in COMPACTED_EVENTS:
+            self.latest[event] = item
+        else:
+            self.events.append(item)
+        return item
+
+    def after(self, event_id):
+        items = [e for e in self.events if e["id"] > event_id]
+        items.extend(e for e in self.latest.values() if e["id"] > event_id)
+        return sorted(items, key=lambda e: e["id"])
+
+
+class JobEvents:
+    """
+    In-process event bus for job progress.
+
+    Worker threads `publish` events; async subscribers (the SSE endpoint)
+    receive them through an asyncio.Queue on their own event loop. Every
+    job keeps its recent event history (up to `max_events_per_job`, with
+    only the latest "status" event), so a client that connects late or
+    reconnects with Last-Event-ID still receives the Q&A rows and the
+    current status.
+    """
+
+    def __init__(self, max_jobs=MAX_TRACKED_JOBS, max_events_per_job=MAX_EVENTS_PER_JOB):
+        self.max_jobs = max_jobs
+        self.max_events_per_job = max_events_per_job
+        self._lock = threading.Lock()
+        self._history = OrderedDict()
+        self._subscribers = {}
+
+    def publish(self, job_id, event, data):
+        """Record an event for `job_id` and push it to every live subscriber."""
+        with self._lock:
+            history = self._history.get(job_id)
+            if history is None:
+                history = self._history[job_id] = _JobHistory(self.max_events_per_job)
+            self._history.move_to_end(job_id)
+            item = history.add(event, data)
+            while len(self._history) > self.max_jobs:
+                self._history.popitem(last=False)
+            subscribers = list(self._subscribers.get(job_id, ()))
+
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, item)
+            except RuntimeError:
+                # Subscriber's loop already closed; it will be unsubscribed by its own finally block
+                pass
+
+    def subscribe(self, job_id, after=-1):
+        """
+        Register the calling coroutine's loop for `job_id` events.
+        Returns (backlog, queue): events with id > `after` that already
+        happened, and a queue that receives every later event.
+        """
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        with self._lock:
+            history = self._history.get(job_id)
+            backlog = history.after(after) if history is not None else []
+            self._subscribers.setdefault(job_id, set()).add((loop, queue))
+        return backlog, queue
+
+    def clear(self, job_id):
+        """Forget a job's event history (e.g. before it is resumed), keeping live subscribers."""
+        with self._lock:
+            self._history.pop(job_id, None)
+
+    def unsubscribe(self, job_id, queue):
+        with self._lock:
+            subscribers = self._subscribers.get(job_id, set())
+            for entry in [s for s in subscribers if s[1] is queue]:
+                subscribers.discard(entry)
+            if not subscribers:
+                self._subscribers.pop(job_id, None)
+
+
+def format_sse(event, data, event_id=None):
+    """Encode one Server-Sent Events message."""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data)}")
+    return "\n".join(lines) + "\n\n"
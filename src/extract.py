@@ -0,0 +1,285 @@
+import os
+import re
+import time
+import multiprocessing
+from collections import Counter, deque
+
+
+# Text extraction backend (see BACKENDS below)
+PDF_BACKEND = os.getenv("QA_PDF_BACKEND", "pypdf")
+
+# Worker processes used to extract page ranges in parallel
+EXTRACT_WORKERS = int(os.getenv("QA_EXTRACT_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+# Seconds a single page may take before it is skipped (empty text); the
+# deadline is enforced through the worker pool, so it only applies to
+# documents large enough to use one. 0 disables it
+PAGE_TIMEOUT = float(os.getenv("QA_PAGE_TIMEOUT", "30"))
+
+# Below this many pages the process pool costs more than it saves, so
+# small documents are always extracted in-process (without a page timeout)
+MIN_PAGES_FOR_POOL = 16
+
+# ───────────────────────────────────────────────
+# Backends: (page_count(path), open(path) -> doc, page_text(doc, page_no))
+# ───────────────────────────────────────────────
+def _pypdf_open(path):
+    import pypdf
+    return pypdf.PdfReader(path)
+
+
+def _pypdf_page_count(path):
+    return len(_pypdf_open(path).pages)
+
+
+def _pypdf_page_text(reader, page_no):
+    return reader.pages[page_no].extract_text() or ""
+
+
+def _pymupdf_open(path):
+    try:
+        import pymupdf
+    except ImportError:
+        import fitz as pymupdf
+    return pymupdf.open(path)
+
+
+def _pymupdf_page_count(path):
+    with _pymupdf_open(path) as doc:
+        return doc.page_count
+
+
+def _pymupdf_page_text(doc, page_no):
+    return doc[page_no].get_text() or ""
+
+
+def _pdfminer_open(path):
+    return path
+
+
+def _pdfminer_page_count(path):
+    from pdfminer.pdfpage import PDFPage
+    with open(path, "rb") as f:
+        return sum(1 for _ in PDFPage.get_pages(f))
+
+
+def _pdfminer_page_text(path, page_no):
+    from pdfminer.high_level import extract_text
+    return extract_text(path, page_numbers=[page_no]) or ""
+
+
+BACKENDS = {
+    "pypdf": (_pypdf_page_count, _pypdf_open, _pypdf_page_text),
+    "pymupdf": (_pymupdf_page_count, _pymupdf_open, _pymupdf_page_text),
+    "pdfminer": (_pdfminer_page_count, _pdfminer_open, _pdfminer_page_text),
+}
+
+# Module each backend needs; backends whose module is missing are skipped
+BACKEND_MODULES = {"pypdf": "pypdf", "pymupdf": "pymupdf", "pdfminer": "pdfminer"}
+
+
+def register_backend(name, page_count, open_document, page_text, module=None):
+    """Add an extraction backend (e.g. an OCR engine) under `name`."""
+    BACKENDS[name] = (page_count, open_document, page_text)
+    if module:
+        BACKEND_MODULES[name] = module
+
+
+def available_backends():
+    """Registered backends whose dependency can be imported here."""
+    import importlib.util
+    names = []
+    for name in BACKENDS:
+        module = BACKEND_MODULES.get(name)
+        if module is None or importlib.util.find_spec(module) is not None:
+            names.append(name)
+    return names
+
+
+# ───────────────────────────────────────────────
+# Extraction
+# ───────────────────────────────────────────────
+# Document opened in this (worker) process: ((open_document, path), doc)
+_worker_doc = None
+
+
+def _worker_page_text(open_document, page_text, path, page_no):
+    """
+    Text of one page, run in a pool worker. The document is opened on the
+    worker's first page and reused for every later one.
+    """
+    global _worker_doc
+    if _worker_doc is None or _worker_doc[0] != (open_document, path):
+        _close_document(_worker_doc[1] if _worker_doc else None)
+        _worker_doc = ((open_document, path), open_document(path))
+    return _page_text_or_empty(page_text, _worker_doc[1], path, page_no)
+
+
+def _page_text_or_empty(page_text, doc, path, page_no):
+    try:
+        return page_text(doc, page_no)
+    except Exception as e:
+        print(f"[Extract] Page {page_no} of {os.path.basename(path)} failed: {e}")
+        return ""
+
+
+def _close_document(doc):
+    close = getattr(doc, "close", None)
+    if callable(close):
+        close()
+
+
+def _mp_context():
+    # Forking a multi-threaded server can deadlock the child, so workers are
+    # started fresh (forkserver where available, spawn elsewhere)
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+
+def _iter_serial(backend, path, page_count):
+    """In-process extraction, opening the document once; no per-page deadline."""
+    _, open_document, page_text = BACKENDS[backend]
+    doc = open_document(path)
+    try:
+        for page_no in range(page_count):
+            yield page_no, _page_text_or_empty(page_text, doc, path, page_no)
+    finally:
+        _close_document(doc)
+
+
+def _iter_pool(backend, path, page_count, workers, page_timeout):
+    """
+    Extract pages in a process pool and yield (page_number, text) in page
+    order, keeping a few pages per worker in flight.
+
+    Each page must arrive within `page_timeout` seconds of being waited for;
+    a page that does not is skipped (empty text). Its worker is stuck, so
+    the pool is terminated and the remaining pages go to a fresh one.
+    """
+    _, open_document, page_text = BACKENDS[backend]
+    lookahead = max(1, workers) * 4
+    pool, pending, next_page = None, deque(), 0
+    try:
+        while pending or next_page < page_count:
+            if pool is None:
+                pool = _mp_context().Pool(max(1, workers))
+            while next_page < page_count and len(pending) < lookahead:
+                args = (open_document, page_text, path, next_page)
+                pending.append((next_page, pool.apply_async(_worker_page_text, args)))
+                next_page += 1
+
+            page_no, result = pending.popleft()
+            try:
+                text = result.get(timeout=page_timeout or None)
+            except multiprocessing.TimeoutError:
+                print(f"[Extract] Page {page_no} of {os.path.basename(path)} timed out after {page_timeout}s, skipped")
+                text = ""
+                pool.terminate()
+                pool = None
+                # Resubmit everything that was in flight on the old pool
+                next_page = page_no + 1
+                pending.clear()
+            yield page_no, text
+    finally:
+        if pool is not None:
+            pool.terminate()
+
+
+def _iter_extract(file_path, backend, workers, page_timeout):
+    backend = backend or PDF_BACKEND
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown PDF backend '{backend}'. Available: {sorted(BACKENDS)}")
+
+    page_count = BACKENDS[backend][0](file_path)
+    use_pool = page_count >= MIN_PAGES_FOR_POOL and (workers > 1 or page_timeout)
+    if not use_pool:
+        yield from _iter_serial(backend, file_path, page_count)
+        return
+
+    done = 0
+    try:
+        for page in _iter_pool(backend, file_path, page_count, workers, page_timeout):
+            yield page
+            done += 1
+    except (OSError, RuntimeError) as e:
+        # e.g. process creation not allowed in this environment
+        print(f"[Extract] Process pool unavailable ({e}), extracting serially without page timeout")
+        for page_no, text in _iter_serial(backend, file_path, page_count):
+            if page_no >= done:
+                yield page_no, text
+
+
+def iter_pages(file_path, backend=None, workers=EXTRACT_WORKERS, page_timeout=PAGE_TIMEOUT):
+    """
+    Yield (page_number, text) lazily, in page order.
+
+    Pages are extracted a few at a time ahead of the consumer, so memory
+    stays bounded by the number of pages in flight, not the document size.
+    """
+    yield from _iter_extract(file_path, backend, workers, page_timeout)
+
+
+def extract_pages(file_path, backend=None, workers=EXTRACT_WORKERS, page_timeout=PAGE_TIMEOUT):
+    """
+    Extract all pages as a list of (page_number, text), in page order.
+
+    Documents of MIN_PAGES_FOR_POOL pages or more are spread over a pool
+    of worker processes, which also enforces the per-page timeout (a
+    single worker is still used when only the timeout is set). Smaller
+    documents are extracted in-process, without a page timeout.
+    """
+    return list(_iter_extract(file_path, backend, workers, page_timeout))
+
+
+# ───────────────────────────────────────────────
+# Backend selection
+# ───────────────────────────────────────────────
+def _words(text):
+    return Counter(re.findall(r"\w+", text.lower()))
+
+
+def text_similarity(a, b):
+    """Word-multiset overlap (Dice coefficient) between two texts, in [0, 1]."""
+    wa, wb = _words(a), _words(b)
+    total = sum(wa.values()) + sum(wb.values())
+    if not total:
+        return 1.0
+    return 2 * sum((wa & wb).values()) / total
+
+
+def benchmark_backends(pdf_paths, reference="pypdf", min_similarity=0.97, workers=EXTRACT_WORKERS, backends=None):
+    """
+    Time every available backend on `pdf_paths` and compare its text with
+    the `reference` backend. Returns (report, fastest_equivalent_backend).
+    """
+    backends = backends or available_backends()
+    report = {name: {"seconds": 0.0, "min_similarity": 1.0, "errors": 0} for name in backends}
+    reference_text = {}
+
+    for path in pdf_paths:
+        for name in backends:
+            start = time.perf_counter()
+            try:
+                text = "\n".join(t for _, t in extract_pages(path, backend=name, workers=workers))
+            except Exception as e:
+                print(f"[Extract] {name} failed on {os.path.basename(path)}: {e}")
+                report[name]["errors"] += 1
+                continue
+            report[name]["seconds"] += time.perf_counter() - start
+            if name == reference:
+                reference_text[path] = text
+            report[name].setdefault("texts", {})[path] = text
+
+    for name in backends:
+        texts = report[name].pop("texts", {})
+        for path, text in texts.items():
+            if path in reference_text:
+                similarity = text_similarity(reference_text[path], text)
+                report[name]["min_similarity"] = min(report[name]["min_similarity"], similarity)
+
+    eligible = [
+        name for name in backends
+        if report[name]["errors"] == 0 and report[name]["min_similarity"] >= min_similarity
+    ]
+    best = min(eligible, key=lambda name: report[name]["seconds"]) if eligible else reference
+    return report, best
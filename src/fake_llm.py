@@ -0,0 +1,291 @@
+import os
+import re
+import json
+import time
+import random
+import hashlib
+import threading
+from typing import Any, Callable
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from pydantic import PrivateAttr
+
+from src.bm25 import tokenize
+from src.compression import split_sentences, lexical_scores
+from src.rate_limiter import estimate_tokens
+
+
+# Simulated chat latency: fixed time to first token plus uniform jitter (+/-)
+FAKE_LATENCY_MS = float(os.getenv("QA_FAKE_LATENCY_MS", "800"))
+FAKE_JITTER_MS = float(os.getenv("QA_FAKE_JITTER_MS", "200"))
+
+# Simulated generation speed (output tokens per second, 0 = instant)
+FAKE_TOKENS_PER_SECOND = float(os.getenv("QA_FAKE_TOKENS_PER_SECOND", "150"))
+
+# Simulated embedding latency: per request plus per embedded text
+FAKE_EMBED_LATENCY_MS = float(os.getenv("QA_FAKE_EMBED_LATENCY_MS", "100"))
+FAKE_EMBED_PER_TEXT_MS = float(os.getenv("QA_FAKE_EMBED_PER_TEXT_MS", "2"))
+
+# Fraction of calls that fail with a simulated 429 (chat and embeddings)
+FAKE_RATE_LIMIT_RATE = float(os.getenv("QA_FAKE_RATE_LIMIT_RATE", "0"))
+
+# Seed for jitter and 429 draws; the same seed replays the same run
+FAKE_SEED = os.getenv("QA_FAKE_SEED", "0")
+
+# Questions written per chunk and dimension of the fake embeddings
+FAKE_QUESTIONS_PER_CHUNK = int(os.getenv("QA_FAKE_QUESTIONS_PER_CHUNK", "8"))
+FAKE_EMBED_DIM = int(os.getenv("QA_FAKE_EMBED_DIM", "768"))
+
+NOT_FOUND = "Not found in context."
+
+
+class FakeRateLimitError(Exception):
+    """Simulated quota error; its message is recognised by is_rate_limit_error."""
+
+
+# Process-wide usage of all fake models, per kind ("chat" / "embeddings")
+_usage = {}
+_usage_lock = threading.Lock()
+
+
+def _empty_usage():
+    return {"calls": 0, "rate_limited": 0, "input_tokens": 0, "output_tokens": 0, "simulated_seconds": 0.0}
+
+
+def usage_totals():
+    """Calls, simulated 429s, tokens and simulated latency of every fake model so far."""
+    with _usage_lock:
+        return {kind: dict(totals, simulated_seconds=round(totals["simulated_seconds"], 3))
+                for kind, totals in _usage.items()}
+
+
+def reset_usage_totals():
+    with _usage_lock:
+        _usage.clear()
+
+
+class LatencySimulator:
+    """
+    Deterministic timing and 429 draws for the fake backends.
+
+    Every draw is seeded by (seed, request digest, attempt number), so a
+    request gets the same jitter and the same 429 decision in every run,
+    whatever the thread interleaving, and a retried request draws again.
+    Usage is counted per instance and in the process-wide totals of `kind`.
+    """
+
+    def __init__(self, kind, seed=FAKE_SEED, rate_limit_rate=FAKE_RATE_LIMIT_RATE, sleep=time.sleep):
+        self.kind = kind
+        self.seed = seed
+        self.rate_limit_rate = rate_limit_rate
+        self.sleep = sleep
+        self.usage = _empty_usage()
+        self._attempts = {}
+        self._lock = threading.Lock()
+
+    def _count(self, **amounts):
+        with self._lock:
+            for name, amount in amounts.items():
+                self.usage[name] += amount
+        with _usage_lock:
+            totals = _usage.setdefault(self.kind, _empty_usage())
+            for name, amount in amounts.items():
+                totals[name] += amount
+
+    def rng(self, text):
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        with self._lock:
+            attempt = self._attempts.get(digest, 0)
+            self._attempts[digest] = attempt + 1
+        return random.Random(f"{self.seed}:{digest}:{attempt}")
+
+    def wait(self, seconds, rng, input_tokens=0, output_tokens=0):
+        """
+        Sleep for `seconds`, then raise a simulated 429 if this draw says so.
+        Tokens are only counted for calls that succeed.
+        """
+        seconds = max(0.0, seconds)
+        if seconds:
+            self.sleep(seconds)
+        if self.rate_limit_rate and rng.random() < self.rate_limit_rate:
+            self._count(calls=1, rate_limited=1, simulated_seconds=seconds)
+            raise FakeRateLimitError("429 Too Many Requests: simulated RESOURCE_EXHAUSTED")
+        self._count(calls=1, input_tokens=input_tokens, output_tokens=output_tokens, simulated_seconds=seconds)
+
+    def stats(self):
+        with self._lock:
+            return dict(self.usage, simulated_seconds=round(self.usage["simulated_seconds"], 3))
+
+
+# ───────────────────────────────────────────────
+# Deterministic replies for the repo's prompts
+# ───────────────────────────────────────────────
+_text_block_regex = re.compile(r"-{6,}\n(.*?)\n-{6,}", re.S)
+
+
+def _key_terms(sentence, n=4):
+    terms = []
+    for t in tokenize(sentence):
+        if len(t) > 3 and not t.isdigit() and t not in terms:
+            terms.append(t)
+    return terms[:n]
+
+
+def fake_questions(text, n=FAKE_QUESTIONS_PER_CHUNK):
+    """Up to `n` questions about the most content-heavy sentences of `text`, in document order."""
+    sentences = [s for s in split_sentences(text) if len(_key_terms(s)) >= 2]
+    ranked = sorted(range(len(sentences)), key=lambda i: -len(set(tokenize(sentences[i]))))[:n]
+    return [
+        f"What does the document say about {' '.join(_key_terms(sentences[i]))}?"
+        for i in sorted(ranked)
+    ]
+
+
+def fake_answer(question, context):
+    """The context sentences that best match the question, or the not-found reply."""
+    sentences = split_sentences(context)
+    if not sentences:
+        return NOT_FOUND
+    scores = lexical_scores(question, sentences)
+    if not scores.max() > 0:
+        return NOT_FOUND
+    best = sorted(np.argsort(-scores, kind="stable")[:2])
+    return " ".join(sentences[i] for i in best if scores[i] > 0)
+
+
+def _section(prompt, start, end=None):
+    head = prompt.split(start, 1)[1] if start in prompt else ""
+    return head.split(end, 1)[0] if end and end in head else head
+
+
+def fake_reply(prompt):
+    """Reply to one of the pipeline's prompts the way a well-behaved model would."""
+    if "Reply with JSON only" in prompt:
+        # Batched answers (batch_answer_template)
+        context = _section(prompt, "Context:", "Questions:")
+        answers = []
+        for line in _section(prompt, "Questions:", "Reply with JSON only").splitlines():
+            try:
+                item = json.loads(line.strip())
+                answers.append({"id": item["id"], "answer": fake_answer(item["question"], context)})
+            except (ValueError, KeyError, TypeError):
+                continue
+        return json.dumps({"answers": answers})
+
+    if "Question:" in prompt and "Context:" in prompt:
+        # Single answer (answer_template)
+        context = _section(prompt, "Context:", "Question:")
+        question = _section(prompt, "Question:", "Answer in format").strip()
+        return fake_answer(question, context)
+
+    block = _text_block_regex.search(prompt)
+    text = block.group(1) if block else prompt
+    if "QUESTIONS:" in prompt:
+        # Question generation (prompt_template / refine_template)
+        existing = _section(prompt, "to a certain extent:", "We have the option").strip().rstrip(".")
+        questions = [q for q in existing.splitlines() if q.strip()] if existing else []
+        questions += [q for q in fake_questions(text) if q not in questions]
+        return "\n".join(questions)
+
+    # Anything else (e.g. refine summarization): the leading sentences
+    return " ".join(split_sentences(text)[:3])
+
+
+# ───────────────────────────────────────────────
+# LangChain models
+# ───────────────────────────────────────────────
+class FakeChatModel(BaseChatModel):
+    """
+    Offline chat model for load tests and profiling.
+
+    Replies are computed locally from the prompt (see `fake_reply`), and
+    every call sleeps like a remote model would: `latency_ms` +/- `jitter_ms`
+    plus the reply length at `tokens_per_second`. A `rate_limit_rate`
+    fraction of calls raises a simulated 429 after the latency.
+    """
+
+    model: str = "fake-chat"
+    temperature: float = 0.0
+    latency_ms: float = FAKE_LATENCY_MS
+    jitter_ms: float = FAKE_JITTER_MS
+    tokens_per_second: float = FAKE_TOKENS_PER_SECOND
+    rate_limit_rate: float = FAKE_RATE_LIMIT_RATE
+    seed: str = FAKE_SEED
+    sleep: Callable[[float], Any] = time.sleep
+
+    _simulator: LatencySimulator = PrivateAttr()
+
+    def model_post_init(self, __context):
+        super().model_post_init(__context)
+        self._simulator = LatencySimulator("chat", self.seed, self.rate_limit_rate, self.sleep)
+
+    @property
+    def _llm_type(self):
+        return "fake-chat"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        prompt = "\n".join(str(m.content) for m in messages)
+        rng = self._simulator.rng(f"{self.model}\x00{prompt}")
+        reply = fake_reply(prompt)
+        input_tokens, output_tokens = estimate_tokens(prompt), estimate_tokens(reply)
+
+        seconds = (self.latency_ms + rng.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+        if self.tokens_per_second > 0:
+            seconds += output_tokens / self.tokens_per_second
+        self._simulator.wait(seconds, rng, input_tokens, output_tokens)
+
+        message = AIMessage(content=reply, usage_metadata={
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens,
+        })
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def stats(self):
+        return self._simulator.stats()
+
+
+class FakeEmbeddings(Embeddings):
+    """
+    Offline embeddings: signed feature hashing of the BM25 tokens, L2-normalized.
+
+    Texts that share words get similar vectors, so retrieval, MMR, question
+    dedup and the semantic answer cache behave sensibly without the API.
+    Each request sleeps `latency_ms` plus `per_text_ms` per text, and may
+    raise a simulated 429 at `rate_limit_rate`.
+    """
+
+    def __init__(self, model="fake-embedding", dim=FAKE_EMBED_DIM, latency_ms=FAKE_EMBED_LATENCY_MS,
+                 per_text_ms=FAKE_EMBED_PER_TEXT_MS, rate_limit_rate=FAKE_RATE_LIMIT_RATE,
+                 seed=FAKE_SEED, sleep=time.sleep):
+        self.model = model
+        self.dim = dim
+        self.latency_ms = latency_ms
+        self.per_text_ms = per_text_ms
+        self._simulator = LatencySimulator("embeddings", seed, rate_limit_rate, sleep)
+
+    def vector(self, text):
+        v = np.zeros(self.dim, dtype=np.float32)
+        for token in tokenize(text) or [text]:
+            h = int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little")
+            v[h % self.dim] += 1.0 if (h >> 63) & 1 else -1.0
+        norm = np.linalg.norm(v)
+        return (v / norm if norm else v).tolist()
+
+    def embed_documents(self, texts, task_type=None, **kwargs):
+        rng = self._simulator.rng("\x00".join([self.model, task_type or ""] + list(texts)))
+        self._simulator.wait(
+            (self.latency_ms + self.per_text_ms * len(texts)) / 1000, rng,
+            input_tokens=sum(estimate_tokens(t) for t in texts)
+        )
+        return [self.vector(t) for t in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text], task_type="RETRIEVAL_QUERY")[0]
+
+    def stats(self):
+        return self._simulator.stats()
@@ -1,253 +1,385 @@
 import os
-import re
 import time
+import itertools
 from src.prompt import *   
-import streamlit as st
+from src.cache import file_sha256, make_cache_key, load_preprocessed, save_preprocessed, iter_cached_pages, cache_pages
+from src.index_store import get_or_build_index
+from src.embeddings import CachedEmbeddings
+from src.questions import filter_questions, generate_questions_parallel, semantic_dedup, QUESTION_GEN_CONCURRENCY
+from src.rate_limiter import get_rate_limiter, RateLimitCallback, LLMMetricsCallback
+from src.ingest import stream_chunks
+from src.chunking import split_single_pass, split_with_text_splitters, assign_chunk_ids
+from src.extract import extract_pages, iter_pages, PDF_BACKEND
+from src.answering import ANSWER_MODE, build_combine_chain, answer_in_batches, extract_answer
+from src.retrieval import SEARCH_KWARGS, RETRIEVAL_MODE, MMRRetriever, build_bm25_index, retriever_embeddings
+from src.compression import ContextCompressor
+from src.summary_cache import get_summary_cache
+from src.metrics import span, record_cache
+from src.config import QUESTION_MODEL, ANSWER_MODEL, EMBEDDING_MODEL
+from src.providers import chat_model, embedding_model, cache_model_name
 
-from dotenv import load_dotenv
-from langchain_community.document_loaders import PyPDFLoader
-from langchain_text_splitters import TokenTextSplitter
-from langchain_core.documents import Document
+from langchain_core.prompts import PromptTemplate
 
-from langchain_google_genai import ChatGoogleGenerativeAI, GoogleGenerativeAIEmbeddings
-from langchain_community.vectorstores import FAISS
+# LangChain chain modules are imported inside the functions that build
+# chains, so importing this module stays cheap
 
-from langchain_core.prompts import PromptTemplate
-from langchain_classic.chains.summarize import load_summarize_chain
-from langchain_classic.chains import RetrievalQA
-from langchain_classic.chains.combine_documents import create_stuff_documents_chain
-from langchain_classic.chains.retrieval import create_retrieval_chain
 
+# Chunking settings (also part of the preprocessing cache key)
+ENCODING_NAME = "cl100k_base"
+QUES_CHUNK_SIZE = 10000
+ANS_CHUNK_SIZE = 2000
+CHUNK_OVERLAP = 200
+
+# Streaming ingestion reads pages lazily and yields chunks as they fill up,
+# so peak memory follows the chunk size instead of the document size
+STREAMING_INGEST = os.getenv("QA_STREAMING_INGEST", "0") == "1"
+
+# Chunker for the non-streaming path: "single_pass" encodes the document once
+# and slices both chunk sizes from one token array; "splitters" is the
+# original two-TokenTextSplitter path
+CHUNKER = os.getenv("QA_CHUNKER", "single_pass")
 
+# Question generation: "refine" walks the chunks one after another,
+# "parallel" maps prompt_template over all chunks concurrently
+QUESTION_GEN_MODE = os.getenv("QA_QUESTION_GEN_MODE", "refine")
 
-GOOGLE_API_KEY = st.secrets.get("GOOGLE_API_KEY")
+# Most questions a job answers (generate_csv drops the rest)
+MAX_QUESTIONS = 45
+
+
+def ingestion_variant(streaming=None, chunker=None):
+    """
+    Cache-key parts naming how chunks were produced (ingestion path and PDF
+    text backend). Chunk text and metadata differ between variants, so every
+    cache built from the chunks (preprocessing, FAISS index) must include them.
+    """
+    if streaming is None:
+        streaming = STREAMING_INGEST
+    return ("streaming" if streaming else chunker or CHUNKER), PDF_BACKEND
 
-if not GOOGLE_API_KEY:
-    raise RuntimeError("GOOGLE_API_KEY not found in Streamlit secrets.")
-os.environ["GOOGLE_API_KEY"] = GOOGLE_API_KEY
 
-st.write("Google API key loaded:", "Yes" if GOOGLE_API_KEY else "No")
+def document_pages(file_path, doc_hash=None, lazy=False):
+    """
+    (page_number, text) of every page of the PDF. Pages come from the page
+    cache when this file was parsed before (e.g. planned at /analyze time);
+    otherwise they are extracted and written to it. With `lazy`, pages are
+    yielded one at a time (bounded memory) instead of returned as a list.
+    """
+    doc_hash = doc_hash or file_sha256(file_path)
+    cached = iter_cached_pages(doc_hash, PDF_BACKEND)
+    record_cache("pages", hits=int(cached is not None), misses=int(cached is None))
+
+    def extracted():
+        return cache_pages(doc_hash, PDF_BACKEND, iter_pages(file_path) if lazy else extract_pages(file_path))
+
+    def pages():
+        if cached is None:
+            yield from extracted()
+            return
+        read = 0
+        try:
+            for page in cached:
+                yield page
+                read += 1
+        except (OSError, ValueError, EOFError):
+            # Unreadable entry (already dropped): extract the pages not yielded yet
+            yield from itertools.islice(extracted(), read, None)
 
+    return pages() if lazy else list(pages())
 
 
-def file_preprocessing(file_path):
+def file_preprocessing(file_path, use_cache=True, doc_hash=None, streaming=None, chunker=None,
+                       ques_chunk_size=QUES_CHUNK_SIZE, ans_chunk_size=ANS_CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP):
     """
     Load PDF, produce two sets of documents:
       - docs_ques_gen : large chunks used for question-generation stage
       - docs_ans_gen  : smaller chunks used for retrieval / answer generation
 
+    Results are cached on disk by PDF content hash + chunking settings, so a
+    repeat upload of the same file skips loading and splitting entirely.
+    With `streaming` (default: QA_STREAMING_INGEST) pages are parsed lazily and
+    tokenized incrementally; chunks then carry page_start/page_end metadata.
+    Chunk sizes default to the module settings; a job plan may lower them.
+
     Returns:
         docs_ques_gen (List[Document]), docs_ans_gen (List[Document])
     """
-
-    # Load data from PDF
-    loader = PyPDFLoader(file_path)
-    pages = loader.load()
-
-    # Concatenate pages into a single large text for question generation
-    question_gen = ""
-    for page in pages:
-        question_gen += page.page_content + "\n"
-
-    # Split into large chunks for question generation (preserve context)
-    splitter_ques_gen = TokenTextSplitter(
-        encoding_name="cl100k_base",
-        chunk_size=10000,
-        chunk_overlap=200
-    )
-    chunk_ques_gen = splitter_ques_gen.split_text(question_gen)
-    docs_ques_gen = [Document(page_content=t) for t in chunk_ques_gen]
-
-    # Split into smaller chunks for retrieval/answering
-    splitter_ans_gen = TokenTextSplitter(
-        encoding_name="cl100k_base",
-        chunk_size=2000,
-        chunk_overlap=200
-    )
-    docs_ans_gen = splitter_ans_gen.split_documents(docs_ques_gen)
+    if streaming is None:
+        streaming = STREAMING_INGEST
+    chunker = chunker or CHUNKER
+
+    cache_key = None
+    if use_cache:
+        cache_key = make_cache_key(
+            doc_hash or file_sha256(file_path), ENCODING_NAME,
+            ques_chunk_size, ans_chunk_size, chunk_overlap,
+            *ingestion_variant(streaming, chunker)
+        )
+        cached = load_preprocessed(cache_key)
+        record_cache("preprocessing", hits=int(cached is not None), misses=int(cached is None))
+        if cached is not None:
+            print(f"[Cache] Preprocessing hit for {os.path.basename(file_path)}")
+            # Entries written before chunk ids existed get them here
+            assign_chunk_ids(cached[1])
+            return cached
+
+    if streaming:
+        # Loading and splitting are interleaved, so they share one span
+        docs_ques_gen, docs_ans_gen = [], []
+        with span("pdf_load_and_split"):
+            pages = document_pages(file_path, doc_hash, lazy=True)
+            for ques_doc, ans_docs in stream_chunks(
+                pages, file_path, ENCODING_NAME, ques_chunk_size, ans_chunk_size, chunk_overlap
+            ):
+                docs_ques_gen.append(ques_doc)
+                docs_ans_gen.extend(ans_docs)
+
+        assign_chunk_ids(docs_ans_gen)
+        if cache_key:
+            save_preprocessed(cache_key, docs_ques_gen, docs_ans_gen)
+        return docs_ques_gen, docs_ans_gen
+
+    # Load data from PDF (pages extracted in parallel, or read back from the page cache)
+    with span("pdf_load"):
+        pages = document_pages(file_path, doc_hash)
+
+    if chunker == "splitters":
+        # Concatenate pages into a single large text for question generation
+        # (one join instead of repeated += keeps this linear in document size)
+        question_gen = "".join(text + "\n" for _, text in pages)
+        del pages
+        with span("split"):
+            docs_ques_gen, docs_ans_gen = split_with_text_splitters(
+                question_gen, ENCODING_NAME, ques_chunk_size, ans_chunk_size, chunk_overlap
+            )
+    else:
+        # Tokenize once; both chunk granularities are slices of the same token array
+        with span("split"):
+            docs_ques_gen, docs_ans_gen = split_single_pass(
+                pages, ENCODING_NAME, ques_chunk_size, ans_chunk_size, chunk_overlap,
+                source=file_path
+            )
+
+    # Stable ids for the retrieval chunks (used e.g. to key cached summaries)
+    assign_chunk_ids(docs_ans_gen)
+
+    if cache_key:
+        save_preprocessed(cache_key, docs_ques_gen, docs_ans_gen)
 
     return docs_ques_gen, docs_ans_gen
 
 
-def llm_pipeline(file_path):
+def llm_pipeline(file_path, question_gen_mode=None, max_concurrency=QUESTION_GEN_CONCURRENCY, questions=None,
+                 plan=None):
     """
     Full pipeline:
       - preprocess file -> docs_ques_gen, docs_ans_gen
-      - question generation chain (refine) -> ques (string with questions)
-      - build embeddings + FAISS
+      - question generation, refine chain or parallel map-reduce -> ques (string with questions)
+      - build embeddings + FAISS (reused from disk when this chunk set was indexed before)
       - prepare answer LLM and retrieval chain
       - filter & normalize generated questions
-      - returns: ans_gen_chain (retrieval chain ready to invoke), filtered_questions (list)
+      - returns: ans_gen_chain (retrieval chain ready to invoke), filtered_questions (list),
+        retriever, llm_answer_gen, pipeline_info (doc_hash / index_key / stage_seconds)
+
+    `questions` (e.g. from a job checkpoint) skips question generation and dedup;
+    preprocessing and the index then come from their caches.
+
+    `plan` (from src.planner.plan_job) overrides the chunk sizes and
+    retrieval k and caps the number of questions to fit a token budget.
     """
-    #  File preprocessing
-    docs_ques_gen, docs_ans_gen = file_preprocessing(file_path)
+    plan = plan or {}
+    ques_chunk_size = plan.get("ques_chunk_size") or QUES_CHUNK_SIZE
+    ans_chunk_size = plan.get("ans_chunk_size") or ANS_CHUNK_SIZE
+    chunk_overlap = plan.get("chunk_overlap") or CHUNK_OVERLAP
+    search_kwargs = dict(SEARCH_KWARGS)
+    if plan.get("k"):
+        search_kwargs["k"] = plan["k"]
+
+    # Wall time of each stage, reported in pipeline_info for benchmarks and logs
+    stage_seconds = {}
+    stage_start = time.perf_counter()
 
-    #  LLM for question generation (Google Gemini)
-    llm_ques_gen_pipeline = ChatGoogleGenerativeAI(
-        temperature=0.3,
-        model="models/gemini-3-flash-preview"
+    #  File preprocessing
+    doc_hash = file_sha256(file_path)
+    docs_ques_gen, docs_ans_gen = file_preprocessing(
+        file_path, doc_hash=doc_hash, ques_chunk_size=ques_chunk_size,
+        ans_chunk_size=ans_chunk_size, chunk_overlap=chunk_overlap
     )
-
-    # Prompts based on your src.prompt (expected variables imported above)
-    PROMPT_QUESTIONS = PromptTemplate(template=prompt_template, input_variables=["text"])
-    REFINE_PROMPT_QUESTIONS = PromptTemplate(
-        input_variables=["existing_answer", "text"],
-        template=refine_template
+    stage_seconds["preprocess"] = time.perf_counter() - stage_start
+
+    # Every model call is paced by the process-wide rate limiter
+    rate_limiter = get_rate_limiter()
+
+    # Questions from a checkpoint skip generation entirely
+    stage_start = time.perf_counter()
+    if questions is None:
+        #  LLM for question generation (configured backend)
+        llm_ques_gen_pipeline = chat_model(
+            model=QUESTION_MODEL,
+            temperature=0.3,
+            callbacks=[RateLimitCallback(rate_limiter), LLMMetricsCallback(QUESTION_MODEL)]
+        )
+
+        # Prompts based on your src.prompt (expected variables imported above)
+        PROMPT_QUESTIONS = PromptTemplate(template=prompt_template, input_variables=["text"])
+        REFINE_PROMPT_QUESTIONS = PromptTemplate(
+            input_variables=["existing_answer", "text"],
+            template=refine_template
+        )
+
+        with span("question_generation"):
+            mode = question_gen_mode or QUESTION_GEN_MODE
+            if mode == "parallel":
+                # Per-chunk questions generated concurrently, merged and deduped locally
+                ques = generate_questions_parallel(
+                    llm_ques_gen_pipeline, PROMPT_QUESTIONS, docs_ques_gen,
+                    max_concurrency=max_concurrency
+                )
+            else:
+                #  Build question-generation chain (refine)
+                from langchain_classic.chains.summarize import load_summarize_chain
+                ques_gen_chain = load_summarize_chain(
+                    llm=llm_ques_gen_pipeline,
+                    chain_type="refine",
+                    verbose=True,
+                    question_prompt=PROMPT_QUESTIONS,
+                    refine_prompt=REFINE_PROMPT_QUESTIONS,
+                    # these names help the refine chain know which variable is which
+                    document_variable_name="text",
+                    initial_response_name="existing_answer",
+                )
+
+                # Run the question generation on the larger chunks
+                ques = ques_gen_chain.run(docs_ques_gen)  # expects list[Document] or list[str]
+        stage_seconds["question_generation"] = time.perf_counter() - stage_start
+
+    #  Embeddings + FAISS vector store (embeddings from the configured backend)
+    # Chunk-level memoization: only texts never embedded before hit the API
+    stage_start = time.perf_counter()
+    embedding_name = cache_model_name(EMBEDDING_MODEL)
+    embeddings = CachedEmbeddings(
+        embedding_model(EMBEDDING_MODEL),
+        model_name=embedding_name,
+        rate_limiter=rate_limiter
     )
-
-    #  Build question-generation chain (refine)
-    ques_gen_chain = load_summarize_chain(
-        llm=llm_ques_gen_pipeline,
-        chain_type="refine",
-        verbose=True,
-        question_prompt=PROMPT_QUESTIONS,
-        refine_prompt=REFINE_PROMPT_QUESTIONS,
-        # these names help the refine chain know which variable is which
-        document_variable_name="text",
-        initial_response_name="existing_answer",
+    index_key = make_cache_key(
+        doc_hash, embedding_name, ENCODING_NAME,
+        ques_chunk_size, ans_chunk_size, chunk_overlap,
+        *ingestion_variant()
     )
-
-    # Run the question generation on the larger chunks
-    ques = ques_gen_chain.run(docs_ques_gen)  # expects list[Document] or list[str]
-
-    #  Embeddings + FAISS vector store (Google embeddings)
-    embeddings = GoogleGenerativeAIEmbeddings(model="text-embedding-004")
-    vector_store = FAISS.from_documents(docs_ans_gen, embeddings)
-
-    #  LLM for answer generation (Google Gemini)
-    llm_answer_gen = ChatGoogleGenerativeAI(
+    index_meta = {"source": os.path.basename(file_path), "embedding_model": embedding_name}
+    if RETRIEVAL_MODE == "bm25":
+        # Lexical retrieval never searches the vectors: no chunk is embedded
+        vector_store = None
+    elif RETRIEVAL_MODE == "hybrid":
+        # Hybrid degrades to BM25 alone when the embedding endpoint is unavailable
+        try:
+            vector_store = get_or_build_index(index_key, docs_ans_gen, embeddings, meta=index_meta)
+        except Exception as e:
+            print(f"[IndexStore] Building the FAISS index failed ({e}), retrieving with BM25 only")
+            vector_store = None
+    else:
+        vector_store = get_or_build_index(index_key, docs_ans_gen, embeddings, meta=index_meta)
+    print(f"[Embeddings] Cache stats: {embeddings.stats()}")
+
+    #  LLM for answer generation (configured backend)
+    llm_answer_gen = chat_model(
+        model=ANSWER_MODEL,
         temperature=0.1,
-        model="gemini-2.5-flash"
+        callbacks=[RateLimitCallback(rate_limiter), LLMMetricsCallback(ANSWER_MODEL)]
     )
 
-    ANSWER_PROMPT = PromptTemplate.from_template(
-    """You are an expert on UN Sustainable Development Goals (SDGs).
-    Your task is to extract and summarize the answer to the question using ONLY the provided CONTEXT.
-
-    **RULES:**
-    1.  **Strict Context Reliance:** Use ONLY the provided CONTEXT. Do NOT invent facts or generalize.
-    2.  **Focus:** Directly extract the specific requirement or characteristic requested by the question from the relevant SDG Target in the context.
-    3.  **No Citation:** Do NOT include 'Target X.Y', 'Goal X', or any reference/citation in the final answer.
-    4.  **Failure State:** If the exact answer is not present in the context, reply exactly: **Not found in context.**
-    5.  **Conciseness:** Provide a brief and precise answer, avoiding unnecessary elaboration.
-    6.  **No Markdown:** Do NOT use any markdown formatting like *, **, `, or _ in your response.
-    7.  **Plain Text Only:** Use only plain text with proper punctuation.
-    8.  **Failure State:** If the exact answer is not present in the context, reply exactly: **Not found in context.**
-
-    Context: {context}
-
-    Question: {input}
-
-    Answer in format: [Directly extracted answer/summary]."""
-    )
+    # Lexical index over the same chunks (ids are positions in docs_ans_gen, as
+    # in FAISS): offline retrieval and hybrid prefilter
+    bm25 = build_bm25_index(docs_ans_gen) if RETRIEVAL_MODE in ("bm25", "hybrid") else None
+    if bm25 is not None:
+        print(f"[BM25] Index stats: {bm25.stats()}")
 
     # Build retriever (MMR settings required)
-    retriever = vector_store.as_retriever(
-        search_type="mmr",
-        search_kwargs={"k": 6, "fetch_k": 30, "lambda_mult": 0.5}
+    retriever = MMRRetriever(
+        vectorstore=vector_store,
+        documents=docs_ans_gen,
+        embeddings=embeddings,
+        bm25=bm25,
+        search_type=RETRIEVAL_MODE,
+        search_kwargs=search_kwargs
     )
 
+    stage_seconds["index"] = time.perf_counter() - stage_start
+
     # Build combine_chain and retrieval chain (create once)
-    combine_chain = create_stuff_documents_chain(llm_answer_gen, ANSWER_PROMPT)
+    from langchain_classic.chains.retrieval import create_retrieval_chain
+    combine_chain = build_combine_chain(llm_answer_gen)
     ans_gen_chain = create_retrieval_chain(retriever=retriever, combine_docs_chain=combine_chain)
     
 
-    def clean_question_text(text):
-        """Remove markdown formatting and special characters from questions"""
-        if not isinstance(text, str):
-            text = str(text)
-        
-        # Remove numbering like "1.", "2." etc.
-        text = re.sub(r'^\s*\d+\.\s*', '', text)
-        
-        # Remove markdown formatting: *, **, `, etc.
-        text = re.sub(r'[\*\_\`]', '', text)
-        
-        # Remove quotes that wrap content
-        text = re.sub(r'^\"(.*)\"$', r'\1', text)
-        text = re.sub(r"^\'(.*)\'$", r'\1', text)
-        
-        # Remove extra whitespace
-        text = re.sub(r'\s+', ' ', text).strip()
-        
-        # Ensure it starts with capital letter
-        if text and len(text) > 1:
-            text = text[0].upper() + text[1:]
-        
-        return text
-
-
-    ques_list = ques.split("\n")
-    numbering_pattern = re.compile(r'^\s*\d+\.\s*')
-    question_start_regex = re.compile(
-        r'^(what|which|when|how|why|where|who|explain|describe|list|define)\b',
-        re.I
-    )
-
-    filtered_questions = []
-    seen = set()
-
-    for raw in ques_list:
-        q = raw.strip()
-        if not q:
-            continue
-
-        # Remove numbering like "1." and bullet markers
-        # q = numbering_pattern.sub('', q)
-        q = clean_question_text(q)
-
-        # Drop obvious headers/meta
-        if len(q) < 5:
-            continue
-        low = q.lower()
-        if low.startswith("here are") or low.startswith("the following"):
-            continue
-
-        # Ensure interrogative — allow short command-like prompts (e.g., "List three targets")
-        if not (q.endswith('?') or question_start_regex.search(q)):
-            continue
-
-        # Normalize and dedupe
-        q_norm = re.sub(r'\s+', ' ', q.strip()).lower()
-        if q_norm in seen:
-            continue
-        seen.add(q_norm)
-
-        # Standardize to end with '?'
-        if not q.endswith('?'):
-            q = q.rstrip('.') + '?'
-
-        filtered_questions.append(q)
-
-        # #  LIMIT TO 30 QUESTIONS MAXIMUM
-        # if len(filtered_questions) >= 30:
-        #     print(f"DEBUG: Limited to first 30 questions for faster processing")
-        #     break
+    if questions is None:
+        # Clean, filter and dedupe the generated questions
+        stage_start = time.perf_counter()
+        filtered_questions = filter_questions(ques)
+
+        # Paraphrases would each cost a full retrieve-and-answer cycle
+        filtered_questions, dedup_report = semantic_dedup(filtered_questions, embeddings)
+        print(
+            f"[Dedup] {dedup_report['candidates']} questions -> {dedup_report['kept']} "
+            f"({dedup_report['answer_calls_saved']} answer calls saved)"
+        )
+        stage_seconds["question_filtering"] = time.perf_counter() - stage_start
+
+        # The plan's question cap keeps answering within the token budget
+        if plan.get("max_questions") and len(filtered_questions) > plan["max_questions"]:
+            print(f"[Plan] Keeping {plan['max_questions']} of {len(filtered_questions)} questions")
+            filtered_questions = filtered_questions[:plan["max_questions"]]
+    else:
+        filtered_questions = list(questions)
+
+    # What a checkpoint needs to find this document's cached chunks and index again
+    pipeline_info = {"doc_hash": doc_hash, "index_key": index_key, "stage_seconds": stage_seconds}
 
     # Return the prepared chain and filtered questions (for loop usage)
-    return ans_gen_chain, filtered_questions, retriever, llm_answer_gen
+    return ans_gen_chain, filtered_questions, retriever, llm_answer_gen, pipeline_info
 
 
 def answer_questions_and_write(ans_gen_chain, filtered_questions, retriever, llm_answer_gen, answers_file="answers.txt"):
     """
-    Given a prepared ans_gen_chain and filtered_questions, iterate, retrieve,
-    summarize retrieved docs, then feed summarized_context to the combine chain
-    (via the ans_gen_chain). Streaming attempted first; fallback to normal invoke.
-    Saves answers to answers_file.
+    Given filtered_questions and the pipeline's retriever, iterate, retrieve,
+    compress retrieved docs locally (or summarize them with the refine chain
+    when QA_CONTEXT_COMPRESSION=refine), then feed the compressed context to
+    the combine chain directly. `ans_gen_chain` is not invoked: as a
+    retrieval chain it would retrieve again and replace the compressed
+    context. Streaming attempted first; fallback to normal invoke.
+    Saves answers to answers_file. Returns the compressor's summary
+    report (refine summarizations and how many were served from cache).
     """
 
+    from langchain_classic.chains.combine_documents import create_stuff_documents_chain
+
     # Clear previous file
     open(answers_file, "w", encoding="utf-8").close()
 
-    # Prepare a summarization chain (refine) to always produce summarized_context
-    summarize_chain = load_summarize_chain(
-        llm=llm_answer_gen,
-        chain_type="refine",
-        verbose=False
+    combine_chain = build_combine_chain(llm_answer_gen)
+
+    # Refine summarization (one LLM call per retrieved doc) is opt-in; the default compresses locally.
+    # Refine summaries are cached per retrieved chunk set; counts are reported per job
+    compressor = ContextCompressor(
+        llm=llm_answer_gen, embeddings=retriever_embeddings(retriever), encoding_name=ENCODING_NAME,
+        summary_cache=get_summary_cache()
     )
 
-    # If ans_gen_chain is a create_retrieval_chain instance, the combine part expects a 'context' that can be
-    # either a string or the documents — we will provide summarized_context as a string.
+    if ANSWER_MODE == "batched":
+        # One call per group of questions with overlapping context
+        answered = answer_in_batches(
+            filtered_questions, retriever, llm_answer_gen, combine_chain,
+            rate_limiter=get_rate_limiter(), compressor=compressor
+        )
+        for i, question, answer_text in answered:
+            print(f"Answer {i + 1}: {answer_text}")
+            with open(answers_file, "a", encoding="utf-8") as f:
+                f.write(f"Question {i + 1}: {question}\n")
+                f.write(f"Answer {i + 1}: {answer_text}\n")
+                f.write("-" * 60 + "\n\n")
+        return compressor.report()
+
     for idx, question in enumerate(filtered_questions, 1):
         print("=" * 60)
         print(f"Question {idx}: {question}")
@@ -272,61 +404,29 @@ def answer_questions_and_write(ans_gen_chain, filtered_questions, retriever, llm
                 f.write(f"Question {idx}: {question}\n")
                 f.write(f"Answer {idx}: {answer_text}\n")
                 f.write("-" * 60 + "\n\n")
-            time.sleep(12)
             continue
 
-        #  Summarize retrieved docs -> summarized_context (string)
-        try:
-            summarized_context = summarize_chain.run(retrieved_docs)
-            # If summarization returns None or empty, fallback to concatenating page_content
-            if not summarized_context or not summarized_context.strip():
-                summarized_context = "\n\n".join([d.page_content for d in retrieved_docs])
-        except Exception as e:
-            print(f"[Summarization error] {e}")
-            summarized_context = "\n\n".join([d.page_content for d in retrieved_docs])
-
-        input_payload = {"input": question, "context": summarized_context}
+        # Compress retrieved docs -> context documents (the raw docs if compression fails)
+        context_docs = compressor(question, retrieved_docs)
+        input_payload = {"input": question, "context": context_docs}
 
         full_answer_text = ""
-        try:
-            # prefer streaming if available
-            if hasattr(ans_gen_chain, "stream"):
-                stream = ans_gen_chain.stream(input_payload)
-                # Some stream implementations yield dict chunks; handle both
-                for chunk in stream:
-                    # chunk might be a dict with 'answer' or 'output' keys or a raw string
-                    if isinstance(chunk, dict):
-                        # look for likely fields
-                        token = chunk.get("answer") or chunk.get("output") or chunk.get("text") or ""
-                    else:
-                        token = str(chunk)
-                    full_answer_text += token
+        with span("answering"):
+            try:
+                # prefer streaming (pacing happens in the model's RateLimitCallback)
+                for token in combine_chain.stream(input_payload):
+                    full_answer_text += str(token)
                     # Optionally print as it streams
                     print(token, end="", flush=True)
                 print()  # final newline after stream
-            else:
-                response = ans_gen_chain.invoke(input_payload)
-                # normalize possible shapes
-                if isinstance(response, dict):
-                    # typical fields: 'output' or 'answer' or 'result'
-                    full_answer_text = response.get("output") or response.get("answer") or response.get("result") or str(response)
-                else:
-                    full_answer_text = str(response)
-                print(f"Answer {idx}: {full_answer_text}")
-        except Exception as e:
-            # fallback: call combine chain directly (safe)
-            try:
-                combine_chain = create_stuff_documents_chain(llm_answer_gen, ANSWER_PROMPT)
-                # combine_chain expects {"input": question, "context": summarized_context}
-                result = combine_chain.invoke({"input": question, "context": summarized_context})
-                if isinstance(result, dict):
-                    full_answer_text = result.get("output") or result.get("answer") or str(result)
-                else:
-                    full_answer_text = str(result)
-                print(full_answer_text)
-            except Exception as e2:
-                full_answer_text = f"[ERROR: {e}] / fallback error: {e2}"
-                print(full_answer_text)
+            except Exception as e:
+                # fallback: plain invoke
+                try:
+                    full_answer_text = extract_answer(combine_chain.invoke(input_payload))
+                    print(full_answer_text)
+                except Exception as e2:
+                    full_answer_text = f"[ERROR: {e}] / fallback error: {e2}"
+                    print(full_answer_text)
 
         # If strict format required but not found, produce natural-language summary as fallback
         if "Not found in context." in full_answer_text or not full_answer_text.strip():
@@ -335,11 +435,7 @@ def answer_questions_and_write(ans_gen_chain, filtered_questions, retriever, llm
                 combine_chain_nl = create_stuff_documents_chain(llm_answer_gen, PromptTemplate.from_template(
                     "Using only this context, provide a concise natural-language answer to the question.\n\nContext: {context}\n\nQuestion: {input}\n\nAnswer:"
                 ))
-                nl_result = combine_chain_nl.invoke({"input": question, "context": summarized_context})
-                if isinstance(nl_result, dict):
-                    nl_text = nl_result.get("output") or nl_result.get("answer") or str(nl_result)
-                else:
-                    nl_text = str(nl_result)
+                nl_text = extract_answer(combine_chain_nl.invoke(input_payload))
                 # if model still returns nothing useful, keep "Not found in context."
                 if nl_text and nl_text.strip():
                     full_answer_text = nl_text
@@ -353,5 +449,10 @@ def answer_questions_and_write(ans_gen_chain, filtered_questions, retriever, llm
             f.write(f"Answer {idx}: {full_answer_text}\n")
             f.write("-" * 60 + "\n\n")
 
-        # 7) Rate limit pause
-        time.sleep(12)
+    summary_report = compressor.report()
+    if compressor.mode == "refine":
+        print(
+            f"[Summary cache] {summary_report['from_cache']}/{summary_report['summaries']} "
+            f"summarizations served from cache"
+        )
+    return summary_report
@@ -0,0 +1,135 @@
+import os
+import json
+import hashlib
+import shutil
+import time
+
+from src.cache import CACHE_DIR, evict_lru, touch_entry
+from src.metrics import span, record_cache
+
+
+# Size limit for persisted FAISS indexes (least-recently-used entries are evicted)
+INDEX_CACHE_MAX_BYTES = int(os.getenv("QA_INDEX_CACHE_MAX_MB", "1024")) * 1024 * 1024
+
+# Files written by FAISS.save_local that make up one index entry
+INDEX_FILES = ("index.faiss", "index.pkl")
+MANIFEST_FILE = "manifest.json"
+
+
+def _index_root():
+    return os.path.join(CACHE_DIR, "faiss")
+
+
+def _sha256_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _verify_entry(entry_dir):
+    """
+    Check that every index file is present and matches the checksum recorded
+    in the manifest when it was written. Returns the manifest or None.
+    """
+    manifest_path = os.path.join(entry_dir, MANIFEST_FILE)
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        for name in INDEX_FILES:
+            if _sha256_file(os.path.join(entry_dir, name)) != manifest["checksums"][name]:
+                print(f"[IndexStore] Checksum mismatch for {name} in {entry_dir}")
+                return None
+    except (OSError, ValueError, KeyError) as e:
+        print(f"[IndexStore] Invalid entry {entry_dir}: {e}")
+        return None
+    return manifest
+
+
+def load_index(index_key, embeddings):
+    """
+    Load a previously saved FAISS index for `index_key`, or return None on a
+    miss. Entries that fail the integrity check are deleted.
+    """
+    entry_dir = os.path.join(_index_root(), index_key)
+    if not os.path.isdir(entry_dir):
+        return None
+
+    manifest = _verify_entry(entry_dir)
+    if manifest is None:
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        return None
+
+    try:
+        # The pickle is only ever written by save_index below and its checksum
+        # was verified above, so deserializing it is safe here.
+        from langchain_community.vectorstores import FAISS
+        vector_store = FAISS.load_local(
+            entry_dir, embeddings, allow_dangerous_deserialization=True
+        )
+    except Exception as e:
+        print(f"[IndexStore] Failed to load {entry_dir}: {e}")
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        return None
+
+    if vector_store.index.ntotal != manifest.get("num_vectors"):
+        print(f"[IndexStore] Vector count mismatch in {entry_dir}, rebuilding")
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        return None
+
+    touch_entry(entry_dir)
+    return vector_store
+
+
+def save_index(index_key, vector_store, meta=None):
+    """
+    Persist `vector_store` (FAISS index + docstore) under `index_key` with a
+    checksum manifest, then enforce the size limit. The entry is written to a
+    temporary directory and renamed into place so readers never see it half-done.
+    """
+    root = _index_root()
+    os.makedirs(root, exist_ok=True)
+    entry_dir = os.path.join(root, index_key)
+    tmp_dir = os.path.join(root, f".{index_key}.{os.getpid()}.{time.time_ns()}.tmp")
+
+    try:
+        vector_store.save_local(tmp_dir)
+        manifest = {
+            "key": index_key,
+            "num_vectors": vector_store.index.ntotal,
+            "checksums": {name: _sha256_file(os.path.join(tmp_dir, name)) for name in INDEX_FILES},
+            "created_at": time.time(),
+            "meta": meta or {},
+        }
+        with open(os.path.join(tmp_dir, MANIFEST_FILE), "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+
+        if os.path.isdir(entry_dir):
+            shutil.rmtree(entry_dir, ignore_errors=True)
+        os.replace(tmp_dir, entry_dir)
+    except OSError as e:
+        print(f"[IndexStore] Could not save index {index_key}: {e}")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        return
+
+    evict_lru(root, INDEX_CACHE_MAX_BYTES)
+
+
+def get_or_build_index(index_key, docs, embeddings, meta=None):
+    """
+    Return the FAISS vector store for `docs`, loading it from disk when the
+    same chunk set was already indexed with the same embedding model.
+    """
+    vector_store = load_index(index_key, embeddings)
+    record_cache("faiss_index", hits=int(vector_store is not None), misses=int(vector_store is None))
+    if vector_store is not None:
+        print(f"[IndexStore] Reusing persisted FAISS index ({vector_store.index.ntotal} vectors)")
+        return vector_store
+
+    from langchain_community.vectorstores import FAISS
+    # Includes embedding the chunks that are not in the embedding cache yet
+    with span("faiss_build"):
+        vector_store = FAISS.from_documents(docs, embeddings)
+    save_index(index_key, vector_store, meta)
+    return vector_store
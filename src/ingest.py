@@ -0,0 +1,80 @@
+from array import array
+
+import tiktoken
+from langchain_core.documents import Document
+
+
+def window_bounds(n_tokens, chunk_size, chunk_overlap):
+    """
+    (start, end) token windows with the same boundaries TokenTextSplitter uses:
+    windows of `chunk_size` advancing by `chunk_size - chunk_overlap`, the
+    last one ending at `n_tokens`.
+    """
+    if chunk_overlap >= chunk_size:
+        raise ValueError("chunk_overlap must be smaller than chunk_size")
+    step = chunk_size - chunk_overlap
+    start = 0
+    while start < n_tokens:
+        end = min(start + chunk_size, n_tokens)
+        yield start, end
+        if end == n_tokens:
+            break
+        start += step
+
+
+def iter_token_windows(pages, encoding, chunk_size, chunk_overlap):
+    """
+    Incrementally tokenize `pages` and yield (token_ids, token_pages) windows
+    as soon as they are complete; token_pages holds the page number of every
+    token, so sub-windows can report their own page range.
+
+    Only the current window (plus the page being tokenized) is held in
+    memory, so peak memory depends on `chunk_size`, not on document size.
+    """
+    if chunk_overlap >= chunk_size:
+        raise ValueError("chunk_overlap must be smaller than chunk_size")
+    step = chunk_size - chunk_overlap
+    tokens = array("i")
+    token_pages = array("i")
+    emitted = False
+
+    for page_no, text in pages:
+        page_tokens = encoding.encode(text + "\n", disallowed_special=())
+        tokens.extend(page_tokens)
+        token_pages.extend([page_no] * len(page_tokens))
+
+        while len(tokens) >= chunk_size:
+            yield tokens[:chunk_size].tolist(), token_pages[:chunk_size].tolist()
+            emitted = True
+            del tokens[:step]
+            del token_pages[:step]
+
+    # Tail: whatever is left that the last full window did not already cover
+    if len(tokens) > chunk_overlap or (tokens and not emitted):
+        yield tokens.tolist(), token_pages.tolist()
+
+
+def stream_chunks(pages, source, encoding_name, ques_chunk_size, ans_chunk_size, chunk_overlap):
+    """
+    Streaming ingestion: yield (ques_doc, ans_docs) for each question-generation
+    chunk as soon as enough of the (page_number, text) iterable `pages` has
+    been read.
+
+    Answer chunks are cut from the question chunk's token ids directly, so
+    the text is never re-tokenized. Every Document carries `source`,
+    `page_start` and `page_end` metadata for the pages its own tokens span.
+    """
+    encoding = tiktoken.get_encoding(encoding_name)
+
+    def make_doc(tokens, token_pages, start, end):
+        meta = {"source": source, "page_start": token_pages[start], "page_end": token_pages[end - 1]}
+        return Document(page_content=encoding.decode(tokens[start:end]), metadata=meta)
+
+    windows = iter_token_windows(pages, encoding, ques_chunk_size, chunk_overlap)
+    for ques_tokens, token_pages in windows:
+        ques_doc = make_doc(ques_tokens, token_pages, 0, len(ques_tokens))
+        ans_docs = [
+            make_doc(ques_tokens, token_pages, start, end)
+            for start, end in window_bounds(len(ques_tokens), ans_chunk_size, chunk_overlap)
+        ]
+        yield ques_doc, ans_docs
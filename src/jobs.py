@@ -0,0 +1,208 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+import traceback
+
+
+# Local state that must survive restarts (job rows, checkpoints, ...)
+DATA_DIR = os.getenv("QA_DATA_DIR", "data")
+
+# Number of jobs processed at the same time
+JOB_WORKERS = int(os.getenv("QA_JOB_WORKERS", "2"))
+
+# A job interrupted this many times (e.g. by restarts) is marked failed instead of re-queued
+MAX_ATTEMPTS = int(os.getenv("QA_JOB_MAX_ATTEMPTS", "3"))
+
+# Columns a caller may update through JobQueue.update
+JOB_FIELDS = (
+    "status", "progress", "total_questions", "current_question",
+    "current_qa", "file", "error",
+)
+
+
+class JobQueue:
+    """
+    SQLite-backed job queue with a bounded pool of worker threads.
+
+    Jobs are claimed FIFO within priority (higher first). A job stays in
+    'processing' until its handler sets a final status, so anything that was
+    running when the server stopped is put back in the queue on start-up
+    (at-least-once execution). The same rows back /status/{job_id}.
+    """
+
+    def __init__(self, handler, db_path=None, num_workers=JOB_WORKERS):
+        self.handler = handler
+        self.db_path = db_path or os.path.join(DATA_DIR, "jobs.sqlite")
+        self.num_workers = num_workers
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._stopping = False
+        self._workers = []
+
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                priority INTEGER NOT NULL DEFAULT 0,
+                payload TEXT NOT NULL,
+                progress INTEGER NOT NULL DEFAULT 0,
+                total_questions INTEGER NOT NULL DEFAULT 0,
+                current_question INTEGER NOT NULL DEFAULT 0,
+                current_qa TEXT,
+                file TEXT,
+                error TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, priority DESC, created_at)"
+        )
+
+    # ───────────────────────────────────────────
+    # Rows
+    # ───────────────────────────────────────────
+    def enqueue(self, job_id, payload, priority=0):
+        """Add a job and wake up an idle worker."""
+        now = time.time()
+        with self._wakeup:
+            self._conn.execute(
+                "INSERT INTO jobs (id, status, priority, payload, created_at, updated_at) VALUES (?, 'queued', ?, ?, ?, ?)",
+                (job_id, priority, json.dumps(payload), now, now),
+            )
+            self._wakeup.notify()
+
+    def requeue(self, job_id, priority=None):
+        """
+        Put an existing job back in the queue (keeps its payload and progress
+        counters; the interruption budget starts over).
+        """
+        with self._wakeup:
+            if priority is None:
+                self._conn.execute(
+                    "UPDATE jobs SET status = 'queued', error = NULL, attempts = 0, updated_at = ? WHERE id = ?",
+                    (time.time(), job_id),
+                )
+            else:
+                self._conn.execute(
+                    "UPDATE jobs SET status = 'queued', error = NULL, attempts = 0, priority = ?, updated_at = ? WHERE id = ?",
+                    (priority, time.time(), job_id),
+                )
+            self._wakeup.notify()
+
+    def get(self, job_id):
+        """Return the job as a dict, or None if it does not exist."""
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        job["current_qa"] = json.loads(job["current_qa"]) if job["current_qa"] else None
+        return job
+
+    def update(self, job_id, **fields):
+        """Update progress/status columns of a job."""
+        unknown = set(fields) - set(JOB_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown job fields: {sorted(unknown)}")
+        if "current_qa" in fields and fields["current_qa"] is not None:
+            fields["current_qa"] = json.dumps(fields["current_qa"])
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._conn.execute(
+                f"UPDATE jobs SET {assignments}, updated_at = ? WHERE id = ?",
+                (*fields.values(), time.time(), job_id),
+            )
+
+    def queue_depth(self):
+        """Number of jobs waiting for a worker."""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+
+    def _claim(self):
+        """Atomically move the next queued job to 'processing' and return (id, payload)."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT id, payload FROM jobs WHERE status = 'queued' ORDER BY priority DESC, created_at LIMIT 1"
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE jobs SET status = 'processing', attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                        (time.time(), row["id"]),
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        return row["id"], json.loads(row["payload"])
+
+    def _recover(self):
+        """Re-queue jobs left in 'processing' by a previous run of the server."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'failed', error = 'Interrupted too many times.', updated_at = ? "
+                "WHERE status = 'processing' AND attempts >= ?",
+                (time.time(), MAX_ATTEMPTS),
+            )
+            recovered = self._conn.execute(
+                "UPDATE jobs SET status = 'queued', updated_at = ? WHERE status = 'processing'",
+                (time.time(),),
+            ).rowcount
+        if recovered:
+            print(f"[Jobs] Re-queued {recovered} interrupted job(s)")
+
+    # ───────────────────────────────────────────
+    # Workers
+    # ───────────────────────────────────────────
+    def start(self):
+        """Recover interrupted jobs and start the worker threads."""
+        self._recover()
+        self._stopping = False
+        for n in range(self.num_workers):
+            worker = threading.Thread(target=self._worker_loop, name=f"job-worker-{n}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def stop(self, timeout=5):
+        """Ask workers to exit once their current job is finished."""
+        with self._wakeup:
+            self._stopping = True
+            self._wakeup.notify_all()
+        for worker in self._workers:
+            worker.join(timeout)
+        self._workers = []
+
+    def _worker_loop(self):
+        while not self._stopping:
+            claimed = self._claim()
+            if claimed is None:
+                with self._wakeup:
+                    if not self._stopping:
+                        self._wakeup.wait(timeout=1.0)
+                continue
+
+            job_id, payload = claimed
+            try:
+                self.handler(job_id, payload)
+            except Exception as e:
+                print(f"[Jobs] Job {job_id} crashed: {e}")
+                traceback.print_exc()
+                self.update(job_id, status="failed", error=str(e))
+                continue
+
+            # Handlers set the final status; never leave a job stuck in 'processing'
+            job = self.get(job_id)
+            if job and job["status"] == "processing":
+                self.update(job_id, status="failed", error="Job ended without a final status.")
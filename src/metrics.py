@@ -0,0 +1,243 @@
+import os
+import json
+import time
+import bisect
+import threading
+import contextvars
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from src.tokens import TokenAccountant
+
+
+# Finished job traces kept in memory for /status (oldest are dropped)
+TRACE_HISTORY = int(os.getenv("QA_TRACE_HISTORY", "200"))
+
+# Histogram buckets for stage latency, in seconds (PDF pages up to whole refine chains)
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+# ───────────────────────────────────────────────
+# Prometheus-style metrics (text exposition format 0.0.4)
+# ───────────────────────────────────────────────
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values)) + (extra or [])
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=STAGE_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._values[key] = (counts, total + value)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            for key, (counts, total) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += count
+                    le = _format_labels(self.labelnames, key, [("le", _format_value(float(bound)))])
+                    lines.append(f"{self.name}_bucket{le} {cumulative}")
+                labels = _format_labels(self.labelnames, key)
+                lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+                lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+REGISTRY = []
+
+STAGE_SECONDS = Histogram("qa_stage_seconds", "Wall time of pipeline stages.", ["stage"])
+QUEUE_DEPTH = Gauge("qa_queue_depth", "Jobs waiting in the job queue.")
+LLM_IN_FLIGHT = Gauge("qa_llm_in_flight", "LLM calls currently in flight.", ["model"])
+LLM_CALLS = Counter("qa_llm_calls_total", "Finished LLM calls by outcome.", ["model", "status"])
+LLM_TOKENS = Counter("qa_llm_tokens_total", "LLM tokens reported by the model.", ["model", "kind"])
+CACHE_REQUESTS = Counter("qa_cache_requests_total", "Cache lookups by result.", ["cache", "result"])
+CACHE_HIT_RATIO = Gauge("qa_cache_hit_ratio", "Share of cache lookups that were hits since start.", ["cache"])
+STAGE_TOKENS = Counter("qa_stage_tokens_total", "LLM tokens per pipeline stage (tiktoken count).", ["stage", "kind"])
+
+
+def record_cache(cache, hits=0, misses=0):
+    """Count cache lookups and refresh that cache's hit ratio."""
+    if hits:
+        CACHE_REQUESTS.inc(hits, cache=cache, result="hit")
+    if misses:
+        CACHE_REQUESTS.inc(misses, cache=cache, result="miss")
+    with CACHE_REQUESTS._lock:
+        total_hits = CACHE_REQUESTS._values.get((cache, "hit"), 0)
+        total = total_hits + CACHE_REQUESTS._values.get((cache, "miss"), 0)
+    if total:
+        CACHE_HIT_RATIO.set(round(total_hits / total, 4), cache=cache)
+
+
+def render_metrics():
+    """All metrics in the Prometheus text format."""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ───────────────────────────────────────────────
+# Timing spans and per-job traces
+# ───────────────────────────────────────────────
+class JobTrace:
+    """
+    Per-stage totals (count, seconds, max) of the spans recorded while a job
+    ran, plus the LLM tokens its calls used per stage.
+    """
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.started = time.time()
+        self.finished = None
+        self.stages = {}
+        self.tokens = TokenAccountant()
+        self._lock = threading.Lock()
+
+    def add(self, stage, seconds):
+        with self._lock:
+            entry = self.stages.setdefault(stage, {"count": 0, "seconds": 0.0, "max_seconds": 0.0})
+            entry["count"] += 1
+            entry["seconds"] += seconds
+            entry["max_seconds"] = max(entry["max_seconds"], seconds)
+
+    def breakdown(self):
+        with self._lock:
+            stages = {
+                stage: {"count": e["count"], "seconds": round(e["seconds"], 3), "max_seconds": round(e["max_seconds"], 3)}
+                for stage, e in self.stages.items()
+            }
+        end = self.finished or time.time()
+        return {"wall_seconds": round(end - self.started, 3), "stages": stages, "tokens": self.tokens.report()}
+
+
+_current_trace = contextvars.ContextVar("qa_job_trace", default=None)
+_current_stage = contextvars.ContextVar("qa_stage", default=None)
+_traces = OrderedDict()
+_traces_lock = threading.Lock()
+
+
+@contextmanager
+def span(stage):
+    """
+    Time a block as `stage`: observed in the stage histogram and added to the
+    trace of the job running in this context. Threads started from a job
+    must run in a copy of its context (contextvars.copy_context) to be counted.
+    """
+    start = time.perf_counter()
+    token = _current_stage.set(stage)
+    try:
+        yield
+    finally:
+        _current_stage.reset(token)
+        seconds = time.perf_counter() - start
+        STAGE_SECONDS.observe(seconds, stage=stage)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add(stage, seconds)
+
+
+def record_llm_tokens(prompt_tokens, completion_tokens):
+    """Account one LLM call to the innermost span's stage and to the current job."""
+    stage = _current_stage.get() or "other"
+    STAGE_TOKENS.inc(prompt_tokens, stage=stage, kind="prompt")
+    STAGE_TOKENS.inc(completion_tokens, stage=stage, kind="completion")
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.tokens.record(stage, prompt_tokens, completion_tokens)
+
+
+@contextmanager
+def job_trace(job_id):
+    """
+    Collect the spans of everything run in this block under `job_id`.
+    A resumed job keeps adding to its earlier trace.
+    """
+    with _traces_lock:
+        trace = _traces.get(job_id)
+        if trace is None:
+            trace = _traces[job_id] = JobTrace(job_id)
+        trace.finished = None
+        _traces.move_to_end(job_id)
+        while len(_traces) > TRACE_HISTORY:
+            _traces.popitem(last=False)
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+        trace.finished = time.time()
+        print(f"[Trace] {json.dumps({'job_id': job_id, **trace.breakdown()})}")
+
+
+def job_breakdown(job_id):
+    """Stage breakdown of a recent job, or None when it is not (or no longer) traced."""
+    with _traces_lock:
+        trace = _traces.get(job_id)
+    return trace.breakdown() if trace is not None else None
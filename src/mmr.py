@@ -0,0 +1,72 @@
+import numpy as np
+
+
+def _normalize(x):
+    # float16 inputs are upcast: their range is too small for the dot products
+    x = np.asarray(x, dtype=np.float32)
+    norms = np.linalg.norm(x, axis=-1, keepdims=True)
+    return x / np.where(norms == 0, 1, norms)
+
+
+def mmr_select_batch(queries, candidates, k=6, lambda_mult=0.5, valid=None):
+    """
+    Maximal marginal relevance for a batch of queries at once.
+
+    Args:
+        queries     : (n, dim) query embeddings
+        candidates  : (n, fetch_k, dim) candidate embeddings per query
+                      (float16 or float32)
+        valid       : optional (n, fetch_k) bool mask for padded candidates
+
+    The candidate-candidate cosine matrix is computed once per query (as
+    one batched matmul) and the greedy selection keeps a running
+    max-similarity-to-selected vector per query, so each of the k steps is
+    a handful of array operations over the whole batch. Selection matches
+    LangChain's maximal_marginal_relevance: the most relevant candidate
+    first, then argmax of lambda * relevance - (1 - lambda) * redundancy.
+
+    Returns an (n, min(k, fetch_k)) int array of candidate positions,
+    -1 where a query ran out of valid candidates.
+    """
+    q = _normalize(queries)
+    c = _normalize(candidates)
+    n, fetch_k = c.shape[:2]
+    k = min(k, fetch_k)
+    selected = np.full((n, k), -1, dtype=np.int64)
+    if n == 0 or k == 0:
+        return selected
+
+    relevance = np.einsum("nfd,nd->nf", c, q)
+    similarity = np.matmul(c, c.transpose(0, 2, 1))
+
+    available = np.ones((n, fetch_k), dtype=bool) if valid is None else np.asarray(valid, dtype=bool).copy()
+    rows = np.arange(n)
+    max_sim = np.zeros((n, fetch_k), dtype=np.float32)
+
+    for step in range(k):
+        if step == 0:
+            score = relevance
+        else:
+            score = lambda_mult * relevance - (1 - lambda_mult) * max_sim
+        score = np.where(available, score, -np.inf)
+        pick = np.argmax(score, axis=1)
+        has_pick = available[rows, pick]
+
+        selected[has_pick, step] = pick[has_pick]
+        available[rows[has_pick], pick[has_pick]] = False
+        new_sim = similarity[rows, pick]
+        max_sim = np.where(
+            has_pick[:, None],
+            new_sim if step == 0 else np.maximum(max_sim, new_sim),
+            max_sim
+        )
+    return selected
+
+
+def mmr_select(query, candidates, k=6, lambda_mult=0.5):
+    """Single-query MMR: list of selected candidate positions (see mmr_select_batch)."""
+    candidates = np.asarray(candidates)
+    if len(candidates) == 0:
+        return []
+    picks = mmr_select_batch(np.asarray(query)[None, :], candidates[None, :, :], k=k, lambda_mult=lambda_mult)[0]
+    return [int(i) for i in picks if i >= 0]
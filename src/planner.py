@@ -0,0 +1,190 @@
+import os
+import json
+import math
+
+from src.cache import CACHE_DIR, file_sha256
+from src.extract import BACKENDS, PDF_BACKEND
+from src.prompt import prompt_template, refine_template, answer_template
+from src.tokens import count_tokens, ACCOUNTING_ENCODING
+from src.helper import QUES_CHUNK_SIZE, ANS_CHUNK_SIZE, CHUNK_OVERLAP, QUESTION_GEN_MODE, MAX_QUESTIONS, document_pages
+from src.retrieval import SEARCH_KWARGS
+
+
+# Default per-job LLM token budget (prompt + completion); 0 = no budget
+JOB_TOKEN_BUDGET = int(os.getenv("QA_JOB_TOKEN_BUDGET", "0"))
+
+# Candidate settings the planner may fall back to, largest (best quality) first
+QUES_CHUNK_SIZES = (10000, 8000, 6000)
+ANS_CHUNK_SIZES = (2000, 1500, 1000, 500)
+RETRIEVAL_KS = (6, 5, 4, 3, 2)
+
+# Fewest questions worth running a job for
+MIN_QUESTIONS = int(os.getenv("QA_PLAN_MIN_QUESTIONS", "5"))
+
+# Rough shape of the model output, used for the estimate
+QUESTIONS_PER_CHUNK = 15
+TOKENS_PER_QUESTION = 25
+TOKENS_PER_ANSWER = 80
+
+# Typical text tokens on a PDF page, for the estimate when no budget is set
+TOKENS_PER_PAGE = 600
+
+
+def _tokens_memo_path(doc_hash):
+    return os.path.join(CACHE_DIR, "plans", f"{doc_hash}-{PDF_BACKEND}.json")
+
+
+def _read_tokens_memo(doc_hash):
+    try:
+        with open(_tokens_memo_path(doc_hash), encoding="utf-8") as f:
+            return json.load(f)["tokens"]
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def document_tokens(file_path, doc_hash=None):
+    """
+    tiktoken count of the PDF text, memoized per file content in the cache
+    folder so repeat uploads are planned without parsing the PDF again.
+    The pages are read through the page cache, so the job that follows
+    does not extract them a second time.
+    """
+    doc_hash = doc_hash or file_sha256(file_path)
+    tokens = _read_tokens_memo(doc_hash)
+    if tokens is not None:
+        return tokens
+
+    tokens = sum(count_tokens(text) for _, text in document_pages(file_path, doc_hash, lazy=True))
+    path = _tokens_memo_path(doc_hash)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"tokens": tokens, "encoding": ACCOUNTING_ENCODING}, f)
+    return tokens
+
+
+def approximate_document_tokens(file_path, doc_hash=None):
+    """
+    Cheap stand-in for document_tokens: the memoized count when there is
+    one, otherwise the page count times TOKENS_PER_PAGE (no text is parsed).
+    Returns (tokens, approximate).
+    """
+    doc_hash = doc_hash or file_sha256(file_path)
+    tokens = _read_tokens_memo(doc_hash)
+    if tokens is not None:
+        return tokens, False
+    page_count = BACKENDS[PDF_BACKEND][0]
+    return page_count(file_path) * TOKENS_PER_PAGE, True
+
+
+def estimate_job(doc_tokens, ques_chunk_size, ans_chunk_size, k, max_questions=None,
+                 chunk_overlap=CHUNK_OVERLAP, question_gen_mode=QUESTION_GEN_MODE):
+    """
+    Worst-case LLM tokens of one job with these settings.
+
+    Question generation sends every large chunk once; with the refine
+    chain each call also carries the questions written so far. Every
+    question is then answered with up to k retrieved chunks as context.
+    """
+    n_chunks = max(1, math.ceil(doc_tokens / max(1, ques_chunk_size - chunk_overlap)))
+    chunk_tokens = min(ques_chunk_size, max(doc_tokens, 1))
+    questions_out = QUESTIONS_PER_CHUNK * TOKENS_PER_QUESTION
+
+    if question_gen_mode == "parallel":
+        qgen_prompt = n_chunks * (count_tokens(prompt_template) + chunk_tokens)
+        qgen_completion = n_chunks * questions_out
+    else:
+        # Call i carries the i * questions_out tokens written by the calls before it
+        qgen_prompt = (
+            count_tokens(prompt_template) + chunk_tokens
+            + (n_chunks - 1) * (count_tokens(refine_template) + chunk_tokens)
+            + questions_out * n_chunks * (n_chunks - 1) // 2
+        )
+        qgen_completion = questions_out * n_chunks * (n_chunks + 1) // 2
+
+    # generate_csv answers at most MAX_QUESTIONS, however many are generated
+    expected_questions = min(n_chunks * QUESTIONS_PER_CHUNK, MAX_QUESTIONS)
+    questions = min(expected_questions, max_questions) if max_questions else expected_questions
+    per_question = count_tokens(answer_template) + k * ans_chunk_size + TOKENS_PER_QUESTION + TOKENS_PER_ANSWER
+
+    question_generation = qgen_prompt + qgen_completion
+    answering = questions * per_question
+    return {
+        "document_tokens": doc_tokens,
+        "question_chunks": n_chunks,
+        "questions": questions,
+        "question_generation_tokens": question_generation,
+        "answering_tokens": answering,
+        "tokens_per_question": per_question,
+        "total_tokens": question_generation + answering,
+    }
+
+
+def plan_job(doc_tokens, token_budget=JOB_TOKEN_BUDGET, question_gen_mode=QUESTION_GEN_MODE):
+    """
+    Pick chunk sizes, question count and retrieval k for a job so its
+    estimated tokens fit `token_budget` (0 = unbounded: the defaults).
+
+    Prefers answering a larger share of the expected questions, then more
+    retrieved context per question (k * answer chunk size), then larger
+    question chunks.
+    Returns a plan dict whose "fits" is False when not even MIN_QUESTIONS
+    questions fit the budget.
+    """
+    def make_plan(ques_chunk_size, ans_chunk_size, k, max_questions, estimate):
+        return {
+            "token_budget": token_budget,
+            "ques_chunk_size": ques_chunk_size,
+            "ans_chunk_size": ans_chunk_size,
+            "chunk_overlap": CHUNK_OVERLAP,
+            "k": k,
+            "max_questions": max_questions,
+            "estimate": estimate,
+            "fits": not token_budget or estimate["total_tokens"] <= token_budget,
+        }
+
+    if not token_budget:
+        estimate = estimate_job(doc_tokens, QUES_CHUNK_SIZE, ANS_CHUNK_SIZE, SEARCH_KWARGS["k"],
+                                question_gen_mode=question_gen_mode)
+        return make_plan(QUES_CHUNK_SIZE, ANS_CHUNK_SIZE, SEARCH_KWARGS["k"], None, estimate)
+
+    best, best_rank = None, None
+    for ques_chunk_size in QUES_CHUNK_SIZES:
+        for ans_chunk_size in ANS_CHUNK_SIZES:
+            for k in RETRIEVAL_KS:
+                full = estimate_job(doc_tokens, ques_chunk_size, ans_chunk_size, k,
+                                    question_gen_mode=question_gen_mode)
+                remaining = token_budget - full["question_generation_tokens"]
+                max_questions = min(full["questions"], MAX_QUESTIONS,
+                                    max(0, remaining // full["tokens_per_question"]))
+                if max_questions < MIN_QUESTIONS:
+                    continue
+                rank = (max_questions / full["questions"], k * ans_chunk_size, ques_chunk_size)
+                if best_rank is None or rank > best_rank:
+                    estimate = estimate_job(doc_tokens, ques_chunk_size, ans_chunk_size, k, max_questions,
+                                            question_gen_mode=question_gen_mode)
+                    best, best_rank = make_plan(ques_chunk_size, ans_chunk_size, k, max_questions, estimate), rank
+
+    if best is None:
+        # Nothing fits: report the cheapest settings so the caller can show what it would take
+        cheapest = estimate_job(doc_tokens, QUES_CHUNK_SIZES[0], ANS_CHUNK_SIZES[-1], RETRIEVAL_KS[-1],
+                                MIN_QUESTIONS, question_gen_mode=question_gen_mode)
+        return make_plan(QUES_CHUNK_SIZES[0], ANS_CHUNK_SIZES[-1], RETRIEVAL_KS[-1], MIN_QUESTIONS, cheapest)
+    return best
+
+
+def plan_for_file(file_path, token_budget=None):
+    """
+    Plan a job for the PDF at `file_path` (`token_budget` None = JOB_TOKEN_BUDGET).
+    With a budget the exact token count is needed; without one the plan
+    only informs, so the document size is estimated from its page count
+    and the plan's estimate is marked "approximate".
+    """
+    budget = JOB_TOKEN_BUDGET if token_budget is None else token_budget
+    doc_hash = file_sha256(file_path)
+    if budget:
+        doc_tokens, approximate = document_tokens(file_path, doc_hash), False
+    else:
+        doc_tokens, approximate = approximate_document_tokens(file_path, doc_hash)
+    plan = plan_job(doc_tokens, budget)
+    plan["estimate"]["approximate"] = approximate
+    return plan
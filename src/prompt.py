@@ -26,4 +26,44 @@ We have the option to refine the existing questions or add new ones.
 Given the new context, refine the original questions in English.
 If the context is not helpful, please provide the original questions.
 QUESTIONS:
-"""
\ No newline at end of file
+"""
+
+answer_template = """You are an expert on UN Sustainable Development Goals (SDGs).
+    Your task is to extract and summarize the answer to the question using ONLY the provided CONTEXT.
+
+    **RULES:**
+    1.  **Strict Context Reliance:** Use ONLY the provided CONTEXT. Do NOT invent facts or generalize.
+    2.  **Focus:** Directly extract the specific requirement or characteristic requested by the question from the relevant SDG Target in the context.
+    3.  **No Citation:** Do NOT include 'Target X.Y', 'Goal X', or any reference/citation in the final answer.
+    4.  **Failure State:** If the exact answer is not present in the context, reply exactly: **Not found in context.**
+    5.  **Conciseness:** Provide a brief and precise answer, avoiding unnecessary elaboration.
+    6.  **No Markdown:** Do NOT use any markdown formatting like *, **, `, or _ in your response.
+    7.  **Plain Text Only:** Use only plain text with proper punctuation.
+    8.  **Failure State:** If the exact answer is not present in the context, reply exactly: **Not found in context.**
+
+    Context: {context}
+
+    Question: {input}
+
+    Answer in format: [Directly extracted answer/summary]."""
+
+batch_answer_template = """You are an expert on UN Sustainable Development Goals (SDGs).
+    Your task is to extract and summarize the answer to EACH question using ONLY the provided CONTEXT.
+
+    **RULES:**
+    1.  **Strict Context Reliance:** Use ONLY the provided CONTEXT. Do NOT invent facts or generalize.
+    2.  **Focus:** Directly extract the specific requirement or characteristic requested by each question from the relevant SDG Target in the context.
+    3.  **No Citation:** Do NOT include 'Target X.Y', 'Goal X', or any reference/citation in the answers.
+    4.  **Failure State:** If the exact answer to a question is not present in the context, its answer is exactly: Not found in context.
+    5.  **Conciseness:** Provide brief and precise answers, avoiding unnecessary elaboration.
+    6.  **No Markdown:** Do NOT use any markdown formatting like *, **, `, or _ in the answers.
+    7.  **Plain Text Only:** Use only plain text with proper punctuation.
+    8.  **Independence:** Answer every question on its own; do not refer to other questions or answers.
+
+    Context: {context}
+
+    Questions:
+    {questions}
+
+    Reply with JSON only, no other text, in exactly this shape:
+    {{"answers": [{{"id": <question id>, "answer": "<answer>"}}]}}"""
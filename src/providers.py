@@ -0,0 +1,71 @@
+from src.config import LLM_PROVIDER, require_google_api_key
+
+
+# Model clients are imported on first use: the Google GenAI SDK alone takes
+# longer to import than the rest of the web server, and most processes
+# (the API before its first job, benchmarks, tools) never need it.
+
+# ───────────────────────────────────────────────
+# Built-in backends
+# ───────────────────────────────────────────────
+def _google_chat(model, temperature, callbacks):
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    require_google_api_key()
+    return ChatGoogleGenerativeAI(model=model, temperature=temperature, callbacks=callbacks)
+
+
+def _google_embeddings(model):
+    from langchain_google_genai import GoogleGenerativeAIEmbeddings
+    require_google_api_key()
+    return GoogleGenerativeAIEmbeddings(model=model)
+
+
+def _fake_chat(model, temperature, callbacks):
+    from src.fake_llm import FakeChatModel
+    return FakeChatModel(model=f"fake/{model}", temperature=temperature, callbacks=callbacks)
+
+
+def _fake_embeddings(model):
+    from src.fake_llm import FakeEmbeddings
+    return FakeEmbeddings(model=f"fake/{model}")
+
+
+# name -> (chat factory(model, temperature, callbacks), embeddings factory(model))
+PROVIDERS = {
+    "google": (_google_chat, _google_embeddings),
+    "fake": (_fake_chat, _fake_embeddings),
+}
+
+
+def register_provider(name, chat_factory, embeddings_factory):
+    """Make another backend selectable through QA_LLM_PROVIDER."""
+    PROVIDERS[name] = (chat_factory, embeddings_factory)
+
+
+def get_provider(name=None):
+    name = name or LLM_PROVIDER
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown LLM provider {name!r}; available: {', '.join(sorted(PROVIDERS))}")
+    return PROVIDERS[name]
+
+
+def cache_model_name(model, provider=None):
+    """
+    Name under which results of `model` are cached. Google keeps the bare
+    model name (existing caches stay valid); other backends are prefixed
+    so their vectors and answers never mix with the real model's.
+    """
+    provider = provider or LLM_PROVIDER
+    return model if provider == "google" else f"{provider}/{model}"
+
+
+def chat_model(model, temperature, callbacks=None, provider=None):
+    """Chat model client for `model` from the configured backend."""
+    chat_factory, _ = get_provider(provider)
+    return chat_factory(model, temperature, callbacks or [])
+
+
+def embedding_model(model, provider=None):
+    """Embeddings client for `model` from the configured backend."""
+    _, embeddings_factory = get_provider(provider)
+    return embeddings_factory(model)
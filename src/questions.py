@@ -0,0 +1,175 @@
+import os
+import re
+
+import numpy as np
+from langchain_core.output_parsers import StrOutputParser
+
+
+# Max number of per-chunk question-generation calls in flight (parallel mode)
+QUESTION_GEN_CONCURRENCY = int(os.getenv("QA_QUESTION_GEN_CONCURRENCY", "4"))
+
+# Cosine similarity at or above which two questions count as paraphrases (<= 0 disables)
+QUESTION_DEDUP_THRESHOLD = float(os.getenv("QA_QUESTION_DEDUP_THRESHOLD", "0.92"))
+
+question_start_regex = re.compile(
+    r'^(what|which|when|how|why|where|who|explain|describe|list|define)\b',
+    re.I
+)
+
+
+def clean_question_text(text):
+    """Remove markdown formatting and special characters from questions"""
+    if not isinstance(text, str):
+        text = str(text)
+
+    # Remove numbering like "1.", "2." etc.
+    text = re.sub(r'^\s*\d+\.\s*', '', text)
+
+    # Remove markdown formatting: *, **, `, etc.
+    text = re.sub(r'[\*\_\`]', '', text)
+
+    # Remove quotes that wrap content
+    text = re.sub(r'^\"(.*)\"$', r'\1', text)
+    text = re.sub(r"^\'(.*)\'$", r'\1', text)
+
+    # Remove extra whitespace
+    text = re.sub(r'\s+', ' ', text).strip()
+
+    # Ensure it starts with capital letter
+    if text and len(text) > 1:
+        text = text[0].upper() + text[1:]
+
+    return text
+
+
+def filter_questions(ques):
+    """
+    Turn raw LLM output (one question per line) into a clean, deduplicated
+    list of questions that all end with '?'.
+    """
+    filtered_questions = []
+    seen = set()
+
+    for raw in ques.split("\n"):
+        q = raw.strip()
+        if not q:
+            continue
+
+        # Remove numbering like "1." and bullet markers
+        q = clean_question_text(q)
+
+        # Drop obvious headers/meta
+        if len(q) < 5:
+            continue
+        low = q.lower()
+        if low.startswith("here are") or low.startswith("the following"):
+            continue
+
+        # Ensure interrogative — allow short command-like prompts (e.g., "List three targets")
+        if not (q.endswith('?') or question_start_regex.search(q)):
+            continue
+
+        # Normalize and dedupe
+        q_norm = re.sub(r'\s+', ' ', q.strip()).lower()
+        if q_norm in seen:
+            continue
+        seen.add(q_norm)
+
+        # Standardize to end with '?'
+        if not q.endswith('?'):
+            q = q.rstrip('.') + '?'
+
+        filtered_questions.append(q)
+
+    return filtered_questions
+
+
+def cluster_by_similarity(vectors, threshold):
+    """
+    Leader clustering over the cosine similarity matrix of `vectors`.
+
+    Rows are visited in order; each row not yet assigned starts a cluster
+    and claims every unassigned row with similarity >= `threshold`.
+    Returns the cluster label of every row (labels are leader indices).
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    unit = vectors / np.where(norms == 0, 1, norms)
+    similarity = unit @ unit.T
+
+    labels = np.full(len(unit), -1, dtype=np.int64)
+    for i in range(len(unit)):
+        if labels[i] >= 0:
+            continue
+        members = (similarity[i] >= threshold) & (labels < 0)
+        members[i] = True
+        labels[members] = i
+    return labels
+
+
+def semantic_dedup(questions, embeddings, threshold=QUESTION_DEDUP_THRESHOLD):
+    """
+    Drop paraphrased questions before they are answered.
+
+    All questions are embedded in one batch, clustered at `threshold` and
+    the first question of every cluster is kept, so the original order is
+    preserved. Returns (kept_questions, report); every dropped question
+    is one retrieve-and-answer cycle saved.
+    """
+    report = {"candidates": len(questions), "kept": len(questions), "answer_calls_saved": 0, "clusters": []}
+    if threshold <= 0 or len(questions) < 2:
+        return list(questions), report
+
+    embed_array = getattr(embeddings, "embed_array", None)
+    try:
+        vectors = embed_array(questions) if embed_array else embeddings.embed_documents(questions)
+    except Exception as e:
+        # Exact-text dedup already ran; keep every question if embeddings are unavailable
+        print(f"[Dedup] Embedding questions failed, semantic dedup skipped: {e}")
+        return list(questions), report
+    labels = cluster_by_similarity(vectors, threshold)
+
+    kept = [q for i, q in enumerate(questions) if labels[i] == i]
+    for leader in np.unique(labels):
+        members = np.flatnonzero(labels == leader)
+        if len(members) > 1:
+            report["clusters"].append([questions[i] for i in members])
+
+    report["kept"] = len(kept)
+    report["answer_calls_saved"] = len(questions) - len(kept)
+    return kept, report
+
+
+def generate_questions_parallel(llm, question_prompt, docs, max_concurrency=QUESTION_GEN_CONCURRENCY):
+    """
+    Map-reduce question generation:
+      - map    : run `question_prompt` on every chunk independently, with at
+                 most `max_concurrency` LLM calls in flight
+      - reduce : concatenate the per-chunk questions in document order;
+                 numbering, headers and exact duplicates are removed later
+                 by filter_questions, so no extra LLM round-trip is needed
+
+    Returns the merged questions as one newline-separated string, the same
+    shape the refine chain produces.
+    """
+    chain = question_prompt | llm | StrOutputParser()
+    inputs = [{"text": d.page_content} for d in docs]
+
+    # return_exceptions keeps one failed chunk from discarding the others
+    outputs = chain.batch(
+        inputs,
+        config={"max_concurrency": max_concurrency},
+        return_exceptions=True
+    )
+
+    merged = []
+    for idx, out in enumerate(outputs, 1):
+        if isinstance(out, Exception):
+            print(f"[Question generation error] chunk {idx}: {out}")
+            continue
+        merged.append(out.strip())
+
+    if not merged and outputs:
+        raise RuntimeError("Question generation failed for every chunk.")
+
+    return "\n".join(merged)
@@ -0,0 +1,263 @@
+import os
+import time
+import random
+import threading
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from src.metrics import LLM_IN_FLIGHT, LLM_CALLS, LLM_TOKENS, record_llm_tokens
+from src.tokens import count_tokens
+
+
+# Default quota for the whole process (shared by every job and thread)
+REQUESTS_PER_MINUTE = int(os.getenv("QA_REQUESTS_PER_MINUTE", "60"))
+TOKENS_PER_MINUTE = int(os.getenv("QA_TOKENS_PER_MINUTE", "1000000"))
+
+
+def is_rate_limit_error(error):
+    """True for 429 / quota errors raised by the Google clients (or anything shaped like them)."""
+    text = f"{type(error).__name__} {error}"
+    markers = ("429", "ResourceExhausted", "RESOURCE_EXHAUSTED", "Too Many Requests", "rate limit", "quota")
+    return any(m.lower() in text.lower() for m in markers)
+
+
+def estimate_tokens(text):
+    """Cheap token estimate (~4 characters per token) used for pacing."""
+    return max(1, len(text) // 4)
+
+
+class RateLimiter:
+    """
+    Token-bucket limiter for requests-per-minute and tokens-per-minute.
+
+    Callers reserve capacity with `acquire(tokens)`; when a bucket runs dry
+    the caller sleeps until enough capacity has refilled. Rate-limit errors
+    reported through `on_rate_limited` pause everyone with exponential,
+    jittered backoff and halve the effective rate; each success restores
+    a little of it again. `clock`, `sleep` and `rng` can be replaced to drive
+    the limiter deterministically.
+    """
+
+    def __init__(self, requests_per_minute=REQUESTS_PER_MINUTE, tokens_per_minute=TOKENS_PER_MINUTE,
+                 base_backoff=1.0, max_backoff=60.0, clock=time.monotonic, sleep=time.sleep, rng=random.random):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.clock = clock
+        self.sleep = sleep
+        self.rng = rng
+
+        self._lock = threading.Lock()
+        self._last = clock()
+        self._requests = float(requests_per_minute)
+        self._tokens = float(tokens_per_minute)
+        self._backoff_until = 0.0
+        self._consecutive_limited = 0
+        self._last_error = None
+        self.rate_scale = 1.0
+        self.throttled = 0
+
+    # ───────────────────────────────────────────
+    # Bucket bookkeeping (call with the lock held)
+    # ───────────────────────────────────────────
+    def _refill(self, now):
+        elapsed = max(0.0, now - self._last)
+        self._last = now
+        self._requests = min(
+            self.requests_per_minute,
+            self._requests + elapsed * self.requests_per_minute / 60.0 * self.rate_scale
+        )
+        self._tokens = min(
+            self.tokens_per_minute,
+            self._tokens + elapsed * self.tokens_per_minute / 60.0 * self.rate_scale
+        )
+
+    def _wait_for(self, now, tokens):
+        req_rate = self.requests_per_minute / 60.0 * self.rate_scale
+        tok_rate = self.tokens_per_minute / 60.0 * self.rate_scale
+        wait_requests = max(0.0, (1 - self._requests) / req_rate)
+        wait_tokens = max(0.0, (tokens - self._tokens) / tok_rate)
+        return max(self._backoff_until - now, wait_requests, wait_tokens, 0.0)
+
+    # ───────────────────────────────────────────
+    # Public API
+    # ───────────────────────────────────────────
+    def reserve(self, tokens=1):
+        """
+        Reserve one request and `tokens` tokens; return how long the caller
+        must wait before sending. Reservations may drive the buckets negative,
+        which makes later callers queue up behind this one.
+        """
+        tokens = min(max(1, int(tokens)), self.tokens_per_minute)
+        with self._lock:
+            now = self.clock()
+            self._refill(now)
+            wait = self._wait_for(now, tokens)
+            self._requests -= 1
+            self._tokens -= tokens
+            return wait
+
+    def acquire(self, tokens=1):
+        """Block until one request of `tokens` tokens may be sent."""
+        wait = self.reserve(tokens)
+        if wait > 0:
+            self.sleep(wait)
+        return wait
+
+    def current_wait(self, tokens=1):
+        """Seconds a new request of `tokens` tokens would wait right now."""
+        tokens = min(max(1, int(tokens)), self.tokens_per_minute)
+        with self._lock:
+            now = self.clock()
+            self._refill(now)
+            return self._wait_for(now, tokens)
+
+    def on_rate_limited(self, error=None):
+        """
+        Register a 429/ResourceExhausted: back off with jitter and slow down.
+        The same exception object is only counted once, even when it is seen
+        both by the model callback and by `call` further up the stack.
+        """
+        with self._lock:
+            now = self.clock()
+            self._refill(now)
+            if error is not None and error is self._last_error:
+                return max(0.0, self._backoff_until - now)
+            self._last_error = error
+            self._consecutive_limited += 1
+            self.throttled += 1
+            backoff = min(self.max_backoff, self.base_backoff * 2 ** (self._consecutive_limited - 1))
+            # Jitter in [backoff/2, backoff] so concurrent callers don't retry in lockstep
+            backoff *= 0.5 + self.rng() / 2
+            self._backoff_until = max(self._backoff_until, now + backoff)
+            self.rate_scale = max(0.1, self.rate_scale * 0.5)
+            return backoff
+
+    def on_success(self):
+        """Register a successful call: gradually restore the full rate."""
+        with self._lock:
+            self._consecutive_limited = 0
+            self.rate_scale = min(1.0, self.rate_scale + 0.05)
+
+    def call(self, fn, *args, tokens=None, max_retries=5, **kwargs):
+        """
+        Run `fn(*args, **kwargs)`, retrying rate-limit errors after the
+        adaptive backoff. Other exceptions propagate unchanged.
+
+        Pass `tokens` to pace the call here; leave it as None when `fn` goes
+        through a model that already paces itself with RateLimitCallback.
+        """
+        attempt = 0
+        while True:
+            if tokens is not None:
+                self.acquire(tokens)
+            else:
+                # Still honour an active backoff before retrying
+                wait = self.current_wait()
+                if attempt and wait > 0:
+                    self.sleep(wait)
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                if not is_rate_limit_error(e) or attempt >= max_retries:
+                    raise
+                attempt += 1
+                backoff = self.on_rate_limited(e)
+                print(f"[RateLimiter] Rate limited, retry {attempt}/{max_retries} in ~{backoff:.1f}s")
+                continue
+            self.on_success()
+            return result
+
+
+class RateLimitCallback(BaseCallbackHandler):
+    """
+    LangChain callback that paces every LLM call made by a model through a
+    shared RateLimiter and feeds 429 errors back into its backoff.
+    """
+
+    # Run in the calling thread so the wait actually delays the request
+    run_inline = True
+
+    def __init__(self, limiter):
+        self.limiter = limiter
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        self.limiter.acquire(sum(estimate_tokens(p) for p in prompts))
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        text = "".join(str(m.content) for batch in messages for m in batch)
+        self.limiter.acquire(estimate_tokens(text))
+
+    def on_llm_end(self, response, **kwargs):
+        self.limiter.on_success()
+
+    def on_llm_error(self, error, **kwargs):
+        if is_rate_limit_error(error):
+            self.limiter.on_rate_limited(error)
+
+
+class LLMMetricsCallback(BaseCallbackHandler):
+    """
+    LangChain callback that exports in-flight calls, outcomes and token
+    usage of one model to the /metrics counters. Prompt and completion
+    tokens of every successful call are also counted with tiktoken and
+    accounted to the running job and stage (record_llm_tokens).
+    """
+
+    # Run in the calling thread so the job and stage of the call are known
+    run_inline = True
+
+    def __init__(self, model):
+        self.model = model
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def _start(self, run_id, prompt_text):
+        with self._lock:
+            self._in_flight[run_id] = count_tokens(prompt_text)
+        LLM_IN_FLIGHT.inc(model=self.model)
+
+    def _finish(self, run_id, status):
+        with self._lock:
+            if run_id not in self._in_flight:
+                return None
+            prompt_tokens = self._in_flight.pop(run_id)
+        LLM_IN_FLIGHT.dec(model=self.model)
+        LLM_CALLS.inc(model=self.model, status=status)
+        return prompt_tokens
+
+    def on_llm_start(self, serialized, prompts, *, run_id=None, **kwargs):
+        self._start(run_id, "".join(prompts))
+
+    def on_chat_model_start(self, serialized, messages, *, run_id=None, **kwargs):
+        self._start(run_id, "".join(str(m.content) for batch in messages for m in batch))
+
+    def on_llm_end(self, response, *, run_id=None, **kwargs):
+        prompt_tokens = self._finish(run_id, "ok")
+        completion = ""
+        for generations in response.generations:
+            for generation in generations:
+                completion += generation.text or ""
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                for kind in ("input_tokens", "output_tokens"):
+                    if usage.get(kind):
+                        LLM_TOKENS.inc(usage[kind], model=self.model, kind=kind.split("_")[0])
+        if prompt_tokens is not None:
+            record_llm_tokens(prompt_tokens, count_tokens(completion))
+
+    def on_llm_error(self, error, *, run_id=None, **kwargs):
+        self._finish(run_id, "rate_limited" if is_rate_limit_error(error) else "error")
+
+
+_shared_limiter = None
+_shared_lock = threading.Lock()
+
+
+def get_rate_limiter():
+    """The process-wide limiter shared by all LLM and embedding calls."""
+    global _shared_limiter
+    with _shared_lock:
+        if _shared_limiter is None:
+            _shared_limiter = RateLimiter()
+        return _shared_limiter
@@ -0,0 +1,205 @@
+import os
+from typing import Any
+
+import numpy as np
+from pydantic import Field
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from src.mmr import mmr_select_batch
+from src.bm25 import BM25Index
+from src.metrics import span
+
+
+# Retrieval settings shared by the per-question retriever and batch retrieval
+SEARCH_KWARGS = {"k": 6, "fetch_k": 30, "lambda_mult": 0.5}
+
+# "mmr" (dense), "similarity", "bm25" (lexical, no API call) or "hybrid" (dense + BM25 fused, then MMR)
+RETRIEVAL_MODE = os.getenv("QA_RETRIEVAL_MODE", "mmr")
+RETRIEVAL_MODES = ("mmr", "similarity", "bm25", "hybrid")
+
+# Rank offset for reciprocal rank fusion in hybrid mode
+RRF_K = 60
+
+# Dtype candidate vectors are gathered in for MMR ("float16" halves the memory of large batches)
+MMR_DTYPE = np.dtype(os.getenv("QA_MMR_DTYPE", "float32"))
+
+
+def embed_questions(embeddings, questions):
+    """All question embeddings as one (n, dim) float32 array, in a single batched call when possible."""
+    embed_queries = getattr(embeddings, "embed_queries", None)
+    if embed_queries is not None:
+        return np.asarray(embed_queries(questions), dtype=np.float32)
+    return np.asarray([embeddings.embed_query(q) for q in questions], dtype=np.float32)
+
+
+def batch_retrieve(vector_store, questions, k=6, fetch_k=30, lambda_mult=0.5, search_type="mmr", bm25=None,
+                   documents=None):
+    """
+    Retrieve documents for every question at once.
+
+    Questions are embedded in one batch and searched with a single
+    multi-query FAISS call; for MMR the candidate vectors are reconstructed
+    once for the union of all candidates and every question is re-ranked
+    in one vectorized pass (src.mmr).
+
+    With a `bm25` index built over `documents` (the chunks the FAISS index
+    was built from, so BM25 ids are FAISS ids; see build_bm25_index),
+    search_type "bm25" ranks lexically without any API call and "hybrid"
+    fuses the FAISS and BM25 candidates (reciprocal rank fusion) before MMR.
+    BM25 needs no vector store at all; if there is none, or embedding the
+    questions fails, hybrid retrieval falls back to BM25.
+
+    Returns one list of Documents per question, in question order, matching
+    what `vector_store.as_retriever(search_type, search_kwargs)` returns.
+    """
+    if not questions:
+        return []
+
+    def to_doc(i):
+        if vector_store is None:
+            return documents[int(i)]
+        doc = vector_store.docstore.search(vector_store.index_to_docstore_id[int(i)])
+        if not isinstance(doc, Document):
+            raise ValueError(f"Could not find document for index {i}, got {doc}")
+        return doc
+
+    def lexical_docs():
+        return [[to_doc(i) for i in ids] for ids, _ in bm25.search_batch(questions, k)]
+
+    if vector_store is None:
+        if bm25 is None or documents is None or search_type not in ("bm25", "hybrid"):
+            raise ValueError(f"search_type '{search_type}' needs a vector store")
+        return lexical_docs()
+    if search_type == "bm25":
+        return lexical_docs()
+
+    try:
+        query_vectors = embed_questions(vector_store.embeddings, questions)
+    except Exception as e:
+        if bm25 is None:
+            raise
+        print(f"[Retrieval] Embedding questions failed ({e}), falling back to BM25")
+        return lexical_docs()
+
+    n_candidates = k if search_type == "similarity" else fetch_k
+    _, indices = vector_store.index.search(query_vectors, min(n_candidates, vector_store.index.ntotal))
+    if search_type == "hybrid" and bm25 is not None:
+        lexical = [ids for ids, _ in bm25.search_batch(questions, fetch_k)]
+        indices = fuse_rankings(indices, lexical, fetch_k)
+
+    if search_type == "similarity":
+        return [[to_doc(i) for i in row if i != -1] for row in indices]
+
+    # Reconstruct every candidate vector once, even if several questions share it
+    valid = indices != -1
+    unique_ids = np.unique(indices[valid])
+    if not len(unique_ids):
+        return [[] for _ in questions]
+    unique_vectors = reconstruct(vector_store.index, unique_ids).astype(MMR_DTYPE, copy=False)
+    positions = np.searchsorted(unique_ids, np.where(valid, indices, unique_ids[0]))
+    candidates = unique_vectors[positions]
+
+    picks = mmr_select_batch(query_vectors, candidates, k=k, lambda_mult=lambda_mult, valid=valid)
+    return [
+        [to_doc(row[j]) for j in selected if j >= 0]
+        for row, selected in zip(indices, picks)
+    ]
+
+
+def fuse_rankings(dense, lexical, size, rrf_k=RRF_K):
+    """
+    Reciprocal rank fusion of two id rankings per query. Returns an
+    (n, size) int array of ids, best first, padded with -1.
+    """
+    fused = np.full((len(dense), size), -1, dtype=np.int64)
+    for row, (dense_ids, lexical_ids) in enumerate(zip(dense, lexical)):
+        scores = {}
+        for ranking in (dense_ids, lexical_ids):
+            for rank, i in enumerate(int(i) for i in ranking if i != -1):
+                scores[i] = scores.get(i, 0.0) + 1.0 / (rrf_k + rank + 1)
+        best = sorted(scores, key=lambda i: -scores[i])[:size]
+        fused[row, :len(best)] = best
+    return fused
+
+
+def build_bm25_index(documents):
+    """
+    BM25 index over `documents`; BM25 doc ids are positions in the list, which
+    equal the FAISS ids of a vector store built from the same list.
+    """
+    return BM25Index.from_documents(documents)
+
+
+def reconstruct(index, ids):
+    """Stored vectors for FAISS ids `ids` as an (n, dim) float32 array."""
+    ids = np.asarray(ids, dtype=np.int64)
+    if hasattr(index, "reconstruct_batch"):
+        try:
+            return np.asarray(index.reconstruct_batch(ids), dtype=np.float32)
+        except RuntimeError:
+            # Some index types only support one-by-one reconstruction
+            pass
+    return np.vstack([index.reconstruct(int(i)) for i in ids]).astype(np.float32, copy=False)
+
+
+class MMRRetriever(BaseRetriever):
+    """
+    Retriever over a FAISS vector store that uses our vectorized MMR engine
+    (src.mmr) instead of LangChain's per-candidate loop. Exposes the same
+    `vectorstore`, `search_type` and `search_kwargs` attributes as the
+    stock VectorStoreRetriever, so retrieve_all can batch it.
+
+    In "bm25" mode (or "hybrid" when the index could not be built)
+    `vectorstore` is None and documents come from `documents` by BM25 id.
+    `embeddings` is the embedding model for callers that need one (answer
+    cache, compression) whether or not a vector store exists.
+    """
+
+    vectorstore: Any = None
+    documents: Any = None
+    embeddings: Any = None
+    bm25: Any = None
+    search_type: str = "mmr"
+    search_kwargs: dict = Field(default_factory=lambda: dict(SEARCH_KWARGS))
+
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        kwargs = dict(SEARCH_KWARGS)
+        kwargs.update(self.search_kwargs)
+        with span("retrieval"):
+            return batch_retrieve(
+                self.vectorstore, [query], k=kwargs["k"], fetch_k=kwargs["fetch_k"],
+                lambda_mult=kwargs["lambda_mult"], search_type=self.search_type, bm25=self.bm25,
+                documents=self.documents
+            )[0]
+
+
+def retriever_embeddings(retriever):
+    """Embedding model behind `retriever` (MMRRetriever or a stock vector store retriever), or None."""
+    embeddings = getattr(retriever, "embeddings", None)
+    if embeddings is None:
+        embeddings = getattr(getattr(retriever, "vectorstore", None), "embeddings", None)
+    return embeddings
+
+
+def retrieve_all(retriever, questions):
+    """
+    Per-question documents for `questions`: one batched search when the
+    retriever is backed by a FAISS vector store (or a BM25 index alone),
+    otherwise one retriever.invoke per question.
+    """
+    vector_store = getattr(retriever, "vectorstore", None)
+    bm25_only = vector_store is None and getattr(retriever, "bm25", None) is not None
+    if bm25_only or (vector_store is not None and hasattr(vector_store, "index")):
+        search_kwargs = dict(SEARCH_KWARGS)
+        search_kwargs.update(getattr(retriever, "search_kwargs", None) or {})
+        search_type = getattr(retriever, "search_type", "mmr")
+        if search_type in RETRIEVAL_MODES:
+            with span("retrieval"):
+                return batch_retrieve(
+                    vector_store, list(questions),
+                    k=search_kwargs["k"], fetch_k=search_kwargs["fetch_k"],
+                    lambda_mult=search_kwargs["lambda_mult"], search_type=search_type,
+                    bm25=getattr(retriever, "bm25", None), documents=getattr(retriever, "documents", None)
+                )
+    return [retriever.invoke(q) for q in questions]
@@ -0,0 +1,123 @@
+import os
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+
+from src.cache import CACHE_DIR, make_cache_key
+from src.chunking import chunk_id
+from src.metrics import record_cache
+
+
+# Summaries kept in memory (least-recently-used are evicted)
+SUMMARY_CACHE_MAX_ENTRIES = int(os.getenv("QA_SUMMARY_CACHE_MAX_ENTRIES", "512"))
+
+# Persist summaries in SQLite as a second tier (survives restarts)
+SUMMARY_CACHE_DISK = os.getenv("QA_SUMMARY_CACHE_DISK", "1") == "1"
+
+# Summaries kept on disk (least-recently-used are evicted)
+SUMMARY_CACHE_DISK_MAX_ENTRIES = int(os.getenv("QA_SUMMARY_CACHE_DISK_MAX_ENTRIES", "20000"))
+
+
+def summary_key(docs, model_name):
+    """Key of a summary: the sorted set of chunk ids plus the summarizing model."""
+    ids = sorted({d.metadata.get("chunk_id") or chunk_id(d.page_content) for d in docs})
+    return make_cache_key("summary", model_name, ids)
+
+
+class SummaryCache:
+    """
+    Two-tier cache of `summarized_context` per retrieved chunk set.
+
+    The memory tier is an LRU OrderedDict of `max_entries`; the optional
+    disk tier is a SQLite table in the cache folder, evicted by last use
+    beyond `disk_max_entries`. Disk hits are promoted to memory.
+    """
+
+    def __init__(self, max_entries=SUMMARY_CACHE_MAX_ENTRIES, disk=SUMMARY_CACHE_DISK,
+                 db_path=None, disk_max_entries=SUMMARY_CACHE_DISK_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.disk_max_entries = disk_max_entries
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+
+        self._conn = None
+        if disk:
+            self.db_path = db_path or os.path.join(CACHE_DIR, "summaries.sqlite")
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS summaries (key TEXT PRIMARY KEY, summary TEXT, last_used REAL)"
+            )
+            self._conn.commit()
+
+    def _remember(self, key, summary):
+        self._memory[key] = summary
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, docs, model_name):
+        """Cached summary for this chunk set and model, or None."""
+        key = summary_key(docs, model_name)
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                record_cache("summaries", hits=1)
+                return self._memory[key]
+
+            if self._conn is not None:
+                row = self._conn.execute("SELECT summary FROM summaries WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    self._conn.execute("UPDATE summaries SET last_used = ? WHERE key = ?", (time.time(), key))
+                    self._conn.commit()
+                    self._remember(key, row[0])
+                    self.disk_hits += 1
+                    record_cache("summaries", hits=1)
+                    return row[0]
+
+            self.misses += 1
+            record_cache("summaries", misses=1)
+            return None
+
+    def put(self, docs, model_name, summary):
+        key = summary_key(docs, model_name)
+        with self._lock:
+            self._remember(key, summary)
+            if self._conn is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO summaries (key, summary, last_used) VALUES (?, ?, ?)",
+                    (key, summary, time.time()),
+                )
+                self._conn.execute(
+                    "DELETE FROM summaries WHERE key IN ("
+                    "SELECT key FROM summaries ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                    (self.disk_max_entries,),
+                )
+                self._conn.commit()
+
+    def stats(self):
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "memory_entries": len(self._memory),
+        }
+
+
+_summary_cache = None
+_summary_cache_lock = threading.Lock()
+
+
+def get_summary_cache():
+    """Process-wide summary cache."""
+    global _summary_cache
+    with _summary_cache_lock:
+        if _summary_cache is None:
+            _summary_cache = SummaryCache()
+        return _summary_cache
@@ -0,0 +1,37 @@
+import threading
+
+
+# Tokenizer used for accounting and planning (Gemini's own tokenizer is not
+# available offline; cl100k_base is a close, stable stand-in)
+ACCOUNTING_ENCODING = "cl100k_base"
+
+
+def count_tokens(text, encoding_name=ACCOUNTING_ENCODING):
+    """Number of tiktoken tokens in `text`."""
+    import tiktoken
+    return len(tiktoken.get_encoding(encoding_name).encode_ordinary(text or ""))
+
+
+class TokenAccountant:
+    """Calls, prompt tokens and completion tokens per pipeline stage."""
+
+    def __init__(self):
+        self.stages = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage, prompt_tokens, completion_tokens):
+        with self._lock:
+            entry = self.stages.setdefault(stage, {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0})
+            entry["calls"] += 1
+            entry["prompt_tokens"] += prompt_tokens
+            entry["completion_tokens"] += completion_tokens
+
+    def report(self):
+        with self._lock:
+            stages = {stage: dict(entry) for stage, entry in self.stages.items()}
+        totals = {
+            name: sum(entry[name] for entry in stages.values())
+            for name in ("calls", "prompt_tokens", "completion_tokens")
+        }
+        totals["total_tokens"] = totals["prompt_tokens"] + totals["completion_tokens"]
+        return {"stages": stages, "totals": totals}
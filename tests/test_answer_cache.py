@@ -0,0 +1,152 @@
+import sqlite3
+
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+
+from src.answer_cache import SemanticAnswerCache, context_hash, get_answer_cache
+
+
+class FixedEmbeddings:
+    """Query embeddings looked up from a dict of unit vectors."""
+
+    def __init__(self, vectors):
+        self.vectors = vectors
+
+    def embed_query(self, text):
+        return self.vectors[text]
+
+
+class ManualClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def unit(*values):
+    v = np.asarray(values, dtype=np.float32)
+    return (v / np.linalg.norm(v)).tolist()
+
+
+DOCS_A = [Document(page_content="chunk a1"), Document(page_content="chunk a2")]
+DOCS_B = [Document(page_content="chunk b1")]
+
+
+@pytest.fixture
+def clock():
+    return ManualClock()
+
+
+@pytest.fixture
+def embeddings():
+    return FixedEmbeddings({
+        "What is X?": unit(1, 0, 0),
+        "what is x": unit(1, 0.05, 0),
+        "Why Y?": unit(0, 1, 0),
+    })
+
+
+def make_cache(embeddings, clock, tmp_path, **kwargs):
+    return SemanticAnswerCache(embeddings, "model", db_path=str(tmp_path / "answers.sqlite"), clock=clock, **kwargs)
+
+
+def test_hit_needs_similar_question_and_same_context(embeddings, clock, tmp_path):
+    cache = make_cache(embeddings, clock, tmp_path)
+    cache.store("What is X?", DOCS_A, "X is x.")
+
+    assert cache.lookup("what is x", list(reversed(DOCS_A))) == "X is x."
+    assert cache.lookup("what is x", DOCS_B) is None
+    assert cache.lookup("Why Y?", DOCS_A) is None
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_buckets_grow_past_their_initial_capacity(embeddings, clock, tmp_path):
+    rng = np.random.default_rng(0)
+    for i in range(40):
+        embeddings.vectors[f"q{i}"] = unit(*rng.standard_normal(3))
+    cache = make_cache(embeddings, clock, tmp_path, threshold=0.9999)
+    for i in range(40):
+        cache.store(f"q{i}", DOCS_A, f"answer {i}")
+
+    assert cache.stats()["entries"] == 40
+    assert cache.stats()["contexts"] == 1
+    assert all(cache.lookup(f"q{i}", DOCS_A) == f"answer {i}" for i in range(40))
+
+
+def test_expired_entries_miss(embeddings, clock, tmp_path):
+    cache = make_cache(embeddings, clock, tmp_path, ttl_seconds=60)
+    cache.store("What is X?", DOCS_A, "X is x.")
+    clock.now += 61
+    assert cache.lookup("What is X?", DOCS_A) is None
+
+
+def test_lru_eviction_keeps_recently_used(embeddings, clock, tmp_path):
+    cache = make_cache(embeddings, clock, tmp_path, max_entries=10)
+    contexts = [[Document(page_content=f"chunk {i}")] for i in range(11)]
+    for i, docs in enumerate(contexts[:10]):
+        clock.now += 1
+        cache.store("What is X?", docs, f"answer {i}")
+    clock.now += 1
+    assert cache.lookup("What is X?", contexts[0]) == "answer 0"
+
+    clock.now += 1
+    cache.store("What is X?", contexts[10], "answer 10")
+    assert cache.stats()["entries"] == 9
+    assert cache.lookup("What is X?", contexts[0]) == "answer 0"
+    assert cache.lookup("What is X?", contexts[10]) == "answer 10"
+    assert cache.lookup("What is X?", contexts[1]) is None
+
+
+def test_entries_survive_reload(embeddings, clock, tmp_path):
+    make_cache(embeddings, clock, tmp_path).store("What is X?", DOCS_A, "X is x.")
+    reloaded = make_cache(embeddings, clock, tmp_path)
+    assert reloaded.stats()["entries"] == 1
+    assert reloaded.lookup("what is x", DOCS_A) == "X is x."
+
+
+def test_entries_are_scoped_to_the_embedding_model(embeddings, clock, tmp_path):
+    make_cache(embeddings, clock, tmp_path, embedding_model="embed-a").store("What is X?", DOCS_A, "X is x.")
+
+    # Same dimension, different embedding model: its vectors must not be compared
+    other = make_cache(embeddings, clock, tmp_path, embedding_model="embed-b")
+    assert other.stats()["entries"] == 0
+    assert other.lookup("What is X?", DOCS_A) is None
+    assert make_cache(embeddings, clock, tmp_path, embedding_model="embed-a").lookup("what is x", DOCS_A) == "X is x."
+
+
+def test_registry_keys_caches_by_embedding_model(embeddings, monkeypatch, tmp_path):
+    monkeypatch.setattr("src.answer_cache.CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr("src.answer_cache._caches", {})
+    embeddings.model_name = "embed-a"
+    first = get_answer_cache(embeddings, "model")
+    assert get_answer_cache(embeddings, "model") is first
+
+    other = FixedEmbeddings(embeddings.vectors)
+    other.model_name = "embed-b"
+    second = get_answer_cache(other, "model")
+    assert second is not first
+    assert (first.embedding_model, second.embedding_model) == ("embed-a", "embed-b")
+
+
+def test_rows_from_before_embedding_scoping_are_ignored(embeddings, clock, tmp_path):
+    db_path = tmp_path / "answers.sqlite"
+    conn = sqlite3.connect(db_path)
+    conn.execute(
+        "CREATE TABLE answers (id INTEGER PRIMARY KEY AUTOINCREMENT, model TEXT, context_hash TEXT, "
+        "question TEXT, answer TEXT, vector BLOB, created_at REAL, last_used REAL)"
+    )
+    conn.execute(
+        "INSERT INTO answers (model, context_hash, question, answer, vector, created_at, last_used) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        ("model", context_hash(DOCS_A, "model"), "What is X?", "old", np.float32(unit(1, 0, 0)).tobytes(),
+         clock.now, clock.now),
+    )
+    conn.commit()
+    conn.close()
+
+    cache = make_cache(embeddings, clock, tmp_path)
+    assert cache.lookup("What is X?", DOCS_A) is None
+    cache.store("What is X?", DOCS_A, "new")
+    assert cache.lookup("What is X?", DOCS_A) == "new"
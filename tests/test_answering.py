@@ -0,0 +1,127 @@
+from langchain_core.documents import Document
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+
+from src.answering import answer_question, answer_group, answer_in_batches
+from src.compression import ContextCompressor
+from src.summary_cache import SummaryCache
+
+
+class RecordingChain:
+    """Combine chain stand-in: records every payload, answers with the context text."""
+
+    def __init__(self):
+        self.payloads = []
+
+    def invoke(self, payload):
+        self.payloads.append(payload)
+        return " | ".join(d.page_content for d in payload["context"])
+
+
+class StubCompressor:
+    def __call__(self, question, docs):
+        return [Document(page_content=f"compressed {len(docs)} for {question}")]
+
+
+class StubCache:
+    def __init__(self):
+        self.stored = []
+
+    def embed_question(self, question):
+        return [1.0]
+
+    def lookup(self, question, docs, vector=None):
+        return None
+
+    def store(self, question, docs, answer, vector=None):
+        self.stored.append((question, docs, answer))
+
+
+DOCS = [Document(page_content="chunk one."), Document(page_content="chunk two.")]
+
+
+def test_answer_question_sends_compressed_context():
+    chain, cache = RecordingChain(), StubCache()
+    answer = answer_question("Q?", None, chain, answer_cache=cache, docs=DOCS, compressor=StubCompressor())
+
+    assert answer == "compressed 2 for Q?"
+    assert chain.payloads == [{"input": "Q?", "context": [Document(page_content="compressed 2 for Q?")]}]
+    # The cache is keyed by the retrieved chunks, not the compressed text
+    assert cache.stored == [("Q?", DOCS, answer)]
+
+
+def test_answer_group_compresses_single_question_context():
+    chain = RecordingChain()
+    answers = answer_group([(0, DOCS)], ["Q?"], None, chain, compressor=StubCompressor())
+    assert answers == {0: "compressed 2 for Q?"}
+
+
+def test_compressor_none_mode_and_failures_keep_docs():
+    assert ContextCompressor(mode="none")("Q?", DOCS) is DOCS
+    assert ContextCompressor()("Q?", []) == []
+
+    class Failing(ContextCompressor):
+        def compress(self, question, docs):
+            raise RuntimeError("boom")
+
+    assert Failing()("Q?", DOCS) is DOCS
+
+
+def test_refine_compressor_returns_summary_document():
+    class Summarizing(ContextCompressor):
+        def summarize(self, docs):
+            return "summary of " + str(len(docs))
+
+    compressor = Summarizing(mode="refine", llm=object())
+    assert compressor("Q?", DOCS) == [Document(page_content="summary of 2")]
+
+
+def test_refine_summaries_are_served_from_the_summary_cache():
+    class CountingSummarizer(ContextCompressor):
+        calls = 0
+
+        def summarize(self, docs):
+            CountingSummarizer.calls += 1
+            return "summary"
+
+    cache = SummaryCache(disk=False)
+    first = CountingSummarizer(mode="refine", llm=object(), summary_cache=cache)
+    first("Q1?", DOCS)
+    first("Q2?", list(reversed(DOCS)))
+    second = CountingSummarizer(mode="refine", llm=object(), summary_cache=cache)
+    assert second("Q3?", DOCS) == [Document(page_content="summary")]
+
+    assert CountingSummarizer.calls == 1
+    assert first.report() == {"summaries": 2, "from_cache": 1}
+    assert second.report() == {"summaries": 1, "from_cache": 1}
+
+
+
+class FlakyChain(RecordingChain):
+    """Fails every call for question "Q3?"."""
+
+    def invoke(self, payload):
+        if payload["input"] == "Q3?":
+            raise RuntimeError("429")
+        return super().invoke(payload)
+
+
+# Batched reply that only answers question id 1; the others fall back to single calls
+BATCH_LLM = RunnableLambda(lambda prompt: AIMessage(content='{"answers": [{"id": 1, "answer": "batched one"}]}'))
+
+GROUP_QUESTIONS = ["Q1?", "Q2?", "Q3?"]
+GROUP = [(0, DOCS), (1, DOCS[:1]), (2, DOCS[1:])]
+
+
+def test_failed_fallback_only_fails_its_own_question():
+    answers = answer_group(GROUP, GROUP_QUESTIONS, BATCH_LLM, FlakyChain())
+    assert answers == {0: "batched one", 1: "chunk one.", 2: None}
+
+
+def test_answer_in_batches_keeps_the_group_answers_and_skips_caching_failures(monkeypatch):
+    monkeypatch.setattr("src.answering.retrieve_all", lambda retriever, questions: [docs for _, docs in GROUP])
+    cache = StubCache()
+    rows = list(answer_in_batches(GROUP_QUESTIONS, None, BATCH_LLM, FlakyChain(), answer_cache=cache))
+
+    assert rows == [(0, "Q1?", "batched one"), (1, "Q2?", "chunk one."), (2, "Q3?", "Not found in context.")]
+    assert [q for q, _, _ in cache.stored] == ["Q1?", "Q2?"]
@@ -0,0 +1,113 @@
+import hashlib
+
+import numpy as np
+import pytest
+from langchain_core.embeddings import Embeddings
+
+from src.embeddings import CachedEmbeddings
+
+
+class RecordingEmbeddings(Embeddings):
+    """Deterministic local embedder that records every batch it is sent."""
+
+    def __init__(self, dim=8):
+        self.dim = dim
+        self.document_batches = []
+        self.query_calls = []
+
+    def _vector(self, text, kind):
+        seed = int(hashlib.sha256(f"{kind}:{text}".encode()).hexdigest()[:8], 16)
+        rng = np.random.default_rng(seed)
+        return rng.standard_normal(self.dim).tolist()
+
+    def embed_documents(self, texts):
+        self.document_batches.append(list(texts))
+        return [self._vector(t, "document") for t in texts]
+
+    def embed_query(self, text):
+        self.query_calls.append(text)
+        return self._vector(text, "query")
+
+
+@pytest.fixture
+def fake():
+    return RecordingEmbeddings()
+
+
+@pytest.fixture
+def cached(fake, tmp_path):
+    return CachedEmbeddings(fake, "fake-model", db_path=str(tmp_path / "embeddings.sqlite"), batch_size=3)
+
+
+def test_only_misses_are_sent_in_batches(cached, fake):
+    cached.embed_array([f"chunk {i}" for i in range(5)])
+    assert fake.document_batches == [["chunk 0", "chunk 1", "chunk 2"], ["chunk 3", "chunk 4"]]
+
+    fake.document_batches.clear()
+    texts = [f"chunk {i}" for i in range(3, 10)]
+    cached.embed_array(texts)
+    sent = [t for batch in fake.document_batches for t in batch]
+    assert sent == [f"chunk {i}" for i in range(5, 10)]
+    assert all(len(batch) <= 3 for batch in fake.document_batches)
+
+
+def test_duplicates_in_one_call_are_embedded_once(cached, fake):
+    result = cached.embed_array(["a", "b", "a", "a", "b"])
+    assert fake.document_batches == [["a", "b"]]
+    assert result.shape == (5, fake.dim)
+    np.testing.assert_array_equal(result[0], result[2])
+    np.testing.assert_array_equal(result[1], result[4])
+    assert cached.misses == 2
+    assert cached.hits == 3
+
+
+def test_query_and_document_keys_are_separate(cached, fake):
+    document = cached.embed_array(["same text"])[0]
+    query = np.asarray(cached.embed_query("same text"), dtype=np.float32)
+    assert fake.query_calls == ["same text"]
+    assert not np.array_equal(document, query)
+
+    # Both kinds are cached now
+    cached.embed_array(["same text"])
+    cached.embed_query("same text")
+    assert len(fake.document_batches) == 1
+    assert fake.query_calls == ["same text"]
+
+
+def test_cache_is_shared_across_instances(fake, tmp_path):
+    db_path = str(tmp_path / "embeddings.sqlite")
+    first = CachedEmbeddings(fake, "fake-model", db_path=db_path).embed_array(["x", "y"])
+    fake.document_batches.clear()
+
+    second = CachedEmbeddings(fake, "fake-model", db_path=db_path).embed_array(["x", "y"])
+    assert fake.document_batches == []
+    np.testing.assert_array_equal(first, second)
+
+    # A different model name does not reuse those vectors
+    CachedEmbeddings(fake, "other-model", db_path=db_path).embed_array(["x"])
+    assert fake.document_batches == [["x"]]
+
+
+def test_hit_rate(cached):
+    assert cached.hit_rate == 0.0
+    cached.embed_array(["a", "b"])
+    cached.embed_array(["a", "b", "c", "d"])
+    assert cached.hits == 2
+    assert cached.misses == 4
+    assert cached.hit_rate == pytest.approx(2 / 6)
+    assert cached.stats() == {"hits": 2, "misses": 4, "hit_rate": round(2 / 6, 4)}
+
+
+def test_embed_array_is_contiguous_float32(cached, fake):
+    cached.embed_array(["a"])
+    result = cached.embed_array(["b", "a", "c"])
+    assert result.dtype == np.float32
+    assert result.flags["C_CONTIGUOUS"]
+    assert result.shape == (3, fake.dim)
+    np.testing.assert_allclose(result[1], np.asarray(fake._vector("a", "document"), dtype=np.float32))
+
+
+def test_empty_input(cached, fake):
+    result = cached.embed_array([])
+    assert result.shape[0] == 0
+    assert fake.document_batches == []
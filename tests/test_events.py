@@ -0,0 +1,53 @@
+import asyncio
+
+from src.events import JobEvents
+
+
+def backlog(events, job_id, after=-1):
+    async def subscribe():
+        items, queue = events.subscribe(job_id, after=after)
+        events.unsubscribe(job_id, queue)
+        return items
+
+    return asyncio.run(subscribe())
+
+
+def test_only_the_latest_status_is_replayed():
+    events = JobEvents()
+    for progress in range(100):
+        events.publish("job", "status", {"status": "processing", "progress": progress})
+        if progress % 10 == 0:
+            events.publish("job", "qa", {"index": progress})
+
+    items = backlog(events, "job")
+    assert [e["event"] for e in items] == ["qa"] * 10 + ["status"]
+    assert items[-1]["data"]["progress"] == 99
+    assert [e["id"] for e in items] == sorted(e["id"] for e in items)
+
+
+def test_replay_after_last_event_id():
+    events = JobEvents()
+    events.publish("job", "qa", {"index": 1})
+    events.publish("job", "status", {"status": "processing"})
+    events.publish("job", "qa", {"index": 2})
+
+    assert [e["data"] for e in backlog(events, "job", after=0)] == [{"status": "processing"}, {"index": 2}]
+    assert backlog(events, "job", after=2) == []
+
+
+def test_per_job_backlog_is_capped():
+    events = JobEvents(max_events_per_job=5)
+    for i in range(20):
+        events.publish("job", "qa", {"index": i})
+    events.publish("job", "status", {"status": "done"})
+
+    items = backlog(events, "job")
+    assert [e["data"].get("index") for e in items] == [15, 16, 17, 18, 19, None]
+
+
+def test_oldest_jobs_are_forgotten():
+    events = JobEvents(max_jobs=2)
+    for job_id in ("a", "b", "c"):
+        events.publish(job_id, "status", {"status": "queued"})
+    assert backlog(events, "a") == []
+    assert len(backlog(events, "c")) == 1
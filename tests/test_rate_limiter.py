@@ -0,0 +1,180 @@
+import pytest
+
+from src.rate_limiter import RateLimiter, RateLimitCallback, is_rate_limit_error
+
+
+class FakeClock:
+    """Manual clock whose sleep just advances the time and records the wait."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class ResourceExhausted(Exception):
+    pass
+
+
+class StubClient:
+    """Fails the first `failures` calls with a 429, then answers."""
+
+    def __init__(self, failures, error=None):
+        self.failures = failures
+        self.error = error
+        self.calls = 0
+
+    def generate(self, prompt):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise self.error or ResourceExhausted("429 Resource has been exhausted (e.g. check quota).")
+        return f"answer to {prompt}"
+
+
+def make_limiter(clock, rng=lambda: 1.0, **kwargs):
+    kwargs.setdefault("requests_per_minute", 60)
+    kwargs.setdefault("tokens_per_minute", 6000)
+    return RateLimiter(clock=clock, sleep=clock.sleep, rng=rng, **kwargs)
+
+
+def test_is_rate_limit_error():
+    assert is_rate_limit_error(ResourceExhausted("quota"))
+    assert is_rate_limit_error(RuntimeError("HTTP 429 Too Many Requests"))
+    assert not is_rate_limit_error(ValueError("bad request"))
+
+
+def test_request_bucket_waits_and_refills():
+    clock = FakeClock()
+    limiter = make_limiter(clock, requests_per_minute=60)
+
+    # A full bucket lets a burst of 60 requests through without waiting
+    assert all(limiter.acquire() == 0 for _ in range(60))
+    assert clock.sleeps == []
+
+    # The 61st waits for one request to refill (1 per second at 60/min)
+    assert limiter.acquire() == pytest.approx(1.0)
+    assert clock.sleeps == [pytest.approx(1.0)]
+
+    # After a minute idle the bucket is full again, but never above capacity
+    clock.now += 600
+    assert limiter.current_wait() == 0
+    assert all(limiter.acquire() == 0 for _ in range(60))
+    assert limiter.current_wait() == pytest.approx(1.0)
+
+
+def test_token_bucket_waits_for_large_requests():
+    clock = FakeClock()
+    limiter = make_limiter(clock, requests_per_minute=1000, tokens_per_minute=6000)
+
+    assert limiter.acquire(tokens=6000) == 0
+    # 100 tokens per second refill, so 3000 tokens take 30 s
+    assert limiter.current_wait(tokens=3000) == pytest.approx(30.0)
+    clock.now += 10
+    assert limiter.current_wait(tokens=3000) == pytest.approx(20.0)
+
+
+def test_reservations_queue_callers_behind_each_other():
+    clock = FakeClock()
+    limiter = make_limiter(clock, requests_per_minute=60)
+    for _ in range(60):
+        limiter.reserve()
+    # Without time passing, each further caller waits one more second
+    assert [limiter.reserve() for _ in range(3)] == [pytest.approx(1.0), pytest.approx(2.0), pytest.approx(3.0)]
+
+
+def test_backoff_grows_exponentially_up_to_max():
+    clock = FakeClock()
+    limiter = make_limiter(clock, base_backoff=1.0, max_backoff=10.0, rng=lambda: 1.0)
+
+    backoffs = [limiter.on_rate_limited(ResourceExhausted("429")) for _ in range(6)]
+    assert backoffs == [1.0, 2.0, 4.0, 8.0, 10.0, 10.0]
+    assert limiter.throttled == 6
+    assert limiter.current_wait() == pytest.approx(10.0)
+
+    # A success resets the growth
+    limiter.on_success()
+    assert limiter.on_rate_limited(ResourceExhausted("429")) == 1.0
+
+
+@pytest.mark.parametrize("draw", [0.0, 0.25, 0.5, 0.999])
+def test_backoff_jitter_stays_within_half_to_full(draw):
+    clock = FakeClock()
+    limiter = make_limiter(clock, base_backoff=1.0, max_backoff=60.0, rng=lambda: draw)
+
+    for attempt in range(1, 8):
+        full = min(60.0, 2.0 ** (attempt - 1))
+        backoff = limiter.on_rate_limited(ResourceExhausted("429"))
+        assert full / 2 <= backoff <= full
+        assert backoff == pytest.approx(full * (0.5 + draw / 2))
+
+
+def test_rate_limit_slows_down_and_success_restores_rate():
+    clock = FakeClock()
+    limiter = make_limiter(clock)
+    limiter.on_rate_limited(ResourceExhausted("429"))
+    limiter.on_rate_limited(ResourceExhausted("429"))
+    assert limiter.rate_scale == pytest.approx(0.25)
+
+    for _ in range(5):
+        limiter.on_success()
+    assert limiter.rate_scale == pytest.approx(0.5)
+    for _ in range(100):
+        limiter.on_success()
+    assert limiter.rate_scale == 1.0
+
+
+def test_same_error_is_counted_once_across_callback_and_call():
+    clock = FakeClock()
+    limiter = make_limiter(clock, base_backoff=1.0, rng=lambda: 1.0)
+    error = ResourceExhausted("429")
+
+    # The model callback sees the error first...
+    RateLimitCallback(limiter).on_llm_error(error)
+    # ...then RateLimiter.call sees the same exception object further up the stack
+    assert limiter.on_rate_limited(error) == pytest.approx(1.0)
+    assert limiter.throttled == 1
+    assert limiter.rate_scale == pytest.approx(0.5)
+
+    # A new error counts again and doubles the backoff
+    assert limiter.on_rate_limited(ResourceExhausted("429")) == 2.0
+    assert limiter.throttled == 2
+
+
+def test_call_retries_429s_after_backoff():
+    clock = FakeClock()
+    limiter = make_limiter(clock, base_backoff=1.0, rng=lambda: 1.0)
+    client = StubClient(failures=2)
+
+    assert limiter.call(client.generate, "q1", tokens=10) == "answer to q1"
+    assert client.calls == 3
+    assert limiter.throttled == 2
+    # Slept out the 1 s and 2 s backoffs before the retries
+    assert sum(clock.sleeps) >= 3.0
+
+
+def test_call_gives_up_after_max_retries():
+    clock = FakeClock()
+    limiter = make_limiter(clock, rng=lambda: 0.0)
+    client = StubClient(failures=10)
+
+    with pytest.raises(ResourceExhausted):
+        limiter.call(client.generate, "q1", tokens=10, max_retries=3)
+    assert client.calls == 4
+    assert limiter.throttled == 3
+
+
+def test_call_does_not_retry_other_errors():
+    clock = FakeClock()
+    limiter = make_limiter(clock)
+    client = StubClient(failures=1, error=ValueError("invalid argument"))
+
+    with pytest.raises(ValueError):
+        limiter.call(client.generate, "q1", tokens=10)
+    assert client.calls == 1
+    assert limiter.throttled == 0